@@ -0,0 +1,212 @@
+import asyncio
+import collections
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+
+from langchain_core.rate_limiters import BaseRateLimiter
+
+from telemetry import metrics
+
+
+IN_FLIGHT = metrics.gauge("nlcp_admission_in_flight", "Agent runs currently executing.")
+QUEUE_DEPTH = metrics.gauge("nlcp_admission_queue_depth", "Agent runs waiting for a slot.")
+QUEUE_WAIT_SECONDS = metrics.histogram("nlcp_admission_wait_seconds", "Time agent runs waited for a slot.")
+REJECTED = metrics.counter("nlcp_admission_rejected_total", "Requests turned away or cut off, by reason.", ("reason",))
+LLM_RATE_WAIT_SECONDS = metrics.histogram("nlcp_llm_rate_limit_wait_seconds", "Time LLM calls waited for a rate limit token.")
+
+
+class RequestRejected(Exception):
+    """A request refused or cut short for lack of capacity; maps onto an HTTP status."""
+
+    def __init__(self, status_code, reason, message, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+        REJECTED.inc(reason=reason)
+
+
+def remaining(deadline):
+    """Seconds left before `deadline` (a time.monotonic() value), or None for no deadline."""
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+class AdmissionController:
+    """
+    Caps concurrent agent runs at `max_in_flight`. Up to `max_queue` more wait for a slot in
+    arrival order, each for at most `queue_timeout` seconds (or until its deadline); beyond
+    that requests are turned away at once instead of piling up behind the provider quota.
+    """
+
+    def __init__(self, max_in_flight=16, max_queue=64, queue_timeout=10.0):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1.")
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._in_flight = 0
+        self._waiters = collections.deque()
+        self._run_seconds = 5.0  # moving average of run time, for Retry-After
+        self._stats = {"admitted": 0, "queued": 0, "rejected_queue_full": 0, "rejected_queue_timeout": 0}
+
+    def retry_after(self):
+        """Whole seconds until a slot is likely to free up for a new arrival."""
+        backlog = (len(self._waiters) + 1) / self.max_in_flight
+        return max(1, math.ceil(self._run_seconds * backlog))
+
+    async def acquire(self, deadline=None):
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._admit(0.0)
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._stats["rejected_queue_full"] += 1
+            raise RequestRejected(429, "queue_full", "Too many queries in progress; try again shortly.", self.retry_after())
+
+        timeout = self.queue_timeout
+        if deadline is not None:
+            timeout = min(timeout, remaining(deadline))
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._stats["queued"] += 1
+        QUEUE_DEPTH.set(len(self._waiters))
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # the slot was handed over just as the wait ended; pass it on
+                self._hand_over()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            QUEUE_DEPTH.set(len(self._waiters))
+            QUEUE_WAIT_SECONDS.observe(time.monotonic() - started)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._stats["rejected_queue_timeout"] += 1
+            raise RequestRejected(503, "queue_timeout", "The server is busy; try again shortly.", self.retry_after())
+        # a released slot was handed straight to this waiter
+        self._stats["admitted"] += 1
+        QUEUE_WAIT_SECONDS.observe(time.monotonic() - started)
+
+    def _admit(self, waited):
+        self._in_flight += 1
+        self._stats["admitted"] += 1
+        IN_FLIGHT.set(self._in_flight)
+        QUEUE_WAIT_SECONDS.observe(waited)
+
+    def _hand_over(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                QUEUE_DEPTH.set(len(self._waiters))
+                return
+        self._in_flight -= 1
+        IN_FLIGHT.set(self._in_flight)
+        QUEUE_DEPTH.set(0)
+
+    def release(self, run_seconds=None):
+        if run_seconds is not None:
+            self._run_seconds = 0.8 * self._run_seconds + 0.2 * run_seconds
+        self._hand_over()
+
+    @asynccontextmanager
+    async def slot(self, deadline=None):
+        await self.acquire(deadline)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def stats(self):
+        return dict(
+            self._stats,
+            in_flight=self._in_flight,
+            queue_depth=len(self._waiters),
+            max_in_flight=self.max_in_flight,
+            max_queue=self.max_queue,
+            avg_run_seconds=round(self._run_seconds, 3),
+        )
+
+
+class TokenBucket(BaseRateLimiter):
+    """
+    Limits LLM calls across every agent run in the process: `rate` calls per second on
+    average, with bursts of up to `burst`. Calls take a token in arrival order; one that
+    would wait longer than `max_wait` fails fast with a 429 instead of queueing behind the
+    quota. Passed to the chat model as its `rate_limiter`.
+    """
+
+    def __init__(self, rate, burst=None, max_wait=10.0, clock=time.monotonic):
+        if rate <= 0:
+            raise ValueError("rate must be positive.")
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.max_wait = max_wait
+        self._clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _reserve(self, blocking):
+        """Takes a token, returning how long to wait before using it (None if not blocking and none is free)."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            wait = (1 - self._tokens) / self.rate
+            if not blocking:
+                return None
+            if wait > self.max_wait:
+                raise RequestRejected(429, "llm_rate_limited", "The model's rate limit is exhausted; try again shortly.",
+                                      math.ceil(wait))
+            # tokens go negative: later callers queue behind this reservation
+            self._tokens -= 1
+            return wait
+
+    def acquire(self, *, blocking=True):
+        wait = self._reserve(blocking)
+        if wait is None:
+            return False
+        if wait:
+            time.sleep(wait)
+        LLM_RATE_WAIT_SECONDS.observe(wait)
+        return True
+
+    async def aacquire(self, *, blocking=True):
+        wait = self._reserve(blocking)
+        if wait is None:
+            return False
+        if wait:
+            await asyncio.sleep(wait)
+        LLM_RATE_WAIT_SECONDS.observe(wait)
+        return True
+
+
+def admission_from_env():
+    return AdmissionController(
+        max_in_flight=int(os.getenv("MAX_INFLIGHT_RUNS", "16")),
+        max_queue=int(os.getenv("ADMISSION_QUEUE_SIZE", "64")),
+        queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10")),
+    )
+
+
+def llm_rate_limiter_from_env():
+    """LLM_RATE_LIMIT calls per second (unset or 0: unlimited), bursting to LLM_RATE_BURST."""
+    rate = float(os.getenv("LLM_RATE_LIMIT", "0"))
+    if rate <= 0:
+        return None
+    return TokenBucket(
+        rate,
+        burst=float(os.getenv("LLM_RATE_BURST", "0")) or None,
+        max_wait=float(os.getenv("LLM_RATE_MAX_WAIT", "10")),
+    )
@@ -0,0 +1,82 @@
+import asyncio
+import hashlib
+import json
+
+from tool_cache import TTLCache
+
+
+def answer_cache_key(message, chat_history):
+    """
+    Normalized message (case and whitespace folded) plus a hash of the chat history,
+    so the same question asked with the same history maps to one entry.
+    """
+    normalized = " ".join(message.split()).casefold()
+    history_blob = json.dumps(chat_history or [], sort_keys=True, separators=(",", ":"))
+    return normalized, hashlib.sha256(history_blob.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key onto one in-flight task. Waiters are
+    shielded from each other, so one client going away does not cancel the shared run.
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+        self._stats = {"leaders": 0, "coalesced": 0}
+
+    async def run(self, key, coro_factory):
+        """Returns (result, coalesced)."""
+        task = self._in_flight.get(key)
+        if task is not None:
+            self._stats["coalesced"] += 1
+            return await asyncio.shield(task), True
+
+        self._stats["leaders"] += 1
+        task = asyncio.ensure_future(coro_factory())
+        self._in_flight[key] = task
+        task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task), False
+
+    def stats(self):
+        return dict(self._stats, in_flight=len(self._in_flight))
+
+
+class AnswerCache:
+    """
+    TTL- and size-bounded cache of agent answers with single-flight coalescing of
+    identical concurrent requests.
+    """
+
+    def __init__(self, ttl=60.0, max_entries=256):
+        self.ttl = ttl
+        self._cache = TTLCache(max_entries=max_entries)
+        self._single_flight = SingleFlight()
+
+    async def get_or_run(self, key, coro_factory, skip_cache=False):
+        """
+        Returns (answer, status) where status is "HIT", "MISS", "COALESCED" or "BYPASS".
+        Bypassed requests still refresh the cached answer.
+        """
+        if skip_cache:
+            answer = await coro_factory()
+            self._cache.set(key, answer, self.ttl)
+            return answer, "BYPASS"
+
+        hit, answer = self._cache.get(key)
+        if hit:
+            return answer, "HIT"
+
+        async def run_and_store():
+            result = await coro_factory()
+            self._cache.set(key, result, self.ttl)
+            return result
+
+        answer, coalesced = await self._single_flight.run(key, run_and_store)
+        return answer, "COALESCED" if coalesced else "MISS"
+
+    def clear(self):
+        return self._cache.invalidate()
+
+    def stats(self):
+        return {"answer_cache": self._cache.stats(), "coalescing": self._single_flight.stats()}
@@ -1,46 +1,301 @@
 import asyncio
+import hmac
 import json
 import os
+import sys
+import time
 from dotenv import load_dotenv
 from contextlib import asynccontextmanager 
 
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
-from langchain_core.messages import AIMessage, HumanMessage
-from rag_agent import initialize_rag_agent_with_mcp
+from rag_agent import initialize_rag_agent_with_mcp, create_llm, SharedToolResults, TokenUsageHandler
+from answer_cache import AnswerCache, answer_cache_key
+from session_store import ConversationMemory, InMemorySessionStore
+from intent_router import IntentRouter
+from telemetry import PROMETHEUS_CONTENT_TYPE, RequestTracingMiddleware, metrics, render
+from admission import RequestRejected, admission_from_env, remaining
 
 agent_executor = None
+tool_agents = None
 mcp_client = None
 
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
+answer_cache = AnswerCache(
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "60")),
+    max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256")),
+)
+
+conversation_memory = ConversationMemory(
+    InMemorySessionStore(
+        max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", "1000")),
+        idle_ttl=float(os.getenv("SESSION_IDLE_TTL", "3600")),
+    ),
+    token_budget=int(os.getenv("SESSION_HISTORY_TOKEN_BUDGET", "2000")),
+)
+
+STREAM_TOOL_SUMMARY_CHARS = int(os.getenv("STREAM_TOOL_SUMMARY_CHARS", "500"))
+# agent events buffered ahead of a slow streaming client
+STREAM_EVENT_BUFFER = int(os.getenv("STREAM_EVENT_BUFFER", "256"))
+
+# "eager" builds the agent before serving and fails startup on error; "background" serves
+# /healthz immediately and warms the agent up in a task, retrying until it succeeds
+STARTUP_MODE = os.getenv("STARTUP_MODE", "eager")
+WARMUP_RETRY_DELAY = float(os.getenv("WARMUP_RETRY_DELAY", "2"))
+WARMUP_MAX_RETRY_DELAY = float(os.getenv("WARMUP_MAX_RETRY_DELAY", "60"))
+warmup_state = {"status": "starting", "error": None, "attempts": 0, "started_at": None, "ready_after_s": None}
+
+RESULT_PAGE_SIZE = int(os.getenv("RESULT_PAGE_SIZE", "500"))
+RESULT_PAGE_SIZE_MAX = int(os.getenv("RESULT_PAGE_SIZE_MAX", "5000"))
+
+# recognized requests are answered by calling the matching tool directly, skipping Gemini
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() in ("1", "true", "yes")
+intent_router = IntentRouter()
+
+# agent runs versus tool calls, to watch bulk tools cut the calls per request
+agent_run_stats = {"agent_runs": 0, "tool_calls": 0, "llm_calls": 0}
+AGENT_RUNS = metrics.counter("nlcp_agent_runs_total", "Completed agent runs.")
+AGENT_CALLS = metrics.counter("nlcp_agent_calls_total", "LLM and tool calls made by agent runs.", ("kind",))
+
+# at most MAX_INFLIGHT_RUNS agent runs at once, the rest queue briefly or get a 429/503;
+# a query still running REQUEST_DEADLINE seconds after it arrived is cancelled (0: no deadline)
+admission = admission_from_env()
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "120"))
+
+# /query/batch: items per request, and how many of a batch's items run at once by default and at most
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
+# /admin/* endpoints take this token as `Authorization: Bearer <token>` or `X-Admin-Token`;
+# without one configured they are switched off
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# how long /metrics waits for the tool servers' own metrics before answering without them
+METRICS_TOOL_TIMEOUT = float(os.getenv("METRICS_TOOL_TIMEOUT", "5"))
+
+
+def _record_agent_run(usage):
+    agent_run_stats["agent_runs"] += 1
+    agent_run_stats["tool_calls"] += usage.tool_calls
+    agent_run_stats["llm_calls"] += usage.llm_calls
+    AGENT_RUNS.inc()
+    AGENT_CALLS.inc(usage.tool_calls, kind="tool")
+    AGENT_CALLS.inc(usage.llm_calls, kind="llm")
+
+
+def _request_deadline():
+    return time.monotonic() + REQUEST_DEADLINE if REQUEST_DEADLINE > 0 else None
+
+
+def _rejected_response(rejection):
+    headers = {"Retry-After": str(rejection.retry_after)} if rejection.retry_after else None
+    return JSONResponse(
+        status_code=rejection.status_code,
+        content={"error": rejection.reason, "message": str(rejection)},
+        headers=headers
+    )
+
+
+def _admin_rejection(request):
+    """A 404 while no ADMIN_TOKEN is set, a 401 for a missing or wrong token, else None."""
+    if not ADMIN_TOKEN:
+        return JSONResponse(status_code=404, content={"error": "Not Found"})
+    authorization = request.headers.get("authorization", "")
+    token = authorization[7:] if authorization.lower().startswith("bearer ") else request.headers.get("x-admin-token", "")
+    if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        return JSONResponse(
+            status_code=401,
+            content={"error": "A valid admin token is required."},
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    return None
+
+
+def _deadline_exceeded():
+    return RequestRejected(504, "deadline_exceeded", f"The query did not finish within {REQUEST_DEADLINE:.0f} seconds.")
+
+
+async def _run_within_deadline(coro, deadline):
+    """Awaits the agent run, cancelling it (and its in-flight LLM and tool calls) at the deadline."""
+    try:
+        return await asyncio.wait_for(coro, remaining(deadline))
+    except asyncio.TimeoutError:
+        raise _deadline_exceeded()
+
+
+async def _prepend(first, stream):
+    try:
+        yield first
+        async for item in stream:
+            yield item
+    finally:
+        await stream.aclose()
+
+
+def _batch_items(messages):
+    """Validates a batch's `messages`: strings, or {"id", "message"} objects. Returns (id, message) pairs."""
+    if not isinstance(messages, list) or not messages:
+        raise ValueError("'messages' must be a non-empty list.")
+    if len(messages) > BATCH_MAX_ITEMS:
+        raise ValueError(f"A batch takes at most {BATCH_MAX_ITEMS} messages; got {len(messages)}.")
+    items = []
+    for index, item in enumerate(messages):
+        item_id, message = (item.get("id"), item.get("message")) if isinstance(item, dict) else (None, item)
+        if not isinstance(message, str) or not message.strip():
+            raise ValueError(f"messages[{index}] has no message text.")
+        items.append((item_id, message))
+    return items
+
+
+def _is_tool_error(tool_output):
+    # tool errors are returned as JSON objects whose first key is "error"
+    return isinstance(tool_output, str) and tool_output.startswith('{"error"')
+
+
+def _parse_output(agent_output):
+    try:
+        return json.loads(agent_output)
+    except (json.JSONDecodeError, TypeError):
+        return agent_output
+
+
+async def _answer(user_message, chat_history, history_data, usage, deadline, skip_cache=False):
+    """
+    Answers one question: through the intent router's fast path when a rule matches, else
+    with an agent run shared via the answer cache. Both are admitted and cancelled at the
+    deadline; a fast-path call that returns a tool error falls back to the agent.
+    Returns the output and the response headers describing the route taken.
+    """
+    routed = intent_router.route(user_message) if FAST_PATH_ENABLED else None
+    fast_path_tool = _find_agent_tool(routed[0].tool_name) if routed else None
+    if fast_path_tool:
+        rule, tool_args = routed
+        print(f"Fast path '{rule.name}': calling {rule.tool_name} with {tool_args}")
+        async with admission.slot(deadline):
+            tool_output = await _run_within_deadline(fast_path_tool.ainvoke(tool_args), deadline)
+        if not _is_tool_error(tool_output):
+            return tool_output, {"X-Route": f"fast-path/{rule.name}"}
+        intent_router.record_tool_error()
+        print(f"Fast path '{rule.name}' returned a tool error; answering with the agent instead.")
+
+    async def run_agent():
+        async with admission.slot(deadline):
+            executor = tool_agents.for_question(user_message, chat_history, usage)
+            response = await _run_within_deadline(executor.ainvoke(
+                {"input": user_message, "chat_history": chat_history},
+                config={"callbacks": [usage]}
+            ), deadline)
+        _record_agent_run(usage)
+        return response.get('output', str(response))
+
+    agent_output, cache_status = await answer_cache.get_or_run(
+        answer_cache_key(user_message, history_data), run_agent, skip_cache=skip_cache
+    )
+    return agent_output, {"X-Route": "agent", "X-Cache": cache_status}
+
+
+def _skip_answer_cache(request: Request):
+    """Clients opt out with `X-Skip-Cache: 1` or `Cache-Control: no-cache`."""
+    if request.headers.get("x-skip-cache", "").lower() in ("1", "true", "yes"):
+        return True
+    return "no-cache" in request.headers.get("cache-control", "").lower()
+
+
+def _find_agent_tool(tool_name):
+    for tool_obj in agent_executor.tools:
+        if tool_obj.name == tool_name:
+            return tool_obj
+    return None
+
+
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _chunk_text(chunk):
+    content = getattr(chunk, "content", "")
+    if isinstance(content, list):
+        return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return content or ""
+
+
+def _summarize_tool_output(output, max_chars=STREAM_TOOL_SUMMARY_CHARS):
+    text = getattr(output, "content", output)
+    if not isinstance(text, str):
+        text = json.dumps(text, default=str)
+    if len(text) > max_chars:
+        return f"{text[:max_chars]}... ({len(text) - max_chars} more characters)"
+    return text
+
+
+async def warm_up_agent():
+    """Builds the agent and waits until its tool servers answer."""
+    global agent_executor, tool_agents, mcp_client
+    executor, agents, client = await initialize_rag_agent_with_mcp()
+    try:
+        await client.wait_ready()
+    except BaseException:
+        await client.close()
+        raise
+    conversation_memory.llm = create_llm()
+    agent_executor, tool_agents, mcp_client = executor, agents, client
+
+
+async def _warm_up_in_background():
+    delay = WARMUP_RETRY_DELAY
+    while True:
+        warmup_state["attempts"] += 1
+        try:
+            await warm_up_agent()
+            warmup_state.update(status="ready", error=None, ready_after_s=round(time.monotonic() - warmup_state["started_at"], 3))
+            print(f"NLCP_RAG_AGENT ready after {warmup_state['ready_after_s']}s.")
+            return
+        except Exception as e:
+            warmup_state.update(status="retrying", error=str(e))
+            print(f"Agent warmup attempt {warmup_state['attempts']} failed: {e}; retrying in {delay:.0f}s.")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WARMUP_MAX_RETRY_DELAY)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     FastAPI lifespan event handler.
+    In "background" startup mode the server starts answering at once (/healthz) while the
+    agent warms up, retrying on failure; /ready reports when it can take queries.
     """
     global agent_executor, mcp_client
-    print("FastAPI server starting up... Initializing NLCP_RAG_AGENT.")
-    try:
-        agent_executor, mcp_client = await initialize_rag_agent_with_mcp()
-        if agent_executor and mcp_client:
+    warmup_task = None
+    warmup_state["started_at"] = time.monotonic()
+    if STARTUP_MODE == "background":
+        print("FastAPI server starting up... Warming up NLCP_RAG_AGENT in the background.")
+        warmup_task = asyncio.create_task(_warm_up_in_background())
+    else:
+        print("FastAPI server starting up... Initializing NLCP_RAG_AGENT.")
+        try:
+            await warm_up_agent()
+            warmup_state.update(status="ready", ready_after_s=round(time.monotonic() - warmup_state["started_at"], 3))
             print("NLCP_RAG_AGENT initialized successfully.")
-        else:
-            print("Failed to initialize NLCP_RAG_AGENT. Check rag_agent.py and its dependencies for errors.")
-            raise RuntimeError("Agent initialization failed. FastAPI server cannot start.")
-    except Exception as e:
-        print(f"CRITICAL ERROR during agent initialization in FastAPI startup: {e}")
-        agent_executor = None
-        mcp_client = None
-        raise RuntimeError(f"FastAPI startup failed: {e}")
-    
+        except Exception as e:
+            print(f"CRITICAL ERROR during agent initialization in FastAPI startup: {e}")
+            agent_executor = None
+            mcp_client = None
+            raise RuntimeError(f"FastAPI startup failed: {e}")
+
     yield
 
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
+        try:
+            await warmup_task
+        except asyncio.CancelledError:
+            pass
     print("FastAPI server shutting down... Closing MCP client connections.")
     if mcp_client:
         await mcp_client.close() 
@@ -69,7 +324,156 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-Id"],
 )
+# outermost, so the request id and timings cover CORS handling too
+app.add_middleware(RequestTracingMiddleware)
+
+
+@app.get("/healthz")
+async def liveness():
+    """Liveness: the process is up and serving, whether or not the agent is ready."""
+    return {"status": "alive"}
+
+
+@app.get("/ready")
+async def readiness():
+    """Readiness: 200 once the agent and its tool servers can take queries, 503 until then."""
+    if agent_executor and mcp_client:
+        return {"status": "ready", "ready_after_s": warmup_state["ready_after_s"]}
+    return JSONResponse(
+        status_code=503,
+        content={key: value for key, value in warmup_state.items() if key != "started_at"},
+        headers={"Retry-After": str(int(WARMUP_RETRY_DELAY) or 1)}
+    )
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """
+    Prometheus metrics for the API and, when they run in their own processes, every tool
+    server replica (labelled by server and replica).
+    """
+    snapshots = [(metrics.snapshot(), {})]
+    if mcp_client:
+        try:
+            snapshots += await asyncio.wait_for(mcp_client.get_metrics(), METRICS_TOOL_TIMEOUT)
+        except Exception as e:
+            print(f"Could not collect tool server metrics: {e}")
+    return PlainTextResponse(render(snapshots), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@app.get("/admin/stats")
+async def get_admin_stats(request: Request):
+    rejection = _admin_rejection(request)
+    if rejection:
+        return rejection
+    if not mcp_client:
+        return JSONResponse(
+            status_code=503,
+            content={"error": "MCP tool servers are not connected."}
+        )
+    try:
+        stats = await mcp_client.get_stats()
+        stats["api"] = answer_cache.stats()
+        stats["api"]["sessions"] = conversation_memory.store.stats()
+        stats["api"]["fast_path"] = intent_router.stats()
+        stats["api"]["admission"] = admission.stats()
+        stats["api"]["tool_selection"] = tool_agents.stats()
+        runs = agent_run_stats["agent_runs"]
+        stats["api"]["agent_runs"] = dict(
+            agent_run_stats,
+            tool_calls_per_run=round(agent_run_stats["tool_calls"] / runs, 3) if runs else 0.0,
+            llm_calls_per_run=round(agent_run_stats["llm_calls"] / runs, 3) if runs else 0.0,
+        )
+        return JSONResponse(status_code=200, content=stats)
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"error": f"Failed to collect tool server stats: {e}"}
+        )
+
+
+@app.post("/admin/cache/clear")
+async def clear_tool_caches(request: Request, tool_name: str = None):
+    """
+    Invalidates cached tool results in both MCP servers, for one tool or all of them.
+    Clearing everything also drops the API's cached answers.
+    """
+    rejection = _admin_rejection(request)
+    if rejection:
+        return rejection
+    if not mcp_client:
+        return JSONResponse(
+            status_code=503,
+            content={"error": "MCP tool servers are not connected."}
+        )
+    try:
+        cleared = await mcp_client.clear_caches(tool_name)
+        if tool_name is None:
+            cleared["answers"] = answer_cache.clear()
+        return JSONResponse(status_code=200, content={"tool_name": tool_name, "cleared": cleared})
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"error": f"Failed to clear tool caches: {e}"}
+        )
+
+
+@app.get("/results/{handle}")
+async def download_result(handle: str, request: Request, page_size: int = RESULT_PAGE_SIZE):
+    """
+    Streams a large tool result, kept server-side under `handle`, as NDJSON (one row per
+    line), fetching it from the owning tool server one page at a time. Only the session
+    whose answer pointed at the result (its id in `X-Session-Id` or `?session_id=`) or an
+    admin may download it.
+    """
+    session_id = request.headers.get("x-session-id") or request.query_params.get("session_id")
+    session = conversation_memory.store.get(session_id) if session_id else None
+    if (session is None or handle not in session.result_handles) and _admin_rejection(request):
+        # the same answer as for an unknown handle, so handles cannot be probed
+        return JSONResponse(
+            status_code=404,
+            content={"error": f"Result {handle} does not exist or has expired."}
+        )
+    if not mcp_client:
+        return JSONResponse(
+            status_code=503,
+            content={"error": "MCP tool servers are not connected."}
+        )
+    page_size = max(1, min(page_size, RESULT_PAGE_SIZE_MAX))
+    try:
+        page = await mcp_client.fetch_result_page(handle, 0, page_size)
+    except KeyError:
+        page = {"error": "not_found"}
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"error": f"Failed to fetch result {handle}: {e}"}
+        )
+    if "error" in page:
+        return JSONResponse(
+            status_code=404,
+            content={"error": f"Result {handle} does not exist or has expired."}
+        )
+
+    async def row_stream(page):
+        while True:
+            for row in page["rows"]:
+                yield json.dumps(row) + "\n"
+            if page["next_offset"] is None or await request.is_disconnected():
+                return
+            page = await mcp_client.fetch_result_page(handle, page["next_offset"], page_size)
+            if "error" in page:
+                # expired mid-download; the short body tells the client it is incomplete
+                print(f"Result {handle} expired while streaming.")
+                return
+
+    return StreamingResponse(
+        row_stream(page),
+        media_type="application/x-ndjson",
+        headers={"X-Row-Count": str(page["row_count"])}
+    )
 
 
 @app.post("/query")
@@ -101,34 +505,32 @@ async def handle_agent_query_fastapi(request: Request):
 
     print(f"\nReceived query from frontend: {user_message}")
 
-    formatted_chat_history = []
-    for msg_data in chat_history_data:
-        msg_type = msg_data.get("type")
-        msg_content = msg_data.get("content", "")
-        if msg_type == "human":
-            formatted_chat_history.append(HumanMessage(content=msg_content))
-        elif msg_type == "ai":
-            formatted_chat_history.append(AIMessage(content=msg_content))
+    usage = TokenUsageHandler()
+    deadline = _request_deadline()
 
     try:
-        response = await agent_executor.ainvoke(
-            {"input": user_message, "chat_history": formatted_chat_history}
+        session = conversation_memory.load(request_data.get("session_id"), chat_history_data)
+    except ValueError as e:
+        return JSONResponse(status_code=422, content={"error": str(e)})
+
+    try:
+        agent_output, headers = await _answer(
+            user_message, session.to_messages(), session.to_history_data(), usage,
+            deadline, skip_cache=_skip_answer_cache(request),
         )
-        
-        agent_output = response.get('output', str(response))
+        usage_report = dict(usage.summary(), history_tokens=session.history_tokens())
+        await conversation_memory.record(session, user_message, str(agent_output))
+        print(f"Prompt tokens for this request: {usage_report}")
 
-        try:
-            parsed_result = json.loads(agent_output)
-            return JSONResponse(
-                status_code=200,
-                content={"response": parsed_result}
-            )
-        except json.JSONDecodeError:
-            return JSONResponse(
-                status_code=200,
-                content={"response": agent_output}
-            )
+        return JSONResponse(
+            status_code=200,
+            content={"response": _parse_output(agent_output), "session_id": session.session_id, "usage": usage_report},
+            headers=headers
+        )
 
+    except RequestRejected as rejection:
+        print(f"Query not completed ({rejection.reason}): {rejection}")
+        return _rejected_response(rejection)
     except Exception as e:
         print(f"Error during agent execution: {e}")
         return JSONResponse(
@@ -136,9 +538,226 @@ async def handle_agent_query_fastapi(request: Request):
             content={"error": f"An internal server error occurred: {e}"}
         )
 
+@app.post("/query/stream")
+async def handle_agent_query_stream(request: Request):
+    """
+    Streams the agent run as Server-Sent Events: `session` (session id), `tool_start`
+    (tool and arguments), `tool_end` (truncated result), `token` (LLM output text),
+    then `final` or `error`.
+    A client disconnect stops the run, cancelling the in-flight LLM or tool call.
+    """
+    if not agent_executor:
+        return JSONResponse(
+            status_code=503,
+            content={"error": "NLCP_RAG_AGENT is not initialized. Please check server startup logs."}
+        )
+
+    try:
+        request_data = await request.json()
+    except json.JSONDecodeError:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Invalid JSON format in request body."}
+        )
+
+    user_message = request_data.get("message")
+    if not user_message:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "No 'message' provided in the request body."}
+        )
+
+    print(f"\nReceived streaming query from frontend: {user_message}")
+    deadline = _request_deadline()
+    try:
+        session = conversation_memory.load(request_data.get("session_id"), request_data.get("chat_history", []))
+    except ValueError as e:
+        return JSONResponse(status_code=422, content={"error": str(e)})
+    formatted_chat_history = session.to_messages()
+    usage = TokenUsageHandler()
+
+    async def agent_events(queue):
+        # a task of its own, so the deadline can cancel the run wherever it is waiting
+        executor = tool_agents.for_question(user_message, formatted_chat_history, usage)
+        events = executor.astream_events(
+            {"input": user_message, "chat_history": formatted_chat_history},
+            config={"callbacks": [usage]},
+            version="v2"
+        )
+        try:
+            async for event in events:
+                await queue.put(event)
+        except Exception as e:
+            await queue.put(e)
+        finally:
+            await events.aclose()
+        await queue.put(None)
+
+    async def event_stream():
+        await admission.acquire(deadline)
+        started = time.monotonic()
+        queue = asyncio.Queue(maxsize=STREAM_EVENT_BUFFER)
+        producer = asyncio.create_task(agent_events(queue))
+        try:
+            yield _sse_event("session", {"session_id": session.session_id})
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), remaining(deadline))
+                except asyncio.TimeoutError:
+                    raise _deadline_exceeded()
+                if event is None:
+                    break
+                if isinstance(event, Exception):
+                    raise event
+                if await request.is_disconnected():
+                    print("Streaming client disconnected; cancelling agent run.")
+                    break
+
+                kind = event["event"]
+                if kind == "on_chat_model_stream":
+                    text = _chunk_text(event["data"].get("chunk"))
+                    if text:
+                        yield _sse_event("token", {"text": text})
+                elif kind == "on_tool_start":
+                    yield _sse_event("tool_start", {
+                        "tool": event["name"],
+                        "args": event["data"].get("input"),
+                        "run_id": event["run_id"],
+                    })
+                elif kind == "on_tool_end":
+                    yield _sse_event("tool_end", {
+                        "tool": event["name"],
+                        "summary": _summarize_tool_output(event["data"].get("output")),
+                        "run_id": event["run_id"],
+                    })
+                elif kind == "on_chain_end" and not event.get("parent_ids"):
+                    output = event["data"].get("output") or {}
+                    agent_output = output.get("output", str(output))
+                    _record_agent_run(usage)
+                    usage_report = dict(usage.summary(), history_tokens=session.history_tokens())
+                    await conversation_memory.record(session, user_message, str(agent_output))
+                    yield _sse_event("final", {"response": agent_output, "usage": usage_report})
+        except asyncio.CancelledError:
+            print("Streaming response cancelled; agent run stopped.")
+            raise
+        except RequestRejected as rejection:
+            print(f"Streamed query not completed ({rejection.reason}): {rejection}")
+            yield _sse_event("error", {"error": rejection.reason, "message": str(rejection),
+                                       "retry_after": rejection.retry_after})
+        except Exception as e:
+            print(f"Error during streamed agent execution: {e}")
+            yield _sse_event("error", {"error": f"An internal server error occurred: {e}"})
+        finally:
+            # cancelling the producer unwinds the agent run and any pending tool call
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+            admission.release(time.monotonic() - started)
+
+    # run up to the first event here, so a full admission queue is still a plain 429/503
+    stream = event_stream()
+    try:
+        first_event = await stream.__anext__()
+    except RequestRejected as rejection:
+        return _rejected_response(rejection)
+
+    return StreamingResponse(
+        _prepend(first_event, stream),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/query/batch")
+async def handle_agent_query_batch(request: Request):
+    """
+    Answers a list of independent questions, e.g. a nightly report, with up to `concurrency`
+    of them running at once. Tool calls repeated across the batch's agent runs (same tool,
+    same arguments) reach the databases once. Streams one NDJSON line per item as it
+    finishes, in completion order and tagged with its `index` (and `id` if given), then a
+    `summary` line. A failed item gets an `error` line; the rest of the batch carries on.
+    The summary's `session_id` downloads the large results the answers point at.
+    """
+    if not agent_executor:
+        return JSONResponse(
+            status_code=503,
+            content={"error": "NLCP_RAG_AGENT is not initialized. Please check server startup logs."}
+        )
+
+    try:
+        request_data = await request.json()
+    except json.JSONDecodeError:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Invalid JSON format in request body."}
+        )
+
+    try:
+        items = _batch_items(request_data.get("messages"))
+        concurrency = int(request_data.get("concurrency", BATCH_CONCURRENCY))
+    except (ValueError, TypeError) as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+    skip_cache = _skip_answer_cache(request)
+
+    print(f"\nReceived batch of {len(items)} queries (concurrency {concurrency}).")
+    shared = SharedToolResults()
+    limit = asyncio.Semaphore(concurrency)
+    batch_session = conversation_memory.load()
+
+    async def answer_item(index, item_id, message):
+        line = {"index": index, "id": item_id} if item_id is not None else {"index": index}
+        async with limit:
+            shared.activate()
+            usage = TokenUsageHandler()
+            started = time.monotonic()
+            try:
+                # each item gets the full per-request deadline from when it starts, not from arrival
+                agent_output, headers = await _answer(message, [], [], usage, _request_deadline(), skip_cache)
+                conversation_memory.record_results(batch_session, str(agent_output))
+                line.update(response=_parse_output(agent_output), route=headers["X-Route"], usage=usage.summary())
+            except RequestRejected as rejection:
+                line.update(error=rejection.reason, message=str(rejection), retry_after=rejection.retry_after)
+            except Exception as e:
+                print(f"Error answering batch item {index}: {e}")
+                line.update(error="internal_error", message=f"An internal server error occurred: {e}")
+            line["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+        return line
+
+    async def result_stream():
+        started = time.monotonic()
+        tasks = [asyncio.create_task(answer_item(index, *item)) for index, item in enumerate(items)]
+        failed = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                line = await next_done
+                failed += "error" in line
+                yield json.dumps(line, default=str) + "\n"
+            yield json.dumps({"summary": dict(
+                shared.stats(),
+                session_id=batch_session.session_id,
+                items=len(items),
+                succeeded=len(items) - failed,
+                failed=failed,
+                elapsed_ms=round((time.monotonic() - started) * 1000, 1),
+            )}) + "\n"
+        finally:
+            # a client that disconnects stops whatever is still queued or running
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    return StreamingResponse(
+        result_stream(),
+        media_type="application/x-ndjson",
+        headers={"X-Batch-Size": str(len(items))}
+    )
+
 if __name__ == "__main__":
+    if "--import-time" in sys.argv:
+        from import_time import report
+        report("api_server")
+        sys.exit(0)
     if not GOOGLE_API_KEY:
         print("ERROR: GOOGLE_API_KEY not found in .env. Please set it to proceed.")
-        import sys; sys.exit(1)
+        sys.exit(1)
     
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
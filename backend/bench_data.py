@@ -0,0 +1,235 @@
+"""
+Seeded datasets and local stand-ins for the tool servers' databases: a SQLite connection
+that speaks enough of the mysql-connector API for MySQLConnectionPool and the MySQL tools,
+and proxies that charge time spent in database calls to the current benchmark request.
+"""
+import contextvars
+import random
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from bench_holdings import create_transactions
+from holdings import SQLITE, ensure_schema, rebuild_holdings
+
+FIRST_NAMES = ["Aarav", "Diya", "Kabir", "Meera", "Rohan", "Ananya", "Vikram", "Isha", "Arjun", "Priya",
+               "Karan", "Sneha", "Nikhil", "Tara", "Siddharth", "Neha"]
+LAST_NAMES = ["Sharma", "Iyer", "Kapoor", "Reddy", "Mehta", "Nair", "Gupta", "Bose", "Khan", "Joshi"]
+PROFESSIONS = ["Actor", "Sportsperson", "Doctor", "Entrepreneur", "Musician", "Architect"]
+CITIES = ["Mumbai", "Delhi", "Bengaluru", "Chennai", "Kolkata", "Pune", "Hyderabad"]
+RISK_APPETITES = ["High", "Medium", "Low"]
+INVESTMENT_TYPES = ["Equity", "Mutual Funds", "Bonds", "Real Estate", "Gold", "Fixed Deposits"]
+RELATIONSHIP_MANAGERS = [f"{first} {last}" for first, last in zip(FIRST_NAMES[::2], LAST_NAMES)]
+
+# seconds spent per stage ("db", ...) by the benchmark request running in this context
+_stage_times = contextvars.ContextVar("bench_stage_times", default=None)
+
+
+class StageTimes:
+    """Wall time per stage for one request; written from tool worker threads as well."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.seconds = defaultdict(float)
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.seconds[stage] += seconds
+
+    def activate(self):
+        """Makes this the current request's timer; returns the token for `deactivate`."""
+        return _stage_times.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        _stage_times.reset(token)
+
+
+def record_stage(stage, seconds):
+    # ToolBackend copies the caller's context into its worker threads, so this finds the request
+    times = _stage_times.get()
+    if times is not None:
+        times.add(stage, seconds)
+
+
+def client_id(n):
+    # the same ids bench_holdings.create_transactions draws from
+    return f"C{n:05d}"
+
+
+def client_documents(clients, seed=7):
+    rng = random.Random(seed)
+    for n in range(clients):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} ({rng.choice(PROFESSIONS)})"
+        manager = RELATIONSHIP_MANAGERS[n % len(RELATIONSHIP_MANAGERS)]
+        preferences = rng.sample(INVESTMENT_TYPES, rng.randrange(1, 4))
+        holdings = [{"type": kind, "value_crores": round(rng.uniform(0.5, 80), 2)} for kind in preferences]
+        yield {
+            "client_id": client_id(n),
+            "name": name,
+            "address": f"{rng.randrange(1, 400)} MG Road, {rng.choice(CITIES)}",
+            "risk_appetite": rng.choice(RISK_APPETITES),
+            "investment_preferences": preferences,
+            "relationship_manager": manager,
+            "initial_portfolio_value_crores": round(sum(holding["value_crores"] for holding in holdings), 2),
+            "portfolio_by_preference": holdings,
+        }
+
+
+def seed_mongo(collection, clients, seed=7):
+    collection.delete_many({})
+    batch = []
+    for document in client_documents(clients, seed):
+        batch.append(document)
+        if len(batch) == 5_000:
+            collection.insert_many(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch)
+
+
+def seed_sqlite(path, clients, transactions, seed=7):
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS client_portfolios (
+                client_id TEXT PRIMARY KEY,
+                portfolio_value DECIMAL(20, 2) NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_client_portfolios_value ON client_portfolios (portfolio_value)")
+        rng = random.Random(seed)
+        conn.executemany(
+            "INSERT INTO client_portfolios VALUES (?, ?)",
+            ((client_id(n), round(rng.uniform(1e6, 5e9), 2)) for n in range(clients)),
+        )
+        conn.commit()
+        create_transactions(conn, transactions, clients, seed)
+        ensure_schema(conn, SQLITE)
+        rebuild_holdings(conn, SQLITE)
+    finally:
+        conn.close()
+
+
+class SQLiteCursor:
+    """
+    A mysql-connector style cursor over sqlite3: %s placeholders, dictionary rows, and
+    REAL values returned as Decimal the way MySQL returns DECIMAL columns.
+    """
+
+    def __init__(self, cursor, dictionary):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    def _row(self, row):
+        if row is None:
+            return None
+        values = [Decimal(repr(value)) if isinstance(value, float) else value for value in row]
+        if not self._dictionary:
+            return tuple(values)
+        return dict(zip((column[0] for column in self._cursor.description), values))
+
+    def _timed(self, call, *args):
+        started = time.perf_counter()
+        try:
+            return call(*args)
+        finally:
+            record_stage("db", time.perf_counter() - started)
+
+    def execute(self, query, params=()):
+        self._timed(self._cursor.execute, SQLITE.sql(query), tuple(params))
+
+    def fetchone(self):
+        return self._row(self._timed(self._cursor.fetchone))
+
+    def fetchmany(self, size=1):
+        return [self._row(row) for row in self._timed(self._cursor.fetchmany, size)]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._timed(self._cursor.fetchall)]
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """Enough of a mysql-connector connection for MySQLConnectionPool, holdings and the MySQL tools."""
+
+    unread_result = False
+
+    def __init__(self, path):
+        # autocommit like the pooled MySQL connections; holdings issues its own BEGIN
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+
+    def cursor(self, dictionary=False, buffered=True):
+        return SQLiteCursor(self._conn.cursor(), dictionary)
+
+    def is_connected(self):
+        return True
+
+    def consume_results(self):
+        pass
+
+    def commit(self):
+        if self._conn.in_transaction:
+            self._conn.execute("COMMIT")
+
+    def rollback(self):
+        if self._conn.in_transaction:
+            self._conn.execute("ROLLBACK")
+
+    def close(self):
+        self._conn.close()
+
+
+class TimedDriver:
+    """
+    Wraps a MongoClient (or mongomock client) and everything reached through it, so time
+    spent in driver calls and cursor iteration is charged to the "db" stage.
+    """
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr) or not hasattr(attr, "__self__"):
+            # collections reached as attributes (db.clients) are objects, not bound methods
+            return _wrap(attr)
+
+        def call(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = attr(*args, **kwargs)
+            finally:
+                record_stage("db", time.perf_counter() - started)
+            return _wrap(result)
+
+        return call
+
+    def __getitem__(self, key):
+        return _wrap(self._target[key])
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            return next(self._target)
+        finally:
+            record_stage("db", time.perf_counter() - started)
+
+
+def _wrap(value):
+    # databases, collections and cursors; documents, lists and scalars pass through
+    if isinstance(value, (dict, list, tuple, str, bytes, int, float, bool)) or value is None:
+        return value
+    if any(hasattr(type(value), name) for name in ("find", "list_collection_names", "__next__")):
+        return TimedDriver(value)
+    return value
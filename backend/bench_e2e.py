@@ -0,0 +1,363 @@
+"""
+End-to-end benchmark of /query and every MongoDB and MySQL tool with no Gemini, MongoDB or
+MySQL: a scripted chat model, a seeded mongomock (or local MongoDB) dataset and a SQLite
+stand-in for MySQL. Reports latency percentiles, throughput and time per stage (LLM, tool,
+DB) as JSON, so runs of two versions can be diffed.
+
+    pip install -r requirements-bench.txt
+    python bench_e2e.py --clients 5000 --transactions 200000 --requests 400 --concurrency 8 --output bench.json
+
+mongomock has no $text search, so the name-word tools fall back to a regex scan against it;
+pass --mongo-uri mongodb://localhost:27017 to seed and query a local MongoDB instead. --url drives
+an already running server with the same questions (latency only, no stage breakdown).
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from bench_data import (
+    INVESTMENT_TYPES, RELATIONSHIP_MANAGERS, SQLiteConnection, StageTimes, TimedDriver,
+    client_documents, client_id, record_stage, seed_mongo, seed_sqlite,
+)
+from bench_holdings import SYMBOLS
+
+BENCH_DB_NAME = "nlcp_bench"
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Stands in for Gemini. For a question in `script` the first turn asks for the scripted
+    tool calls; once their results are in it answers. Unknown questions are answered directly.
+    """
+
+    script: dict
+    latency_ms: float = 0.0
+
+    @property
+    def _llm_type(self):
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _respond(self, messages):
+        last = messages[-1]
+        prompt_tokens = sum(len(str(message.content)) for message in messages) // 4
+        if isinstance(last, ToolMessage):
+            results = [message for message in messages if isinstance(message, ToolMessage)]
+            content = f"Answered from {len(results)} tool results."
+            tool_calls = []
+        else:
+            calls = self.script.get(str(last.content), [])
+            content = "" if calls else "No tools are needed for that."
+            tool_calls = [
+                {"name": call["name"], "args": call["args"], "id": f"call_{index}", "type": "tool_call"}
+                for index, call in enumerate(calls)
+            ]
+        completion_tokens = len(content) // 4 + 20 * len(tool_calls)
+        return AIMessage(
+            content=content,
+            tool_calls=tool_calls,
+            usage_metadata={"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+                            "total_tokens": prompt_tokens + completion_tokens},
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        started = time.perf_counter()
+        time.sleep(self.latency_ms / 1000)
+        message = self._respond(messages)
+        record_stage("llm", time.perf_counter() - started)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        started = time.perf_counter()
+        await asyncio.sleep(self.latency_ms / 1000)
+        message = self._respond(messages)
+        record_stage("llm", time.perf_counter() - started)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def build_scenarios(clients, seed):
+    """One question per tool, with arguments that match the seeded data."""
+    first_client = next(client_documents(clients, seed))
+    manager = RELATIONSHIP_MANAGERS[0]
+    some_ids = [client_id(n) for n in range(min(10, clients))]
+    tool_args = {
+        # mongodb_tools
+        "get_client_profile_by_name": {"client_name": first_client["name"]},
+        "get_clients_by_profession": {"profession": "Doctor"},
+        "get_clients_by_risk_appetite": {"risk_appetite_level": "High"},
+        "get_clients_by_investment_preference": {"preference": INVESTMENT_TYPES[0]},
+        "get_top_relationship_managers": {},
+        "get_client_profile_by_id": {"client_id": first_client["client_id"]},
+        "get_client_profiles_by_ids": {"client_ids": some_ids},
+        "get_client_ids_by_relationship_manager": {"relationship_manager_name": manager},
+        "get_top_n_clients_by_investment_type_value": {"investment_type": INVESTMENT_TYPES[1], "limit": 5},
+        # mysql_tools
+        "get_top_n_portfolios": {"limit": 10},
+        "get_portfolio_values_by_relationship_manager": {"relationship_manager_name": manager},
+        "get_transactions_for_relationship_manager": {"relationship_manager_name": manager, "limit": 20},
+        "get_top_n_portfolios_with_profiles": {"limit": 10},
+        "get_portfolio_values_for_ids": {"client_ids": some_ids},
+        "get_client_transactions_for_ids": {"client_ids": some_ids, "limit_per_client": 5},
+        "get_client_transactions": {"client_id": first_client["client_id"], "limit": 50},
+        "get_stock_holders_for_stock": {"stock_symbol": SYMBOLS[0]},
+    }
+    return [
+        {"tool": name, "question": f"[bench] {name} {json.dumps(args, sort_keys=True)}", "args": args}
+        for name, args in tool_args.items()
+    ]
+
+
+def percentiles(samples_ms):
+    if not samples_ms:
+        return {}
+    ordered = sorted(samples_ms)
+
+    def rank(q):
+        return round(ordered[max(0, math.ceil(q * len(ordered)) - 1)], 3)
+
+    return {"p50_ms": rank(0.50), "p95_ms": rank(0.95), "p99_ms": rank(0.99),
+            "mean_ms": round(statistics.fmean(ordered), 3), "max_ms": round(ordered[-1], 3)}
+
+
+def summarize(samples, elapsed_s):
+    """Latency, throughput and mean ms per stage for a list of timed calls."""
+    ok = [sample for sample in samples if not sample["error"]]
+    summary = {"requests": len(samples), "errors": len(samples) - len(ok)}
+    if elapsed_s:
+        summary["throughput_per_s"] = round(len(samples) / elapsed_s, 2)
+    summary.update(percentiles([sample["ms"] for sample in ok]))
+    stages = sorted({stage for sample in ok for stage in sample["stages"]})
+    if stages:
+        summary["stages_mean_ms"] = {
+            stage: round(statistics.fmean(sample["stages"].get(stage, 0.0) for sample in ok), 3) for stage in stages
+        }
+    return summary
+
+
+async def timed(call, stages=True):
+    times = StageTimes()
+    token = times.activate()
+    started = time.perf_counter()
+    try:
+        error = await call()
+    except Exception as e:
+        error = str(e) or type(e).__name__
+    finally:
+        StageTimes.deactivate(token)
+    total_ms = (time.perf_counter() - started) * 1000
+    sample = {"ms": total_ms, "error": error, "stages": {}}
+    if stages:
+        sample["stages"] = {stage: seconds * 1000 for stage, seconds in times.seconds.items()}
+        # whatever the request spent outside the model and the tools: routing, memory, encoding
+        sample["stages"]["other"] = max(0.0, total_ms - sample["stages"].get("llm", 0.0) - sample["stages"].get("tool", 0.0))
+    return sample
+
+
+async def run_load(jobs, requests, concurrency, stages=True):
+    """Runs `requests` calls round-robin over `jobs` ((name, call) pairs) `concurrency` at a time."""
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = {name: [] for name, _ in jobs}
+
+    async def one(index):
+        name, call = jobs[index % len(jobs)]
+        async with semaphore:
+            samples[name].append(await timed(call, stages))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(requests)))
+    elapsed = time.perf_counter() - started
+    every = [sample for name_samples in samples.values() for sample in name_samples]
+    return {
+        "overall": summarize(every, elapsed),
+        # per name the wall clock is shared with the other jobs, so no throughput
+        "by_tool": {name: summarize(name_samples, None) for name, name_samples in samples.items()},
+        "first_errors": {name: next(s["error"] for s in name_samples if s["error"])
+                         for name, name_samples in samples.items() if any(s["error"] for s in name_samples)},
+    }
+
+
+def configure_env(args):
+    # read by the tool servers, rag_agent and api_server when they are imported
+    os.environ.setdefault("GOOGLE_API_KEY", "bench-e2e")
+    os.environ.update({
+        "MCP_TRANSPORT": "inprocess",
+        "STARTUP_MODE": "eager",
+        "TOOL_SCHEMA_CACHE": "",
+        "FAST_PATH_ENABLED": "true" if args.fast_path else "false",
+        "MONGO_URI": args.mongo_uri or "mongodb://mongomock",
+        "MONGO_DB_NAME": BENCH_DB_NAME,
+        # mongomock has no use for indexes; a real MongoDB needs them for the benchmark to mean anything
+        "MONGO_BOOTSTRAP_INDEXES": "true" if args.mongo_uri else "false",
+    })
+
+
+def install_stand_ins(args, sqlite_path):
+    """Points the tool server modules at the seeded datasets before the agent loads them."""
+    import mongodb_tools
+    import mysql_tools
+    from holdings import SQLITE, HoldingsRefresher
+    from mongo_connection import SharedMongoClient, mongo_client_options
+    from mysql_pool import MySQLConnectionPool
+
+    if args.mongo_uri:
+        from pymongo import MongoClient
+        with MongoClient(args.mongo_uri) as seed_client:
+            seed_mongo(seed_client[BENCH_DB_NAME].clients, args.clients, args.seed)
+        client_factory = lambda uri, **options: TimedDriver(MongoClient(uri, **options))
+    else:
+        import mongomock
+        mock_client = mongomock.MongoClient()
+        seed_mongo(mock_client[BENCH_DB_NAME].clients, args.clients, args.seed)
+        client_factory = lambda uri, **options: TimedDriver(mock_client)
+
+    mongo_client = SharedMongoClient(os.environ["MONGO_URI"], client_factory=client_factory, **mongo_client_options())
+    for module in (mongodb_tools, mysql_tools):
+        module.mongo_client = mongo_client
+        if not args.tool_cache:
+            module.tool_cache.ttls = {}
+            module.tool_cache.default_ttl = 0.0
+
+    mysql_tools.mysql_pool = MySQLConnectionPool(lambda: SQLiteConnection(sqlite_path), size=mysql_tools.mysql_pool.size)
+    mysql_tools.holdings_refresher = HoldingsRefresher(
+        interval=mysql_tools.holdings_refresher.interval, dialect=SQLITE
+    )
+
+
+def timed_tool(tool_obj):
+    """Charges a tool's calls to the "tool" stage of the request that made them."""
+    coroutine = tool_obj.coroutine
+
+    async def call(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await coroutine(*args, **kwargs)
+        finally:
+            record_stage("tool", time.perf_counter() - started)
+
+    tool_obj.coroutine = call
+
+
+def tool_error(result):
+    # tools report failures as JSON objects whose first key is "error"
+    return result if isinstance(result, str) and result.startswith('{"error"') else None
+
+
+async def bench_in_process(args, scenarios):
+    import httpx
+    import api_server
+    import rag_agent
+
+    script = {scenario["question"]: [{"name": scenario["tool"], "args": scenario["args"]}] for scenario in scenarios}
+    rag_agent.create_llm = api_server.create_llm = lambda: ScriptedChatModel(script=script, latency_ms=args.llm_latency_ms)
+
+    report = {}
+    async with api_server.lifespan(api_server.app):
+        tools = {tool_obj.name: tool_obj for tool_obj in api_server.agent_executor.tools}
+        for tool_obj in tools.values():
+            timed_tool(tool_obj)
+
+        def direct(scenario):
+            async def call():
+                return tool_error(await tools[scenario["tool"]].ainvoke(scenario["args"]))
+            return scenario["tool"], call
+
+        direct_jobs = [direct(scenario) for scenario in scenarios]
+        await run_load(direct_jobs, len(direct_jobs) * args.warmup, 1)
+        report["tools"] = await run_load(direct_jobs, len(direct_jobs) * args.tool_calls, args.concurrency)
+
+        transport = httpx.ASGITransport(app=api_server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            report["query"] = await run_load(
+                query_jobs(client, scenarios, args), args.requests, args.concurrency
+            )
+    return report
+
+
+def query_jobs(client, scenarios, args):
+    headers = {} if args.answer_cache else {"X-Skip-Cache": "1"}
+
+    def job(scenario):
+        async def call():
+            response = await client.post("/query", json={"message": scenario["question"]}, headers=headers)
+            return None if response.status_code == 200 else f"HTTP {response.status_code}: {response.text[:200]}"
+        return scenario["tool"], call
+
+    return [job(scenario) for scenario in scenarios]
+
+
+async def bench_remote(args, scenarios):
+    import httpx
+    async with httpx.AsyncClient(base_url=args.url, timeout=None) as client:
+        return {"query": await run_load(query_jobs(client, scenarios, args), args.requests, args.concurrency, stages=False)}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument("--clients", type=int, default=2_000)
+    parser.add_argument("--transactions", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--requests", type=int, default=340, help="/query requests, spread over one question per tool")
+    parser.add_argument("--tool-calls", type=int, default=20, help="direct calls per tool")
+    parser.add_argument("--warmup", type=int, default=2, help="untimed direct calls per tool first")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="simulated time per model turn")
+    parser.add_argument("--mongo-uri", default=None, help="seed and use this MongoDB instead of mongomock")
+    parser.add_argument("--url", default=None, help="drive a running API server instead of an in-process one")
+    parser.add_argument("--tool-cache", action="store_true", help="keep the tool result caches on")
+    parser.add_argument("--answer-cache", action="store_true", help="let /query answers be served from cache")
+    parser.add_argument("--fast-path", action="store_true", help="keep the intent router's fast path on")
+    parser.add_argument("--output", default=None, help="write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    scenarios = build_scenarios(args.clients, args.seed)
+    report = {
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+    }
+    if args.url:
+        report.update(await bench_remote(args, scenarios))
+    else:
+        configure_env(args)
+        with tempfile.TemporaryDirectory() as tmp:
+            sqlite_path = os.path.join(tmp, "bench.db")
+            # the agent and tool servers log every step; keep stdout for the report
+            with contextlib.redirect_stdout(sys.stderr):
+                started = time.perf_counter()
+                seed_sqlite(sqlite_path, args.clients, args.transactions, args.seed)
+                install_stand_ins(args, sqlite_path)
+                report["seed_s"] = round(time.perf_counter() - started, 2)
+                report.update(await bench_in_process(args, scenarios))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+"""
+Compares the legacy holders query (LOWER() + GROUP BY over all transactions) with the
+materialized stock_holdings summary on a generated SQLite stand-in.
+
+    python bench_holdings.py --rows 2000000 --repeat 20
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from holdings import (
+    HOLDERS_QUERY, LEGACY_HOLDERS_QUERY, SQLITE, ensure_schema, normalize_symbol,
+    rebuild_holdings, refresh_holdings,
+)
+
+SYMBOLS = ["INFY", "TCS", "RELIANCE", "HDFCBANK", "ICICIBANK", "WIPRO", "ITC", "SBIN", "LT", "AXISBANK"]
+
+
+def create_transactions(conn, rows, clients, seed=7, start_id=1):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS transactions (
+            transaction_id INTEGER PRIMARY KEY,
+            client_id TEXT NOT NULL,
+            stock_symbol TEXT NOT NULL,
+            transaction_type TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            price REAL NOT NULL,
+            transaction_date TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_client_date ON transactions (client_id, transaction_date)")
+    rng = random.Random(seed)
+    batch = []
+    for transaction_id in range(start_id, start_id + rows):
+        symbol = rng.choice(SYMBOLS)
+        batch.append((
+            transaction_id,
+            f"C{rng.randrange(clients):05d}",
+            symbol if rng.random() < 0.8 else symbol.lower(),
+            "buy" if rng.random() < 0.7 else "sell",
+            rng.randrange(1, 500),
+            round(rng.uniform(100, 4000), 2),
+            f"20{rng.randrange(18, 25)}-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}",
+        ))
+        if len(batch) == 50_000:
+            conn.executemany("INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+            batch.clear()
+    if batch:
+        conn.executemany("INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+    conn.commit()
+
+
+def time_query(conn, query, args, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        conn.execute(SQLITE.sql(query), args).fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {"p50_ms": round(statistics.median(timings), 3), "max_ms": round(max(timings), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--clients", type=int, default=5_000)
+    parser.add_argument("--new-rows", type=int, default=10_000, help="rows appended before the incremental refresh")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        started = time.perf_counter()
+        create_transactions(conn, args.rows, args.clients)
+        report = {"rows": args.rows, "clients": args.clients, "generate_s": round(time.perf_counter() - started, 2)}
+
+        ensure_schema(conn, SQLITE)
+        started = time.perf_counter()
+        rebuild_holdings(conn, SQLITE)
+        report["full_rebuild_s"] = round(time.perf_counter() - started, 3)
+
+        create_transactions(conn, args.new_rows, args.clients, seed=11, start_id=args.rows + 1)
+        started = time.perf_counter()
+        refresh_holdings(conn, SQLITE)
+        report["incremental_refresh_ms"] = {
+            "new_rows": args.new_rows, "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+        symbol = "infy"
+        report["legacy_query"] = time_query(conn, LEGACY_HOLDERS_QUERY, (symbol,), args.repeat)
+        report["summary_query"] = time_query(conn, HOLDERS_QUERY, (normalize_symbol(symbol),), args.repeat)
+        report["speedup"] = round(report["legacy_query"]["p50_ms"] / max(report["summary_query"]["p50_ms"], 1e-6), 1)
+        conn.close()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Measures per-call tool overhead for each way the agent can reach a tool server, using a
+database-free echo tool so only the transport differs.
+
+    python bench_transports.py --calls 500 --rows 1 100 1000 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from mcp.server.fastmcp import FastMCP
+
+from result_encoding import dumps
+from tool_runtime import ToolBackend, serve
+from tool_sessions import InProcessToolSessions, MCPToolSessions
+
+HTTP_PORT = 8199
+
+mcp_server = FastMCP("Bench_Tools")
+bench_backend = ToolBackend("bench", 8)
+
+
+@mcp_server.tool()
+@bench_backend.offload
+def echo_rows(rows: float = 1.0) -> str:
+    """Returns `rows` synthetic transaction rows."""
+    return dumps([
+        {"transaction_id": i, "stock_symbol": "INFY", "transaction_type": "buy", "quantity": 10, "price": 1520.5}
+        for i in range(int(rows))
+    ])
+
+
+def startup():
+    pass
+
+
+def wait_for_port(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"Bench tool server did not open port {port} within {timeout}s.")
+
+
+def create_sessions(transport):
+    if transport == "inprocess":
+        return InProcessToolSessions({"bench": "bench_transports"})
+    if transport == "http":
+        return MCPToolSessions({"bench": [{"transport": "streamable_http", "url": f"http://127.0.0.1:{HTTP_PORT}/mcp"}]})
+    return MCPToolSessions({
+        "bench": [{"transport": "stdio", "command": sys.executable, "args": [__file__, "--serve"]}],
+    })
+
+
+async def time_calls(tool, rows, calls, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def one_call():
+        async with semaphore:
+            started = time.perf_counter()
+            await tool.ainvoke({"rows": rows})
+            timings.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_call() for _ in range(calls)))
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "calls_per_s": round(calls / elapsed, 1),
+    }
+
+
+async def bench_transport(transport, args):
+    server = None
+    if transport == "http":
+        server = subprocess.Popen([sys.executable, __file__, "--serve", "--transport", "streamable-http",
+                                   "--port", str(HTTP_PORT)])
+        wait_for_port(HTTP_PORT)
+    sessions = create_sessions(transport)
+    started = time.perf_counter()
+    tools = {tool_obj.name: tool_obj for tool_obj in await sessions.get_tools()}
+    report = {"startup_ms": round((time.perf_counter() - started) * 1000, 1)}
+    try:
+        tool = tools["echo_rows"]
+        for rows in args.rows:
+            await time_calls(tool, rows, args.warmup, 1)
+            report[f"rows={rows}"] = {
+                "sequential": await time_calls(tool, rows, args.calls, 1),
+                f"concurrency={args.concurrency}": await time_calls(tool, rows, args.calls, args.concurrency),
+            }
+    finally:
+        await sessions.close()
+        if server:
+            server.terminate()
+            server.wait()
+    return report
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--transports", nargs="+", default=["inprocess", "stdio", "http"],
+                        choices=["inprocess", "stdio", "http"])
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    report = {transport: await bench_transport(transport, args) for transport in args.transports}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--serve"]:
+        serve(mcp_server, startup, sys.argv[2:])
+    else:
+        asyncio.run(main())
@@ -0,0 +1,76 @@
+import queue
+import threading
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stream_mongo_keys(collection, query, key_field, chunk_size=500, collation=None):
+    """Streams one field of the matching documents in chunks, never holding the full key list."""
+    cursor = collection.find(query, {key_field: 1, "_id": 0}, collation=collation).batch_size(chunk_size)
+    return chunked((doc[key_field] for doc in cursor if key_field in doc), chunk_size)
+
+
+_DONE = object()
+
+
+def _prefetch(chunks, depth):
+    """
+    Pulls chunks from the source on a background thread, keeping up to `depth` ready,
+    so reading chunk k+1 overlaps the lookup for chunk k.
+    """
+    ready = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for chunk in chunks:
+                if stop.is_set():
+                    return
+                ready.put(chunk)
+            ready.put(_DONE)
+        except BaseException as e:
+            ready.put(e)
+
+    producer = threading.Thread(target=produce, name="join-prefetch", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = ready.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        # unblock a producer waiting on a full queue
+        while not ready.empty():
+            ready.get_nowait()
+
+
+def batched_join(key_chunks, lookup, max_batch=500, prefetch=2):
+    """
+    Joins keys from one store against another: for every chunk of keys (re-split to at
+    most `max_batch`), yields (keys, lookup(keys)). `lookup` should push filtering and
+    aggregation down to the target store and return only what the caller needs.
+    """
+    def bounded_chunks():
+        for chunk in key_chunks:
+            yield from chunked(chunk, max_batch)
+
+    for keys in _prefetch(bounded_chunks(), prefetch):
+        yield keys, lookup(keys)
+
+
+def sql_in_clause(column, keys):
+    """`column IN (%s, ...)` for a batch of keys, with its parameters."""
+    return f"{column} IN ({', '.join(['%s'] * len(keys))})", tuple(keys)
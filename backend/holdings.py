@@ -0,0 +1,185 @@
+import os
+import sys
+import threading
+import time
+
+
+TRANSACTIONS_ID_COLUMN = os.getenv("TRANSACTIONS_ID_COLUMN", "transaction_id")
+
+
+class Dialect:
+    """The few SQL differences between MySQL and the SQLite stand-in used for benchmarks."""
+
+    def __init__(self, name, placeholder, begin, for_update, upsert):
+        self.name = name
+        self.placeholder = placeholder
+        self.begin = begin
+        self.for_update = for_update
+        self.upsert = upsert
+
+    def sql(self, query):
+        return query.replace("%s", self.placeholder)
+
+
+MYSQL = Dialect(
+    "mysql", "%s", "START TRANSACTION", " FOR UPDATE",
+    "ON DUPLICATE KEY UPDATE net_quantity = net_quantity + VALUES(net_quantity)",
+)
+SQLITE = Dialect(
+    "sqlite", "?", "BEGIN IMMEDIATE", "",
+    "ON CONFLICT (stock_symbol, client_id) DO UPDATE SET net_quantity = net_quantity + excluded.net_quantity",
+)
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS stock_holdings (
+        stock_symbol VARCHAR(32) NOT NULL,
+        client_id VARCHAR(64) NOT NULL,
+        net_quantity DECIMAL(20, 4) NOT NULL,
+        PRIMARY KEY (stock_symbol, client_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stock_holdings_state (
+        id INT PRIMARY KEY,
+        last_transaction_id BIGINT NOT NULL
+    )
+    """,
+]
+
+# The pre-summary query: LOWER() on the column defeats any index and sells are ignored.
+LEGACY_HOLDERS_QUERY = """
+SELECT client_id, stock_symbol, SUM(quantity) AS total_quantity
+FROM transactions
+WHERE transaction_type = 'buy' AND LOWER(stock_symbol) = LOWER(%s)
+GROUP BY client_id, stock_symbol
+ORDER BY total_quantity DESC;
+"""
+
+HOLDERS_QUERY = """
+SELECT client_id, stock_symbol, net_quantity AS total_quantity
+FROM stock_holdings
+WHERE stock_symbol = %s AND net_quantity > 0
+ORDER BY net_quantity DESC;
+"""
+
+
+def normalize_symbol(stock_symbol):
+    return stock_symbol.strip().upper()
+
+
+def _apply_delta_sql(dialect):
+    return dialect.sql(f"""
+    INSERT INTO stock_holdings (stock_symbol, client_id, net_quantity)
+    SELECT UPPER(TRIM(stock_symbol)), client_id,
+           SUM(CASE WHEN transaction_type = 'sell' THEN -quantity ELSE quantity END)
+    FROM transactions
+    WHERE {TRANSACTIONS_ID_COLUMN} > %s AND {TRANSACTIONS_ID_COLUMN} <= %s
+      AND transaction_type IN ('buy', 'sell')
+    GROUP BY UPPER(TRIM(stock_symbol)), client_id
+    {dialect.upsert}
+    """)
+
+
+def ensure_schema(conn, dialect=MYSQL):
+    cursor = conn.cursor()
+    for statement in SCHEMA:
+        cursor.execute(statement)
+    conn.commit()
+
+
+def _refresh(conn, dialect, rebuild):
+    cursor = conn.cursor()
+    cursor.execute(dialect.begin)
+    try:
+        # the state row lock serializes concurrent refreshers so no delta is applied twice
+        cursor.execute(dialect.sql(f"SELECT last_transaction_id FROM stock_holdings_state WHERE id = 1{dialect.for_update}"))
+        row = cursor.fetchone()
+        watermark = 0 if rebuild or row is None else row[0]
+
+        cursor.execute(f"SELECT MAX({TRANSACTIONS_ID_COLUMN}) FROM transactions")
+        high = cursor.fetchone()[0] or 0
+        if not rebuild and high <= watermark:
+            conn.rollback()
+            return 0
+
+        if rebuild:
+            cursor.execute("DELETE FROM stock_holdings")
+        cursor.execute(_apply_delta_sql(dialect), (watermark, high))
+        if row is None:
+            cursor.execute(dialect.sql("INSERT INTO stock_holdings_state (id, last_transaction_id) VALUES (1, %s)"), (high,))
+        else:
+            cursor.execute(dialect.sql("UPDATE stock_holdings_state SET last_transaction_id = %s WHERE id = 1"), (high,))
+        conn.commit()
+        return high - watermark
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def refresh_holdings(conn, dialect=MYSQL):
+    """
+    Folds transactions newer than the watermark into stock_holdings and advances the
+    watermark. Returns the id span processed (0 when already current). Rows committed
+    late with ids below the watermark are only picked up by `rebuild_holdings`.
+    """
+    return _refresh(conn, dialect, rebuild=False)
+
+
+def rebuild_holdings(conn, dialect=MYSQL):
+    """Recomputes stock_holdings from the full transactions table."""
+    return _refresh(conn, dialect, rebuild=True)
+
+
+class HoldingsRefresher:
+    """
+    Keeps the holdings summary current for the tool server: incremental refreshes run
+    at most once per `interval` seconds, piggybacking on tool calls.
+    """
+
+    def __init__(self, interval=30.0, dialect=MYSQL):
+        self.interval = interval
+        self.dialect = dialect
+        self.available = False
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+
+    def bootstrap(self, conn):
+        ensure_schema(conn, self.dialect)
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM stock_holdings_state")
+        if cursor.fetchone()[0] == 0:
+            rebuild_holdings(conn, self.dialect)
+        else:
+            refresh_holdings(conn, self.dialect)
+        self._last_refresh = time.monotonic()
+        self.available = True
+
+    def refresh_if_due(self, conn):
+        if time.monotonic() - self._last_refresh < self.interval:
+            return
+        # one refresher at a time; other callers read the slightly older summary
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            refresh_holdings(conn, self.dialect)
+            self._last_refresh = time.monotonic()
+        finally:
+            self._lock.release()
+
+
+if __name__ == "__main__":
+    # python holdings.py rebuild|refresh
+    if len(sys.argv) != 2 or sys.argv[1] not in ("rebuild", "refresh"):
+        print("Usage: python holdings.py rebuild|refresh")
+        sys.exit(1)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    from mysql_tools import mysql_pool
+
+    with mysql_pool.connection() as conn:
+        ensure_schema(conn)
+        started = time.perf_counter()
+        processed = rebuild_holdings(conn) if sys.argv[1] == "rebuild" else refresh_holdings(conn)
+        print(f"Holdings {sys.argv[1]} covered {processed} transaction ids in {time.perf_counter() - started:.2f}s.")
@@ -0,0 +1,70 @@
+"""
+Reports what importing a module costs, grouped by top-level package, by running it under
+`python -X importtime` in a fresh interpreter.
+
+    python import_time.py api_server --top 15
+    python api_server.py --import-time
+"""
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+# packages worth calling out on the API's cold start path
+WATCHED_PACKAGES = {
+    "langchain": ("langchain", "langchain_core", "langchain_text_splitters", "langsmith", "langchain_mcp_adapters"),
+    "google-genai": ("langchain_google_genai", "google", "grpc", "proto"),
+    "pymongo": ("pymongo", "bson", "gridfs", "dns"),
+    "mysql": ("mysql",),
+    "mcp": ("mcp", "httpx", "anyio", "sse_starlette"),
+    "fastapi": ("fastapi", "starlette", "uvicorn", "pydantic", "pydantic_core"),
+}
+
+# imported lazily on first use rather than at startup (see rag_agent.create_llm)
+DEFERRED_MODULES = ["langchain_google_genai"]
+
+
+def measure(module_name):
+    """Self time in ms per top-level package, plus the total, for a cold `import module_name`."""
+    env = dict(os.environ)
+    # rag_agent refuses to import without a key; the report never calls the model
+    env.setdefault("GOOGLE_API_KEY", "import-time-report")
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    by_package = defaultdict(float)
+    for line in completed.stderr.splitlines():
+        # "import time: <self us> | <cumulative us> | <indented module name>"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        by_package[name.strip().split(".")[0]] += int(self_us) / 1000
+    if completed.returncode != 0:
+        print(f"WARNING: importing {module_name} failed; timings cover what loaded before the error.", file=sys.stderr)
+    return dict(by_package), sum(by_package.values())
+
+
+def report(module_name="api_server", top=15):
+    by_package, total_ms = measure(module_name)
+    print(f"Cold import of {module_name}: {total_ms:.0f} ms")
+    print("\nBy group:")
+    for group, packages in WATCHED_PACKAGES.items():
+        group_ms = sum(by_package.get(package, 0.0) for package in packages)
+        share = group_ms / total_ms if total_ms else 0.0
+        print(f"  {group:<14} {group_ms:8.1f} ms  {share:6.1%}")
+    print(f"\nTop {top} packages:")
+    for package, package_ms in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"  {package:<30} {package_ms:8.1f} ms")
+    print("\nDeferred until first use (each measured on its own):")
+    for deferred in DEFERRED_MODULES:
+        print(f"  {deferred:<30} {measure(deferred)[1]:8.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("module", nargs="?", default="api_server")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+    report(args.module, args.top)
@@ -0,0 +1,152 @@
+import json
+import re
+import sys
+import threading
+
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+    "fifteen": 15, "twenty": 20,
+}
+
+_LEAD_IN = r"(?:(?:please|can you|could you|kindly)\s+)?(?:(?:show|list|get|give|fetch|find|tell)(?:\s+me)?\s+|what\s+(?:are|is)\s+)?(?:all\s+)?(?:the\s+|our\s+)?"
+
+
+def _parse_count(text):
+    text = text.lower()
+    return NUMBER_WORDS[text] if text in NUMBER_WORDS else int(text)
+
+
+class IntentRule:
+    """
+    Maps requests that fully match `pattern` straight to a tool. `build_args` turns the
+    regex match into the tool's arguments.
+    """
+
+    def __init__(self, name, tool_name, pattern, build_args=lambda match: {}):
+        self.name = name
+        self.tool_name = tool_name
+        self.pattern = re.compile(_LEAD_IN + pattern, re.IGNORECASE)
+        self.build_args = build_args
+
+    def match(self, message):
+        match = self.pattern.fullmatch(message)
+        return self.build_args(match) if match else None
+
+
+def default_rules():
+    count = r"(\d+|" + "|".join(NUMBER_WORDS) + r")"
+    risk = r"(high|medium|low)"
+    client_id = r"([A-Za-z]{0,3}\d+)"
+    # tickers must be written in capitals, so "who owns it" never routes
+    symbol = r"((?-i:[A-Z][A-Z0-9.&-]{0,14}))"
+    return [
+        IntentRule(
+            "top_n_portfolios", "get_top_n_portfolios",
+            rf"top\s+{count}\s+portfolios?(?:\s+of\s+our\s+(?:wealth\s+)?(?:members|clients))?(?:\s+by\s+value)?",
+            lambda m: {"limit": _parse_count(m.group(1))},
+        ),
+        IntentRule(
+            "clients_by_risk_appetite", "get_clients_by_risk_appetite",
+            rf"clients\s+(?:with|having|who\s+have)\s+(?:a\s+)?{risk}\s+risk(?:\s+appetite)?",
+            lambda m: {"risk_appetite_level": m.group(1).capitalize()},
+        ),
+        IntentRule(
+            "risk_appetite_clients", "get_clients_by_risk_appetite",
+            rf"{risk}\s+risk(?:\s+appetite)?\s+clients",
+            lambda m: {"risk_appetite_level": m.group(1).capitalize()},
+        ),
+        IntentRule(
+            "client_profile_by_id", "get_client_profile_by_id",
+            rf"(?:profile|details)\s+(?:for|of)\s+client(?:\s+id)?\s+{client_id}",
+            lambda m: {"client_id": m.group(1).upper()},
+        ),
+        IntentRule(
+            "client_transactions", "get_client_transactions",
+            rf"transactions\s+(?:for|of)\s+client(?:\s+id)?\s+{client_id}",
+            lambda m: {"client_id": m.group(1).upper()},
+        ),
+        IntentRule(
+            "stock_holders", "get_stock_holders_for_stock",
+            rf"(?:who\s+(?:holds|owns|has)|holders\s+of|clients\s+(?:holding|who\s+hold))\s+{symbol}(?:\s+(?:stock|shares))?",
+            lambda m: {"stock_symbol": m.group(1).upper()},
+        ),
+        IntentRule(
+            "top_relationship_managers", "get_top_relationship_managers",
+            r"top\s+relationship\s+managers(?:\s+in\s+(?:my|our|the)\s+firm)?",
+        ),
+    ]
+
+
+def normalize_message(message):
+    return " ".join(message.split()).strip(" ?!.")
+
+
+class IntentRouter:
+    """
+    Deterministic fast path in front of the agent: a request is routed only when it
+    fully matches one rule; anything else falls back to the LLM agent.
+    """
+
+    def __init__(self, rules=None):
+        self.rules = rules if rules is not None else default_rules()
+        self._lock = threading.Lock()
+        self._stats = {"routed": 0, "fallbacks": 0, "tool_errors": 0, "by_rule": {}}
+
+    def route(self, message):
+        """Returns (rule, tool_args) for a confident match, or None."""
+        normalized = normalize_message(message)
+        for rule in self.rules:
+            tool_args = rule.match(normalized)
+            if tool_args is not None:
+                with self._lock:
+                    self._stats["routed"] += 1
+                    self._stats["by_rule"][rule.name] = self._stats["by_rule"].get(rule.name, 0) + 1
+                return rule, tool_args
+        with self._lock:
+            self._stats["fallbacks"] += 1
+        return None
+
+    def record_tool_error(self):
+        """A routed request whose tool call failed, and which the agent answered instead."""
+        with self._lock:
+            self._stats["tool_errors"] += 1
+
+    def stats(self):
+        with self._lock:
+            total = self._stats["routed"] + self._stats["fallbacks"]
+            return dict(
+                self._stats,
+                by_rule=dict(self._stats["by_rule"]),
+                hit_rate=round(self._stats["routed"] / total, 4) if total else 0.0,
+            )
+
+
+def _read_corpus(path):
+    """One query per line; JSON lines with a "message" field are also accepted."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                line = json.loads(line).get("message", "")
+            yield line
+
+
+if __name__ == "__main__":
+    # Offline evaluation: python intent_router.py past_queries.txt
+    if len(sys.argv) != 2:
+        print("Usage: python intent_router.py <corpus file>")
+        sys.exit(1)
+
+    router = IntentRouter()
+    for query in _read_corpus(sys.argv[1]):
+        routed = router.route(query)
+        if routed:
+            rule, tool_args = routed
+            print(f"ROUTED   {rule.tool_name}({json.dumps(tool_args)})  <- {query}")
+        else:
+            print(f"FALLBACK {query}")
+    print(json.dumps(router.stats(), indent=2))
@@ -0,0 +1,106 @@
+"""
+Runs the MongoDB and MySQL tool servers as standalone streamable-HTTP services, K replicas
+each, restarting any replica that exits. API workers started with MCP_TRANSPORT=http and
+the printed *_TOOLS_URLS connect to every replica and spread tool calls across them,
+reconnecting to a replica once it has been restarted.
+
+    python launch_tool_servers.py --replicas 3 --host 0.0.0.0
+"""
+import argparse
+import signal
+import subprocess
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from tool_sessions import TOOL_SERVER_MODULES
+
+BASE_PORTS = {"mongodb": 8101, "mysql": 8201}
+MAX_RESTART_DELAY = 30.0
+
+
+class Replica:
+    def __init__(self, server_name, module_name, host, port):
+        self.server_name = server_name
+        self.command = [sys.executable, f"{module_name}.py", "--transport", "streamable-http",
+                        "--host", host, "--port", str(port)]
+        self.port = port
+        self.process = None
+        self.started_at = 0.0
+        self.restart_delay = 1.0
+        self.restart_at = 0.0
+
+    def start(self):
+        self.process = subprocess.Popen(self.command)
+        self.started_at = time.monotonic()
+
+    def check(self):
+        """Restarts an exited replica, backing off while it keeps crashing."""
+        now = time.monotonic()
+        if self.process.poll() is None:
+            if now - self.started_at > MAX_RESTART_DELAY:
+                self.restart_delay = 1.0
+            return
+        if not self.restart_at:
+            print(f"{self.server_name} replica on port {self.port} exited with {self.process.returncode}; "
+                  f"restarting in {self.restart_delay:.0f}s.")
+            self.restart_at = now + self.restart_delay
+            self.restart_delay = min(self.restart_delay * 2, MAX_RESTART_DELAY)
+        elif now >= self.restart_at:
+            self.restart_at = 0.0
+            self.start()
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--replicas", type=int, default=2, help="replicas per tool server")
+    parser.add_argument("--host", default="127.0.0.1", help="interface the replicas listen on")
+    parser.add_argument("--public-host", default=None, help="host name API workers use (defaults to --host)")
+    parser.add_argument("--servers", nargs="+", default=list(TOOL_SERVER_MODULES), choices=list(TOOL_SERVER_MODULES))
+    args = parser.parse_args()
+    load_dotenv()
+
+    public_host = args.public_host or ("127.0.0.1" if args.host == "0.0.0.0" else args.host)
+    replicas = []
+    for server_name in args.servers:
+        for index in range(args.replicas):
+            replicas.append(Replica(server_name, TOOL_SERVER_MODULES[server_name], args.host, BASE_PORTS[server_name] + index))
+    for replica in replicas:
+        replica.start()
+
+    print("Tool servers starting. Point the API at them with:")
+    print("MCP_TRANSPORT=http")
+    for server_name in args.servers:
+        urls = [f"http://{public_host}:{replica.port}/mcp" for replica in replicas if replica.server_name == server_name]
+        print(f"{server_name.upper()}_TOOLS_URLS={','.join(urls)}")
+
+    stopping = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    try:
+        while not stopping:
+            for replica in replicas:
+                replica.check()
+            time.sleep(1.0)
+    finally:
+        for replica in replicas:
+            replica.stop()
+        for replica in replicas:
+            try:
+                replica.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                replica.process.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+In-memory leaderboards for the tool servers' top-N tools. A refresher thread rebuilds
+each ranking off the request path, on an interval and, where the database can report
+writes (a MongoDB change stream), soon after the data changes. Tools answer from the
+snapshot in O(K) and run their live query whenever it may be out of date.
+"""
+import heapq
+import os
+import sys
+import threading
+import time
+
+from telemetry import metrics, span
+
+
+LOOKUPS = metrics.counter(
+    "nlcp_leaderboard_lookups_total", "Leaderboard lookups, by board and whether memory answered them.", ("board", "result")
+)
+
+
+class Leaderboard:
+    """
+    One ranking held in memory, rebuilt whole by `load()`. `get` returns the snapshot only
+    while it is younger than `max_age` seconds and no change has been reported since its
+    rebuild started; otherwise it returns None and the caller runs its live query.
+    """
+
+    def __init__(self, name, load, max_age=90.0, clock=time.monotonic):
+        self.name = name
+        self.max_age = max_age
+        self._load = load
+        self._clock = clock
+        self._snapshot = None
+        self._built_at = None
+        self._changes = 0
+        self._built_changes = 0
+        self._lock = threading.Lock()
+        self._stats = {"refreshes": 0, "refresh_errors": 0, "hits": 0, "stale": 0, "last_refresh_ms": None, "last_error": None}
+
+    def mark_changed(self):
+        with self._lock:
+            self._changes += 1
+
+    def refresh(self):
+        with self._lock:
+            changes = self._changes
+        # the snapshot is as old as the moment its read began
+        started = self._clock()
+        try:
+            with span("leaderboard.refresh", board=self.name):
+                snapshot = self._load()
+        except Exception as e:
+            with self._lock:
+                self._stats["refresh_errors"] += 1
+                self._stats["last_error"] = str(e)
+            raise
+        with self._lock:
+            self._snapshot, self._built_at, self._built_changes = snapshot, started, changes
+            self._stats["refreshes"] += 1
+            self._stats["last_refresh_ms"] = round((self._clock() - started) * 1000, 1)
+            self._stats["last_error"] = None
+
+    def get(self):
+        with self._lock:
+            fresh = (
+                self._snapshot is not None
+                and self._built_changes == self._changes
+                and self._clock() - self._built_at <= self.max_age
+            )
+            self._stats["hits" if fresh else "stale"] += 1
+            snapshot = self._snapshot
+        LOOKUPS.inc(board=self.name, result="hit" if fresh else "stale")
+        return snapshot if fresh else None
+
+    def stats(self):
+        with self._lock:
+            age = self._clock() - self._built_at if self._built_at is not None else None
+            return dict(
+                self._stats,
+                age_s=round(age, 3) if age is not None else None,
+                changed_since_refresh=self._built_changes != self._changes,
+            )
+
+
+class LeaderboardRefresher:
+    """
+    Rebuilds its leaderboards in a daemon thread every `interval` seconds. With a `watch`
+    feed (a callable that blocks, calling `on_change()` for every write, until `stopped`
+    is set) a change marks the boards stale and triggers a rebuild, at most once per
+    `min_gap` seconds. A watch that fails, e.g. on a standalone MongoDB without change
+    streams, leaves the interval to keep the boards current.
+    """
+
+    def __init__(self, name, leaderboards, interval=30.0, min_gap=5.0, watch=None, on_refresh=None):
+        self.name = name
+        self.leaderboards = leaderboards
+        self.interval = interval
+        self.min_gap = min_gap
+        self._watch = watch
+        self._on_refresh = on_refresh
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._threads = []
+        self.watch_status = "off" if watch is None else "starting"
+
+    def start(self):
+        """Builds every board once, then keeps them current in the background."""
+        self._refresh_all()
+        self._threads = [threading.Thread(target=self._run, name=f"{self.name}-leaderboards", daemon=True)]
+        if self._watch is not None:
+            self._threads.append(threading.Thread(target=self._run_watch, name=f"{self.name}-leaderboard-watch", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def notify_change(self):
+        for leaderboard in self.leaderboards:
+            leaderboard.mark_changed()
+        self._wake.set()
+
+    def _refresh_all(self):
+        for leaderboard in self.leaderboards:
+            try:
+                leaderboard.refresh()
+            except Exception as e:
+                print(f"WARNING: leaderboard '{leaderboard.name}' refresh failed, its tools will query live: {e}", file=sys.stderr)
+        if self._on_refresh is not None:
+            self._on_refresh()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.interval)
+            if self._stopped.is_set():
+                return
+            # cleared before the rebuild, so a change reported during it triggers another
+            self._wake.clear()
+            self._refresh_all()
+            self._stopped.wait(self.min_gap)
+
+    def _run_watch(self):
+        try:
+            self.watch_status = "watching"
+            self._watch(self.notify_change, self._stopped)
+            self.watch_status = "stopped"
+        except Exception as e:
+            self.watch_status = "unavailable"
+            print(f"Leaderboard change feed for {self.name} unavailable, refreshing every {self.interval:.0f}s: {e}", file=sys.stderr)
+
+    def stats(self):
+        return {
+            "interval": self.interval,
+            "watch": self.watch_status,
+            "boards": {leaderboard.name: leaderboard.stats() for leaderboard in self.leaderboards},
+        }
+
+
+def watch_collection(collection_getter, max_await_ms=1000):
+    """A `watch` feed over a MongoDB collection's change stream (needs a replica set)."""
+
+    def watch(on_change, stopped):
+        with collection_getter().watch(max_await_time_ms=max_await_ms) as stream:
+            while not stopped.is_set():
+                if stream.try_next() is not None:
+                    on_change()
+
+    return watch
+
+
+def _holding_key(holding):
+    value = holding["holding_value_crores"]
+    # ranked like MongoDB's descending sort: numbers first, then holdings with no value
+    return (1, value) if isinstance(value, (int, float)) and not isinstance(value, bool) else (0, 0)
+
+
+def top_holdings(rankings, type_lc, limit):
+    """
+    The `limit` largest holdings of an investment type from boards of each type's `size`
+    largest holdings, keyed by normalized type: the exact type when one exists, otherwise
+    every type starting with `type_lc`. None when the boards keep too few entries to answer.
+    """
+    by_type, size = rankings["holdings_by_type"], rankings["size"]
+    boards = [by_type[type_lc]] if type_lc in by_type else [
+        board for kind, board in by_type.items() if kind.startswith(type_lc)
+    ]
+    # a board shorter than `size` holds every holding of its type
+    if limit > size and any(len(board) >= size for board in boards):
+        return None
+    if len(boards) == 1:
+        return boards[0][:limit]
+    return heapq.nlargest(limit, (entry for board in boards for entry in board), key=_holding_key)
+
+
+def leaderboard_settings_from_env():
+    """LEADERBOARD_* settings shared by both tool servers; LEADERBOARD_SIZE=0 turns the boards off."""
+    interval = float(os.getenv("LEADERBOARD_REFRESH_INTERVAL", "30"))
+    return {
+        "size": int(os.getenv("LEADERBOARD_SIZE", "100")),
+        "interval": interval,
+        "max_age": float(os.getenv("LEADERBOARD_MAX_AGE", str(interval * 3))),
+        "min_gap": float(os.getenv("LEADERBOARD_MIN_REFRESH_GAP", "5")),
+        "watch": os.getenv("LEADERBOARD_WATCH", "true").lower() in ("1", "true", "yes"),
+    }
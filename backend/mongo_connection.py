@@ -0,0 +1,142 @@
+import os
+import threading
+
+from pymongo import MongoClient, monitoring
+
+from telemetry import record_span
+
+
+def mongo_client_options():
+    """
+    Pool, timeout and read-preference options for the shared MongoClient, read from the
+    environment. Unset variables fall back to pymongo's defaults.
+    """
+    env_options = {
+        "maxPoolSize": ("MONGO_MAX_POOL_SIZE", int),
+        "minPoolSize": ("MONGO_MIN_POOL_SIZE", int),
+        "maxIdleTimeMS": ("MONGO_MAX_IDLE_TIME_MS", int),
+        "serverSelectionTimeoutMS": ("MONGO_SERVER_SELECTION_TIMEOUT_MS", int),
+        "connectTimeoutMS": ("MONGO_CONNECT_TIMEOUT_MS", int),
+        "socketTimeoutMS": ("MONGO_SOCKET_TIMEOUT_MS", int),
+        "readPreference": ("MONGO_READ_PREFERENCE", str),
+    }
+    options = {}
+    for option, (env_name, cast) in env_options.items():
+        value = os.getenv(env_name)
+        if value:
+            options[option] = cast(value)
+    return options
+
+
+class _ConnectionCounter(monitoring.ConnectionPoolListener):
+    """Counts pool connections opened versus checkouts served by an existing connection."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.created = 0
+        self.checked_out = 0
+        self.closed = 0
+
+    def connection_created(self, event):
+        with self._lock:
+            self.created += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checked_out += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.closed += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+
+class _CommandTimer(monitoring.CommandListener):
+    """
+    Records each driver command as a db.mongodb.<command> span. Command events are published
+    on the thread running the command, so the span lands in the calling request's trace.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        record_span(f"db.mongodb.{event.command_name}", event.duration_micros / 1e6, database=event.database_name)
+
+    def failed(self, event):
+        record_span(f"db.mongodb.{event.command_name}", event.duration_micros / 1e6,
+                    error=str(event.failure.get("codeName", "failed")), database=event.database_name)
+
+
+class SharedMongoClient:
+    """
+    One MongoClient per MCP server process, created on first use. Reusing it keeps
+    pymongo's connection pool, server discovery and TLS sessions alive across tool calls.
+    `client_factory` lets benchmarks substitute a stand-in with the MongoClient signature.
+    """
+
+    def __init__(self, uri, client_factory=MongoClient, **options):
+        self.uri = uri
+        self.client_factory = client_factory
+        self.options = options
+        self._client = None
+        self._lock = threading.Lock()
+        self._counter = _ConnectionCounter()
+        self._command_timer = _CommandTimer()
+        self._requests = 0
+
+    def get(self):
+        if not self.uri:
+            raise ValueError("MONGO_URI not found in environment variables.")
+        with self._lock:
+            self._requests += 1
+            if self._client is None:
+                try:
+                    self._client = self.client_factory(
+                        self.uri, event_listeners=[self._counter, self._command_timer], **self.options
+                    )
+                except Exception as e:
+                    raise ConnectionError(f"Failed to connect to MongoDB: {e}")
+            return self._client
+
+    def stats(self):
+        counter = self._counter
+        with counter._lock:
+            created, checked_out, closed = counter.created, counter.checked_out, counter.closed
+        return {
+            "client_requests": self._requests,
+            "client_initialized": self._client is not None,
+            "connections_created": created,
+            "connections_reused": max(checked_out - created, 0),
+            "connections_closed": closed,
+            "checkouts": checked_out,
+        }
+
+    def close(self):
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
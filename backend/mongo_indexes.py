@@ -0,0 +1,138 @@
+import json
+import os
+import sys
+
+from pymongo import ASCENDING, TEXT
+
+
+# Case-insensitive comparison (strength 2: accents count, case does not). The indexes on
+# the fields the tools search use it, and a query only uses such an index when it passes
+# the same collation, so every lookup on these fields goes through CASE_INSENSITIVE.
+CASE_INSENSITIVE = {"locale": "en", "strength": 2}
+
+CLIENT_INDEXES = [
+    ([("client_id", ASCENDING)], "client_id_1", None),
+    ([("risk_appetite", ASCENDING)], "risk_appetite_1", None),
+    ([("name", ASCENDING)], "name_ci", CASE_INSENSITIVE),
+    ([("relationship_manager", ASCENDING)], "relationship_manager_ci", CASE_INSENSITIVE),
+    ([("investment_preferences", ASCENDING)], "investment_preferences_ci", CASE_INSENSITIVE),
+    ([("portfolio_by_preference.type", ASCENDING)], "portfolio_types_ci", CASE_INSENSITIVE),
+    # profession search looks for whole words inside the client name
+    ([("name", TEXT)], "name_text", None),
+]
+
+# the projection for client documents returned to the agent
+CLIENT_PROJECTION = {"_id": 0}
+
+
+def normalize(value):
+    return " ".join(str(value).split()).lower()
+
+
+def exact_match(value):
+    """Filter value for a case-insensitive exact match; query with collation=CASE_INSENSITIVE."""
+    return " ".join(str(value).split())
+
+
+def prefix_match(value):
+    """
+    Filter value matching every string that starts with `value`, ignoring case; query with
+    collation=CASE_INSENSITIVE. A range rather than a regex, because a regex cannot use a
+    collated index. U+FFFF sorts above every character in the collation, closing the range.
+    """
+    text = exact_match(value)
+    return {"$gte": text, "$lte": text + "\uffff"}
+
+
+def ensure_client_indexes(collection):
+    """Creates the indexes the tools rely on. Safe to run on every start."""
+    for keys, name, collation in CLIENT_INDEXES:
+        options = {"collation": collation} if collation else {}
+        collection.create_index(keys, name=name, **options)
+
+
+def bootstrap_client_indexes(collection_getter):
+    """Server-startup hook: a failure is logged but never prevents the tools from serving."""
+    if os.getenv("MONGO_BOOTSTRAP_INDEXES", "true").lower() not in ("1", "true", "yes"):
+        return
+    try:
+        ensure_client_indexes(collection_getter())
+        print("MongoDB client indexes ready.")
+    except Exception as e:
+        print(f"WARNING: MongoDB index bootstrap failed, tools will fall back to scans: {e}")
+
+
+def _plan_stages(plan):
+    stages = [plan.get("stage")]
+    if "inputStage" in plan:
+        stages += _plan_stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        stages += _plan_stages(child)
+    # servers using the slot-based engine nest the classic plan under "queryPlan"
+    if isinstance(plan.get("queryPlan"), dict):
+        stages += _plan_stages(plan["queryPlan"])
+    return [stage for stage in stages if stage]
+
+
+def winning_plan_stages(explain):
+    """Stage names of the winning plan of a find or aggregate explain document."""
+    if "queryPlanner" in explain:
+        return _plan_stages(explain["queryPlanner"]["winningPlan"])
+    stages = []
+    for stage in explain.get("stages", []):
+        cursor_stage = stage.get("$cursor")
+        if cursor_stage:
+            stages.extend(winning_plan_stages(cursor_stage))
+    for shard in explain.get("shards", {}).values():
+        stages.extend(winning_plan_stages(shard))
+    return stages
+
+
+# the filters the tools issue, with the collation each is sent with
+TOOL_QUERIES = {
+    "profile_by_id": ({"client_id": "C00001"}, None),
+    "profile_by_name": ({"name": exact_match("A Client")}, CASE_INSENSITIVE),
+    "profile_by_name_prefix": ({"name": prefix_match("A Cli")}, CASE_INSENSITIVE),
+    "clients_by_profession": ({"$text": {"$search": "actor"}}, None),
+    "clients_by_risk_appetite": ({"risk_appetite": "High"}, None),
+    "clients_by_preference": ({"investment_preferences": exact_match("Equity")}, CASE_INSENSITIVE),
+    "client_ids_by_rm": ({"relationship_manager": exact_match("An RM")}, CASE_INSENSITIVE),
+    "client_ids_by_rm_prefix": ({"relationship_manager": prefix_match("An")}, CASE_INSENSITIVE),
+}
+
+
+def explain_tool_queries(collection):
+    """Explains the filters the tools issue and reports the winning plan's stages for each."""
+    db = collection.database
+    report = {}
+    for label, (query, collation) in TOOL_QUERIES.items():
+        command = {"find": collection.name, "filter": query}
+        if collation:
+            command["collation"] = collation
+        explain = db.command("explain", command, verbosity="queryPlanner")
+        report[label] = winning_plan_stages(explain)
+    explain = db.command(
+        "aggregate", collection.name,
+        pipeline=[{"$match": {"portfolio_by_preference.type": exact_match("Equity")}}, {"$unwind": "$portfolio_by_preference"}],
+        collation=CASE_INSENSITIVE,
+        explain=True,
+    )
+    report["top_clients_by_investment_type"] = winning_plan_stages(explain)
+    return report
+
+
+if __name__ == "__main__":
+    # python mongo_indexes.py [--explain]
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    clients = MongoClient(os.getenv("MONGO_URI"))[os.getenv("MONGO_DB_NAME")].clients
+    ensure_client_indexes(clients)
+    print("Indexes ready.")
+    if "--explain" in sys.argv:
+        report = explain_tool_queries(clients)
+        print(json.dumps(report, indent=2))
+        if any("COLLSCAN" in stages for stages in report.values()):
+            print("COLLSCAN found in at least one tool query.")
+            sys.exit(1)
@@ -1,81 +1,220 @@
 import os
+import re
+import atexit
 from dotenv import load_dotenv
-from pymongo import MongoClient
 from mcp.server.fastmcp import FastMCP
 
 import json
+from pymongo.errors import OperationFailure
+
+from mongo_connection import SharedMongoClient, mongo_client_options
+from tool_runtime import ToolBackend, serve
+from tool_cache import tool_cache_from_env
+from result_encoding import dumps, result_encoder_from_env
+from result_store import result_store_from_env
+from telemetry import metrics, traced_tool
+from leaderboards import Leaderboard, LeaderboardRefresher, leaderboard_settings_from_env, top_holdings, watch_collection
+from mongo_indexes import CASE_INSENSITIVE, CLIENT_PROJECTION, bootstrap_client_indexes, exact_match, normalize, prefix_match
 
 
 # load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI")
 MONGO_DB_NAME = os.getenv("MONGO_DB_NAME")
+MONGO_TOOL_CONCURRENCY = int(os.getenv("MONGO_TOOL_CONCURRENCY", "8"))
+BULK_MAX_IDS = int(os.getenv("BULK_MAX_IDS", "200"))
 
 
 mcp_server = FastMCP("MongoDB_Tools")
 
+mongo_client = SharedMongoClient(MONGO_URI, **mongo_client_options())
+atexit.register(mongo_client.close)
+
+mongo_backend = ToolBackend("mongodb", MONGO_TOOL_CONCURRENCY)
+atexit.register(mongo_backend.shutdown)
+
+# profiles rarely change, leaderboards move with every portfolio update
+tool_cache = tool_cache_from_env({
+    "get_client_profile_by_name": 600,
+    "get_client_profile_by_id": 600,
+    "get_client_profiles_by_ids": 600,
+    "get_clients_by_profession": 600,
+    "get_clients_by_risk_appetite": 600,
+    "get_clients_by_investment_preference": 600,
+    "get_client_ids_by_relationship_manager": 600,
+    "get_top_relationship_managers": 60,
+    "get_top_n_clients_by_investment_type_value": 60,
+})
+
+result_store = result_store_from_env("mongodb")
+result_encoder = result_encoder_from_env(store=result_store)
+
 def _get_mongo_collection():
-    if not MONGO_URI:
-        raise ValueError("MONGO_URI not found in environment variables.")
+    return mongo_client.get()[MONGO_DB_NAME].clients
+
+TOP_RELATIONSHIP_MANAGERS_PIPELINE = [
+    {"$group": {"_id": "$relationship_manager", "client_count": {"$sum": 1}}},
+    {"$sort": {"client_count": -1}}
+]
+
+def _top_holdings_pipeline(type_filter, holding_match, limit):
+    return [
+        {
+            "$match": {
+                "portfolio_by_preference.type": type_filter
+            }
+        },
+        {
+            "$unwind": "$portfolio_by_preference"
+        },
+        {
+            "$match": {
+                "$expr": holding_match
+            }
+        },
+        {
+            "$sort": { "portfolio_by_preference.value_crores": -1 }
+        },
+        {
+            "$limit": limit
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "client_id": "$client_id",
+                "name": "$name",
+                "risk_appetite": "$risk_appetite",
+                "investment_type": "$portfolio_by_preference.type",
+                "holding_value_crores": "$portfolio_by_preference.value_crores"
+            }
+        }
+    ]
+
+def _load_client_rankings():
+    """
+    Client counts per relationship manager and the `size` largest holdings of every
+    investment type (keyed by its normalized name), each ranked by the server with the
+    tools' own pipelines, so only the boards cross the wire.
+    """
+    collection = _get_mongo_collection()
+    size = leaderboard_settings["size"]
+    types = {normalize(kind): kind for kind in collection.distinct("portfolio_by_preference.type") if isinstance(kind, str)}
+    holdings_by_type = {}
+    for type_lc, kind in types.items():
+        holding_match = {"$eq": [{"$toLower": "$portfolio_by_preference.type"}, type_lc]}
+        pipeline = _top_holdings_pipeline(exact_match(kind), holding_match, size)
+        holdings_by_type[type_lc] = list(collection.aggregate(pipeline, collation=CASE_INSENSITIVE))
+    return {
+        "relationship_managers": list(collection.aggregate(TOP_RELATIONSHIP_MANAGERS_PIPELINE)),
+        "holdings_by_type": holdings_by_type,
+        "size": size,
+    }
+
+# client counts per RM and the largest holdings per investment type, kept in memory for
+# the leaderboard tools; rebuilt on every write the change stream reports, or on an interval
+leaderboard_settings = leaderboard_settings_from_env()
+client_rankings = Leaderboard("client_rankings", _load_client_rankings, max_age=leaderboard_settings["max_age"])
+LEADERBOARD_TOOLS = ["get_top_relationship_managers", "get_top_n_clients_by_investment_type_value"]
+leaderboard_refresher = LeaderboardRefresher(
+    "mongodb",
+    [client_rankings],
+    interval=leaderboard_settings["interval"],
+    min_gap=leaderboard_settings["min_gap"],
+    watch=watch_collection(_get_mongo_collection) if leaderboard_settings["watch"] else None,
+    # cached answers from the previous snapshot would outlive the change that replaced it
+    on_refresh=lambda: [tool_cache.clear(tool_name) for tool_name in LEADERBOARD_TOOLS],
+)
+atexit.register(leaderboard_refresher.stop)
+
+# the server's error code for a $text query on a collection without a text index
+TEXT_INDEX_NOT_FOUND = 27
+
+def _find_name_words(collection, search, words, projection, limit=0):
+    """
+    Clients whose name contains `words` as whole words, through the text index (`search`
+    is the $text query) or, where $text is unavailable (mongomock, or a server whose
+    text index has not been built), with a case-insensitive regex scan.
+    """
     try:
-        client = MongoClient(MONGO_URI)
-        db = client[MONGO_DB_NAME]
-        return db.clients, client 
-    except Exception as e:
-        raise ConnectionError(f"Failed to connect to MongoDB: {e}")
+        return list(collection.find({"$text": {"$search": search}}, projection, limit=limit))
+    except (NotImplementedError, OperationFailure) as e:
+        if isinstance(e, OperationFailure) and e.code != TEXT_INDEX_NOT_FOUND:
+            raise
+    pattern = rf"\b{re.escape(words)}\b"
+    return list(collection.find({"name": {"$regex": pattern, "$options": "i"}}, projection, limit=limit))
+
+def _text_phrase(value):
+    """
+    A $text phrase search for `value`. $text has no escape for a quote inside a phrase,
+    so embedded quotes are dropped rather than allowed to end the phrase early.
+    """
+    return '"' + " ".join(str(value).replace('"', " ").split()) + '"'
+
+def _find_case_insensitive(collection, field, value, projection):
+    """Case-insensitive exact match on an indexed field, falling back to a prefix match."""
+    docs = list(collection.find({field: exact_match(value)}, projection, collation=CASE_INSENSITIVE))
+    if not docs:
+        docs = list(collection.find({field: prefix_match(value)}, projection, collation=CASE_INSENSITIVE))
+    return docs
 
 @mcp_server.tool()
+@traced_tool
+@tool_cache.cached
+@mongo_backend.offload
+@result_encoder.encoded
 def get_client_profile_by_name(client_name: str) -> str:
     """
     Retrieves a client's detailed profile from MongoDB based on their full name.
     This includes name, address, risk appetite, investment preferences, relationship manager,
     and initial portfolio value.
     """
-    collection, client_conn = None, None
     try:
-        collection, client_conn = _get_mongo_collection()
-        client_data = collection.find_one({"name": {"$regex": client_name, "$options": "i"}}, {"_id": 0})
+        collection = _get_mongo_collection()
+        client_data = (
+            collection.find_one({"name": exact_match(client_name)}, CLIENT_PROJECTION, collation=CASE_INSENSITIVE)
+            or collection.find_one({"name": prefix_match(client_name)}, CLIENT_PROJECTION, collation=CASE_INSENSITIVE)
+            # partial names ("Sharma") are matched as whole words
+            or next(iter(_find_name_words(collection, _text_phrase(client_name), client_name, CLIENT_PROJECTION, limit=1)), None)
+        )
         if client_data:
-            return json.dumps(client_data, indent=2)
+            return client_data
         else:
             return json.dumps({})
     except ConnectionError as conn_err:
         return json.dumps({"error": str(conn_err), "message": "MongoDB connection failed."})
     except Exception as e:
         return json.dumps({"error": str(e), "message": "Failed to retrieve client profile."})
-    finally:
-        if client_conn:
-            client_conn.close()
 
 
 @mcp_server.tool()
+@traced_tool
+@tool_cache.cached
+@mongo_backend.offload
+@result_encoder.encoded
 def get_clients_by_profession(profession: str) -> str:
     """
     Retrieves a list of client names and their associated initial portfolio values
     from MongoDB who are identified by a specific profession (e.g., 'Actor', 'Sportsperson').
     The search is case-insensitive and checks for profession within the client's name.
     """
-    collection, client_conn = None, None
     try:
-        collection, client_conn = _get_mongo_collection()
-        search_pattern = f"\\b{profession}\\b" 
-        
-        clients_cursor = collection.find(
-            {"name": {"$regex": search_pattern, "$options": "i"}},
+        collection = _get_mongo_collection()
+        clients_list = _find_name_words(
+            collection, profession, profession,
             {"name": 1, "initial_portfolio_value_crores": 1, "client_id": 1, "_id": 0}
         )
-        clients_list = list(clients_cursor)
-        return json.dumps(clients_list, indent=2)
+        return clients_list
     except ConnectionError as conn_err:
         return json.dumps({"error": str(conn_err), "message": "MongoDB connection failed."})
     except Exception as e:
         return json.dumps({"error": str(e), "message": "Failed to retrieve clients by profession."})
-    finally:
-        if client_conn:
-            client_conn.close()
 
 
 @mcp_server.tool()
+@traced_tool
+@tool_cache.cached
+@mongo_backend.offload
+@result_encoder.encoded
 def get_clients_by_risk_appetite(risk_appetite_level: str) -> str:
     """
     Retrieves a list of client names and their initial portfolio values from MongoDB
@@ -84,173 +223,225 @@ def get_clients_by_risk_appetite(risk_appetite_level: str) -> str:
     if risk_appetite_level not in ['High', 'Medium', 'Low']:
         return json.dumps({"error": "Invalid risk appetite level. Must be 'High', 'Medium', or 'Low'."})
 
-    collection, client_conn = None, None
     try:
-        collection, client_conn = _get_mongo_collection()
+        collection = _get_mongo_collection()
         clients_cursor = collection.find(
             {"risk_appetite": risk_appetite_level},
             {"name": 1, "initial_portfolio_value_crores": 1, "client_id": 1, "_id": 0}
         )
         clients_list = list(clients_cursor)
-        return json.dumps(clients_list, indent=2)
+        return clients_list
     except ConnectionError as conn_err:
         return json.dumps({"error": str(conn_err), "message": "MongoDB connection failed."})
     except Exception as e:
         return json.dumps({"error": str(e), "message": "Failed to retrieve clients by risk appetite."})
-    finally:
-        if client_conn:
-            client_conn.close()
 
 @mcp_server.tool()
+@traced_tool
+@tool_cache.cached
+@mongo_backend.offload
+@result_encoder.encoded
 def get_clients_by_investment_preference(preference: str) -> str:
     """
     Retrieves a list of client names and their risk appetite who have a specific investment preference.
     """
-    collection, client_conn = None, None
     try:
-        collection, client_conn = _get_mongo_collection()
-        clients_cursor = collection.find(
-            {"investment_preferences": {"$regex": preference, "$options": "i"}},
+        collection = _get_mongo_collection()
+        clients_list = _find_case_insensitive(
+            collection, "investment_preferences", preference,
             {"name": 1, "risk_appetite": 1, "client_id": 1, "_id": 0}
         )
-        clients_list = list(clients_cursor)
-        return json.dumps(clients_list, indent=2)
+        return clients_list
     except ConnectionError as conn_err:
         return json.dumps({"error": str(conn_err), "message": "MongoDB connection failed."})
     except Exception as e:
         return json.dumps({"error": str(e), "message": "Failed to retrieve clients by investment preference."})
-    finally:
-        if client_conn:
-            client_conn.close()
 
 @mcp_server.tool()
+@traced_tool
+@tool_cache.cached
+@mongo_backend.offload
+@result_encoder.encoded
 def get_top_relationship_managers() -> str:
     """
     Analyzes the MongoDB clients collection to identify relationship managers and the number of
     clients they manage, sorted by client count in descending order.
     """
-    collection, client_conn = None, None
     try:
-        collection, client_conn = _get_mongo_collection()
-        pipeline = [
-            {"$group": {"_id": "$relationship_manager", "client_count": {"$sum": 1}}},
-            {"$sort": {"client_count": -1}}
-        ]
-        managers_data = list(collection.aggregate(pipeline))
-        return json.dumps(managers_data, indent=2)
+        rankings = client_rankings.get()
+        if rankings is not None:
+            return list(rankings["relationship_managers"])
+
+        collection = _get_mongo_collection()
+        managers_data = list(collection.aggregate(TOP_RELATIONSHIP_MANAGERS_PIPELINE))
+        return managers_data
     except ConnectionError as conn_err:
         return json.dumps({"error": str(conn_err), "message": "MongoDB connection failed."})
     except Exception as e:
         return json.dumps({"error": str(e), "message": "Failed to retrieve top relationship managers."})
-    finally:
-        if client_conn:
-            client_conn.close()
 
 
 @mcp_server.tool()
+@traced_tool
+@tool_cache.cached
+@mongo_backend.offload
+@result_encoder.encoded
 def get_client_profile_by_id(client_id: str) -> str:
     """
     Retrieves the full client profile from MongoDB using their unique client ID.
     """
-    collection, client_conn = None, None
     try:
-        collection, client_conn = _get_mongo_collection()
+        collection = _get_mongo_collection()
         client_data = collection.find_one(
             {"client_id": client_id},
-            {"_id": 0} # Exclude the MongoDB default _id field
+            CLIENT_PROJECTION # Exclude _id
         )
         if client_data:
-            return json.dumps(client_data, indent=2)
+            return client_data
         else:
             return json.dumps({"message": f"Client with ID {client_id} not found."})
     except ConnectionError as conn_err:
         return json.dumps({"error": str(conn_err), "message": "MongoDB connection failed."})
     except Exception as e:
         return json.dumps({"error": str(e), "message": f"Failed to retrieve client profile for ID {client_id}."})
-    finally:
-        if client_conn:
-            client_conn.close()
 
 @mcp_server.tool()
+@traced_tool
+@tool_cache.cached
+@mongo_backend.offload
+@result_encoder.encoded
+def get_client_profiles_by_ids(client_ids: list[str]) -> str:
+    """
+    Retrieves the full client profiles for a list of client IDs from MongoDB in one call.
+    Prefer this over calling get_client_profile_by_id once per client.
+    Profiles are returned in the order of the given IDs; unknown IDs are listed under 'not_found'.
+    """
+    if len(client_ids) > BULK_MAX_IDS:
+        return json.dumps({"error": f"Too many client IDs ({len(client_ids)}); at most {BULK_MAX_IDS} per call."})
+
+    try:
+        collection = _get_mongo_collection()
+        docs = collection.find({"client_id": {"$in": client_ids}}, CLIENT_PROJECTION)
+        by_id = {doc.get("client_id"): doc for doc in docs}
+        return {
+            "profiles": [by_id[client_id] for client_id in client_ids if client_id in by_id],
+            "not_found": [client_id for client_id in client_ids if client_id not in by_id]
+        }
+    except ConnectionError as conn_err:
+        return json.dumps({"error": str(conn_err), "message": "MongoDB connection failed."})
+    except Exception as e:
+        return json.dumps({"error": str(e), "message": "Failed to retrieve client profiles for the given IDs."})
+
+@mcp_server.tool()
+@traced_tool
+@tool_cache.cached
+@mongo_backend.offload
+@result_encoder.encoded
 def get_client_ids_by_relationship_manager(relationship_manager_name: str) -> str:
     """
     Retrieves a list of client IDs who are managed by a specific relationship manager from MongoDB.
     """
-    collection, client_conn = None, None
     try:
-        collection, client_conn = _get_mongo_collection()
-        clients_cursor = collection.find(
-            {"relationship_manager": {"$regex": relationship_manager_name, "$options": "i"}},
+        collection = _get_mongo_collection()
+        clients = _find_case_insensitive(
+            collection, "relationship_manager", relationship_manager_name,
             {"client_id": 1, "_id": 0} #only return client id
         )
-        client_ids = [doc['client_id'] for doc in list(clients_cursor) if 'client_id' in doc]
-        return json.dumps(client_ids, indent=2)
+        client_ids = [doc['client_id'] for doc in clients if 'client_id' in doc]
+        return client_ids
     except ConnectionError as conn_err:
         return json.dumps({"error": str(conn_err), "message": "MongoDB connection failed."})
     except Exception as e:
         return json.dumps({"error": str(e), "message": f"Failed to retrieve client IDs for RM {relationship_manager_name}."})
-    finally:
-        if client_conn:
-            client_conn.close()
 
 #handle float limit input
 @mcp_server.tool()
+@traced_tool
+@tool_cache.cached
+@mongo_backend.offload
+@result_encoder.encoded
 def get_top_n_clients_by_investment_type_value(investment_type: str, limit: float = 5.0) -> str:
     """
     Retrieves the top N clients with the highest holdings in a specific investment type from MongoDB.
     Uses an aggregation pipeline to filter by investment type, sort by value in descending order, and limit the results.
     Returns a JSON string containing a list of dictionaries, each with 'client_id', 'name', 'risk_appetite', 'investment_type', and 'holding_value_crores'.
     """
-    collection, client_conn = None, None
     try:
-        collection, client_conn = _get_mongo_collection()
         int_limit = int(limit) 
+        type_lc = normalize(investment_type)
+        rankings = client_rankings.get() if int_limit > 0 else None
+        top_clients = top_holdings(rankings, type_lc, int_limit) if rankings is not None else None
+        if top_clients is not None:
+            return top_clients
 
-        pipeline = [
-            {
-                "$match": {
-                    "portfolio_by_preference.type": { "$regex": investment_type, "$options": "i" }
-                }
-            },
-            {
-                "$unwind": "$portfolio_by_preference"
-            },
-            {
-                "$match": {
-                    "portfolio_by_preference.type": { "$regex": investment_type, "$options": "i" }
-                }
-            },
-            {
-                "$sort": { "portfolio_by_preference.value_crores": -1 }
-            },
-            {
-                "$limit": int_limit 
-            },
-            {
-                "$project": {
-                    "_id": 0,
-                    "client_id": "$client_id",
-                    "name": "$name",
-                    "risk_appetite": "$risk_appetite",
-                    "investment_type": "$portfolio_by_preference.type",
-                    "holding_value_crores": "$portfolio_by_preference.value_crores"
-                }
-            }
-        ]
-        
-        top_clients = list(collection.aggregate(pipeline))
-        return json.dumps(top_clients, indent=2)
+        collection = _get_mongo_collection()
+
+        # exact type when one exists, otherwise types starting with the given text
+        if collection.find_one({"portfolio_by_preference.type": exact_match(investment_type)}, {"_id": 1},
+                               collation=CASE_INSENSITIVE):
+            type_filter = exact_match(investment_type)
+            holding_match = {"$eq": [{"$toLower": "$portfolio_by_preference.type"}, type_lc]}
+        else:
+            type_filter = prefix_match(investment_type)
+            holding_match = {"$eq": [{"$indexOfCP": [{"$toLower": "$portfolio_by_preference.type"}, type_lc]}, 0]}
+
+        pipeline = _top_holdings_pipeline(type_filter, holding_match, int_limit)
+        top_clients = list(collection.aggregate(pipeline, collation=CASE_INSENSITIVE))
+        return top_clients
     except ConnectionError as conn_err:
         return json.dumps({"error": str(conn_err), "message": "MongoDB connection failed."})
     except Exception as e:
         # for debugging
         print(f"DEBUG: Error in get_top_n_clients_by_investment_type_value for '{investment_type}' with limit {limit}: {e}")
         return json.dumps({"error": str(e), "message": f"Failed to retrieve top clients by {investment_type} investment value. Check agent console logs for more details."})
-    finally:
-        if client_conn:
-            client_conn.close()
+
+@mcp_server.tool()
+def get_mongodb_server_stats() -> str:
+    """
+    Operational statistics for the MongoDB tool server (shared client connection reuse).
+    Used by the API's admin endpoints; not offered to the agent.
+    """
+    return json.dumps({
+        "mongo_client": mongo_client.stats(),
+        "tool_backend": mongo_backend.stats(),
+        "tool_cache": tool_cache.stats(),
+        "result_store": result_store.stats(),
+        "leaderboards": leaderboard_refresher.stats(),
+    })
+
+@mcp_server.tool()
+def get_mongodb_metrics() -> str:
+    """
+    This server's metrics registry (span latency histograms and counters), which the API
+    merges into its /metrics endpoint. Not offered to the agent.
+    """
+    return json.dumps(metrics.snapshot())
+
+@mcp_server.tool()
+def clear_mongodb_tool_cache(tool_name: str = None) -> str:
+    """
+    Invalidates cached MongoDB tool results, for one tool or for all of them.
+    Used by the API's admin endpoints; not offered to the agent.
+    """
+    return json.dumps({"cleared": tool_cache.clear(tool_name)})
+
+@mcp_server.tool()
+def fetch_mongodb_result_page(handle: str, offset: float = 0.0, limit: float = 500.0) -> str:
+    """
+    Returns one page of documents from a large MongoDB tool result stored under `handle`.
+    Used by the API's /results endpoint; not offered to the agent.
+    """
+    page = result_store.page(handle, max(0, int(offset)), max(1, int(limit)))
+    if page is None:
+        return json.dumps({"error": "not_found", "message": f"Result {handle} does not exist or has expired."})
+    return dumps(page)
+
+def startup():
+    """One-time preparation before serving, whether as a subprocess or loaded in-process."""
+    bootstrap_client_indexes(_get_mongo_collection)
+    if leaderboard_settings["size"] > 0:
+        leaderboard_refresher.start()
 
 if __name__ == "__main__":
-    print(f"Starting {mcp_server.name} MCP Server...")
-    mcp_server.run(transport="stdio")
+    serve(mcp_server, startup)
 
@@ -0,0 +1,222 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+
+from telemetry import span
+
+
+class _TracedCursor:
+    """Forwards to a driver cursor, timing statements and fetches as db.mysql spans."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, operation, *args, **kwargs):
+        with span("db.mysql.execute", statement=operation.lstrip()[:6].upper()):
+            return self._cursor.execute(operation, *args, **kwargs)
+
+    def fetchone(self):
+        with span("db.mysql.fetch"):
+            return self._cursor.fetchone()
+
+    def fetchmany(self, *args, **kwargs):
+        with span("db.mysql.fetch"):
+            return self._cursor.fetchmany(*args, **kwargs)
+
+    def fetchall(self):
+        with span("db.mysql.fetch"):
+            return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _TracedConnection:
+    """A checked-out connection whose cursors are traced; everything else goes to the driver."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return _TracedCursor(self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class MySQLConnectionPool:
+    """
+    A bounded pool of long-lived MySQL connections shared by every tool in the process.
+    Connections are opened lazily, health-checked on checkout and replaced when stale,
+    so most tool calls skip the TCP/TLS handshake entirely.
+    """
+
+    def __init__(self, connect, size=5, checkout_timeout=10.0, ping_after_seconds=30.0, recycle_seconds=3600.0):
+        if size < 1:
+            raise ValueError("MySQL pool size must be at least 1.")
+        self._connect = connect
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.ping_after_seconds = ping_after_seconds
+        self.recycle_seconds = recycle_seconds
+
+        self._cond = threading.Condition()
+        self._idle = []  # (conn, opened_at, last_used_at), most recently used last
+        self._open = 0
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time_ms": 0.0,
+            "handshakes": 0,
+            "handshakes_avoided": 0,
+            "reconnects": 0,
+            "discarded": 0,
+        }
+
+    @contextmanager
+    def connection(self):
+        """
+        Checks out a healthy connection for the duration of the block. Connections that
+        raised a MySQL error are discarded instead of being returned to the pool.
+        """
+        with span("db.mysql.checkout"):
+            conn, opened_at = self._checkout()
+        try:
+            yield _TracedConnection(conn)
+        except mysql.connector.Error:
+            self._discard(conn)
+            raise
+        except BaseException:
+            self._release(conn, opened_at)
+            raise
+        else:
+            self._release(conn, opened_at)
+
+    def _checkout(self):
+        deadline = None
+        with self._cond:
+            self._stats["checkouts"] += 1
+            while True:
+                if self._closed:
+                    raise ConnectionError("MySQL connection pool is closed.")
+                if self._idle:
+                    conn, opened_at, last_used_at = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    conn = None
+                    break
+                if deadline is None:
+                    self._stats["waits"] += 1
+                    wait_started = time.monotonic()
+                    deadline = wait_started + self.checkout_timeout
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["wait_time_ms"] += (time.monotonic() - wait_started) * 1000
+                    raise ConnectionError(
+                        f"Timed out after {self.checkout_timeout}s waiting for a pooled MySQL connection."
+                    )
+                self._cond.wait(remaining)
+            if deadline is not None:
+                self._stats["wait_time_ms"] += (time.monotonic() - wait_started) * 1000
+
+        # Handshakes and pings happen outside the lock so other callers are not blocked.
+        try:
+            if conn is None:
+                return self._open_new(), time.monotonic()
+            if self._is_healthy(conn, opened_at, last_used_at):
+                self._count("handshakes_avoided")
+                return conn, opened_at
+            self._close_quietly(conn)
+            self._count("reconnects")
+            return self._open_new(), time.monotonic()
+        except BaseException:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def _open_new(self):
+        conn = self._connect()
+        self._count("handshakes")
+        return conn
+
+    def _is_healthy(self, conn, opened_at, last_used_at):
+        now = time.monotonic()
+        if self.recycle_seconds and now - opened_at > self.recycle_seconds:
+            return False
+        if now - last_used_at < self.ping_after_seconds:
+            return True
+        try:
+            # is_connected() pings the server, catching connections dropped by wait_timeout.
+            return conn.is_connected()
+        except Exception:
+            return False
+
+    def _release(self, conn, opened_at):
+        try:
+            if conn.unread_result:
+                conn.consume_results()
+        except Exception:
+            self._discard(conn)
+            return
+        with self._cond:
+            if self._closed:
+                self._open -= 1
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, opened_at, time.monotonic()))
+            self._cond.notify()
+
+    def _discard(self, conn):
+        self._close_quietly(conn)
+        with self._cond:
+            self._open -= 1
+            self._stats["discarded"] += 1
+            self._cond.notify()
+
+    def _count(self, key):
+        with self._cond:
+            self._stats[key] += 1
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats["wait_time_ms"] = round(stats["wait_time_ms"], 3)
+            stats.update(size=self.size, open=self._open, idle=len(self._idle), in_use=self._open - len(self._idle))
+        return stats
+
+    def close(self):
+        """Closes idle connections; connections still checked out are closed when released."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            self._close_quietly(conn)
+
+
+def iter_rows(cursor, batch_size=500):
+    """
+    Streams rows from an executed (ideally unbuffered) cursor in fetchmany batches, so
+    client memory stays bounded by `batch_size` rather than the size of the result.
+    """
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
@@ -1,13 +1,27 @@
 import os
+import atexit
+import base64
+import heapq
 from dotenv import load_dotenv
 import mysql.connector
-from pymongo import MongoClient
 import json
 from datetime import date
 from decimal import Decimal
 
 from mcp.server.fastmcp import FastMCP
 
+from mysql_pool import MySQLConnectionPool, iter_rows
+from mongo_connection import SharedMongoClient, mongo_client_options
+from tool_runtime import ToolBackend, serve
+from tool_cache import tool_cache_from_env
+from result_encoding import dumps, result_encoder_from_env
+from result_store import result_store_from_env
+from telemetry import metrics, traced_tool
+from leaderboards import Leaderboard, LeaderboardRefresher, leaderboard_settings_from_env
+from mongo_indexes import CASE_INSENSITIVE, exact_match, prefix_match
+from cross_db_join import batched_join, chunked, sql_in_clause, stream_mongo_keys
+from holdings import HOLDERS_QUERY, LEGACY_HOLDERS_QUERY, TRANSACTIONS_ID_COLUMN, HoldingsRefresher, normalize_symbol
+
 
 # load_dotenv()
 
@@ -17,6 +31,27 @@ MYSQL_DATABASE = os.getenv("MYSQL_DATABASE")
 MYSQL_USER = os.getenv("MYSQL_USER")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD")
 
+MYSQL_POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE", "5"))
+MYSQL_POOL_TIMEOUT = float(os.getenv("MYSQL_POOL_TIMEOUT", "10"))
+MYSQL_POOL_PING_AFTER = float(os.getenv("MYSQL_POOL_PING_AFTER", "30"))
+MYSQL_POOL_RECYCLE = float(os.getenv("MYSQL_POOL_RECYCLE", "3600"))
+TRANSACTION_COLUMNS = os.getenv(
+    "TRANSACTION_COLUMNS", f"{TRANSACTIONS_ID_COLUMN},stock_symbol,transaction_type,quantity,price,transaction_date"
+).split(",")
+# the keyset columns must always be projected to build continuation tokens
+TRANSACTION_COLUMNS += [c for c in (TRANSACTIONS_ID_COLUMN, "transaction_date") if c not in TRANSACTION_COLUMNS]
+TRANSACTIONS_MAX_LIMIT = int(os.getenv("TRANSACTIONS_MAX_LIMIT", "500"))
+TRANSACTIONS_FETCH_BATCH = int(os.getenv("TRANSACTIONS_FETCH_BATCH", "200"))
+TOP_N_MAX_LIMIT = int(os.getenv("TOP_N_MAX_LIMIT", "500"))
+
+JOIN_BATCH_SIZE = int(os.getenv("JOIN_BATCH_SIZE", "500"))
+JOIN_PREFETCH = int(os.getenv("JOIN_PREFETCH", "2"))
+BULK_MAX_IDS = int(os.getenv("BULK_MAX_IDS", "200"))
+
+HOLDINGS_REFRESH_INTERVAL = float(os.getenv("HOLDINGS_REFRESH_INTERVAL", "30"))
+# more concurrent tool calls than pooled connections would only queue on the pool
+MYSQL_TOOL_CONCURRENCY = int(os.getenv("MYSQL_TOOL_CONCURRENCY", str(MYSQL_POOL_SIZE)))
+
 MONGO_URI = os.getenv("MONGO_URI")
 MONGO_DB_NAME = os.getenv("MONGO_DB_NAME") 
 
@@ -43,7 +78,10 @@ def _get_mysql_connection():
             database=MYSQL_DATABASE,
             user=MYSQL_USER,
             password=MYSQL_PASSWORD,
-            ssl_ca=MYSQL_SSL_CA_PATH
+            ssl_ca=MYSQL_SSL_CA_PATH,
+            # pooled connections are reused across calls; autocommit keeps each read
+            # from seeing the snapshot of an earlier, never-closed transaction
+            autocommit=True
         )
         return conn
     except mysql.connector.Error as err:
@@ -51,28 +89,91 @@ def _get_mysql_connection():
     except ValueError:
         raise ValueError("MYSQL_PORT must be a valid integer.")
 
+mysql_pool = MySQLConnectionPool(
+    _get_mysql_connection,
+    size=MYSQL_POOL_SIZE,
+    checkout_timeout=MYSQL_POOL_TIMEOUT,
+    ping_after_seconds=MYSQL_POOL_PING_AFTER,
+    recycle_seconds=MYSQL_POOL_RECYCLE,
+)
+atexit.register(mysql_pool.close)
+
+mysql_backend = ToolBackend("mysql", MYSQL_TOOL_CONCURRENCY)
+atexit.register(mysql_backend.shutdown)
+
+holdings_refresher = HoldingsRefresher(interval=HOLDINGS_REFRESH_INTERVAL)
+
+tool_cache = tool_cache_from_env({
+    "get_top_n_portfolios": 60,
+    "get_portfolio_values_by_relationship_manager": 60,
+    "get_transactions_for_relationship_manager": 30,
+    "get_top_n_portfolios_with_profiles": 60,
+    "get_portfolio_values_for_ids": 60,
+    "get_client_transactions_for_ids": 30,
+    "get_client_transactions": 30,
+    "get_stock_holders_for_stock": 60,
+})
+
+result_store = result_store_from_env("mysql")
+result_encoder = result_encoder_from_env({
+    # paged by keyset tokens: dropping rows from a page would skip them for good, so
+    # `limit` bounds this result instead of the token budget
+    "get_client_transactions": 0,
+}, store=result_store)
+
+mongo_client = SharedMongoClient(MONGO_URI, **mongo_client_options())
+atexit.register(mongo_client.close)
+
 def _get_mongodb_connection():
 
     if not all([MONGO_URI, MONGO_DB_NAME]):
         raise ValueError("MongoDB credentials not fully set in environment variables.")
-    try:
-        client = MongoClient(MONGO_URI)
-        db = client[MONGO_DB_NAME]
-        return client, db
-    except Exception as e:
-        raise ConnectionError(f"Failed to connect to MongoDB: {e}")
+    return mongo_client.get()[MONGO_DB_NAME]
+
+TOP_PORTFOLIOS_QUERY = "SELECT client_id, portfolio_value FROM client_portfolios ORDER BY portfolio_value DESC LIMIT %s;"
+
+def _load_top_portfolios():
+    with mysql_pool.connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(TOP_PORTFOLIOS_QUERY, (leaderboard_settings["size"],))
+        return cursor.fetchall()
+
+# the largest portfolios, kept in memory for the top-N tools; client_portfolios has no
+# change feed or update watermark, so the board is rebuilt every LEADERBOARD_REFRESH_INTERVAL
+leaderboard_settings = leaderboard_settings_from_env()
+top_portfolios = Leaderboard("top_portfolios", _load_top_portfolios, max_age=leaderboard_settings["max_age"])
+LEADERBOARD_TOOLS = ["get_top_n_portfolios", "get_top_n_portfolios_with_profiles"]
+leaderboard_refresher = LeaderboardRefresher(
+    "mysql",
+    [top_portfolios],
+    interval=leaderboard_settings["interval"],
+    min_gap=leaderboard_settings["min_gap"],
+    # cached answers from the previous snapshot would outlive the change that replaced it
+    on_refresh=lambda: [tool_cache.clear(tool_name) for tool_name in LEADERBOARD_TOOLS],
+)
+atexit.register(leaderboard_refresher.stop)
+
+def _top_portfolios_from_memory(limit):
+    """The top `limit` portfolios from the leaderboard, or None when it is stale or too short."""
+    portfolios = top_portfolios.get() if limit > 0 else None
+    if portfolios is None or (limit > len(portfolios) and len(portfolios) >= leaderboard_settings["size"]):
+        return None
+    return portfolios[:limit]
 
 @mcp_server.tool()
+@traced_tool
+@tool_cache.cached
+@mysql_backend.offload
+@result_encoder.encoded
 def get_top_n_portfolios(limit: float = 5.0) -> str: 
     """
     Retrieves the top N portfolios based on their latest portfolio value.
     """
-    conn = None
     try:
-        conn = _get_mysql_connection()
-        cursor = conn.cursor(dictionary=True)
-
         int_limit = int(limit) 
+        results = _top_portfolios_from_memory(int_limit)
+        if results is not None:
+            return results
 
         query = """
         SELECT client_id, portfolio_value
@@ -80,93 +181,317 @@ def get_top_n_portfolios(limit: float = 5.0) -> str:
         ORDER BY portfolio_value DESC
         LIMIT %s;
         """
-        cursor.execute(query, (int_limit,))
-        results = cursor.fetchall()
-
-        for row in results:
-            if 'portfolio_value' in row and isinstance(row['portfolio_value'], Decimal):
-                row['portfolio_value'] = float(row['portfolio_value'])
+        with mysql_pool.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(query, (int_limit,))
+            results = cursor.fetchall()
 
-        return json.dumps(results, indent=2)
+        return results
     except ConnectionError as conn_err:
         return json.dumps({"error": str(conn_err), "message": "Database connection failed."})
     except mysql.connector.Error as err:
         return json.dumps({"error": str(err), "message": f"Failed to retrieve top N portfolios from MySQL. Database Error: {err}"})
     except Exception as e:
         return json.dumps({"error": str(e), "message": "An unexpected error occurred while fetching top portfolios."})
-    finally:
-        if conn:
-            conn.close()
 
 
+def _relationship_manager_filter(clients, name):
+    """
+    Case-insensitive exact match on the manager's name, or a prefix match when no client
+    has that exact manager, as the MongoDB tools look names up.
+    """
+    exact = {"relationship_manager": exact_match(name)}
+    if clients.find_one(exact, {"_id": 1}, collation=CASE_INSENSITIVE) is not None:
+        return exact
+    return {"relationship_manager": prefix_match(name)}
+
 @mcp_server.tool()
+@traced_tool
+@tool_cache.cached
+@mysql_backend.offload
+@result_encoder.encoded
 def get_portfolio_values_by_relationship_manager(relationship_manager_name: str) -> str:
     """
     Aggregates the total latest portfolio value for clients managed by a specific
     relationship manager by cross-referencing with MongoDB client data and MySQL portfolio data.
     """
-    mongo_client = None
-    mysql_conn = None
     try:
-        mongo_client, db = _get_mongodb_connection()
-        clients_collection = db.clients
-        
-        rm_clients = clients_collection.find(
-            {"relationship_manager": {"$regex": f"^{relationship_manager_name}$", "$options": "i"}},
-            {"client_id": 1, "_id": 0}
+        db = _get_mongodb_connection()
+        key_chunks = stream_mongo_keys(
+            db.clients, _relationship_manager_filter(db.clients, relationship_manager_name), "client_id",
+            JOIN_BATCH_SIZE, collation=CASE_INSENSITIVE
         )
-        client_ids = [doc["client_id"] for doc in rm_clients if "client_id" in doc]
 
-        if not client_ids:
+        client_count = 0
+        portfolio_count = 0
+        total_portfolio_value = Decimal(0)
+        with mysql_pool.connection() as mysql_conn:
+            cursor = mysql_conn.cursor(dictionary=True)
+
+            def sum_portfolios(client_ids):
+                in_clause, params = sql_in_clause("client_id", client_ids)
+                cursor.execute(
+                    f"SELECT COUNT(*) AS portfolios, SUM(portfolio_value) AS total FROM client_portfolios WHERE {in_clause};",
+                    params
+                )
+                return cursor.fetchone()
+
+            for client_ids, partial in batched_join(key_chunks, sum_portfolios, JOIN_BATCH_SIZE, JOIN_PREFETCH):
+                client_count += len(client_ids)
+                portfolio_count += partial['portfolios']
+                total_portfolio_value += partial['total'] or Decimal(0)
+
+        if not client_count:
             return json.dumps({
                 "relationship_manager": relationship_manager_name,
                 "total_portfolio_value": 0.0,
                 "message": f"No clients found for relationship manager '{relationship_manager_name}'."
             })
 
+        return {
+            "relationship_manager": relationship_manager_name,
+            "client_count": client_count,
+            "portfolio_count": portfolio_count,
+            "total_portfolio_value": total_portfolio_value
+        }
 
-        mysql_conn = _get_mysql_connection()
-        cursor = mysql_conn.cursor(dictionary=True)
+    except ConnectionError as conn_err:
+        return json.dumps({"error": str(conn_err), "message": "Database connection failed (MongoDB or MySQL)."})
+    except Exception as e:
+        return json.dumps({"error": str(e), "message": f"Failed to get portfolio values for RM {relationship_manager_name}. Error: {e}"})
 
-        placeholders = ', '.join(['%s'] * len(client_ids))
-        query = f"""
-        SELECT client_id, portfolio_value
-        FROM client_portfolios
-        WHERE client_id IN ({placeholders});
-        """
-        cursor.execute(query, tuple(client_ids))
-        mysql_results = cursor.fetchall()
 
-        total_portfolio_value = Decimal(0)
-        for row in mysql_results:
-            if 'portfolio_value' in row and isinstance(row['portfolio_value'], Decimal):
-                total_portfolio_value += row['portfolio_value']
+@mcp_server.tool()
+@traced_tool
+@tool_cache.cached
+@mysql_backend.offload
+@result_encoder.encoded
+def get_transactions_for_relationship_manager(relationship_manager_name: str, start_date: str = None,
+                                              end_date: str = None, limit: float = 50.0) -> str:
+    """
+    Retrieves the most recent transactions across all clients of a relationship manager in one call,
+    optionally within a date range (YYYY-MM-DD). Returns the newest `limit` transactions and the
+    total number of matching transactions.
+    """
+    try:
+        int_limit = max(1, min(int(limit), TRANSACTIONS_MAX_LIMIT))
+        date_filter, date_params = "", []
+        if start_date:
+            date_filter += " AND transaction_date >= %s"
+            date_params.append(start_date)
+        if end_date:
+            date_filter += " AND transaction_date <= %s"
+            date_params.append(end_date)
+
+        db = _get_mongodb_connection()
+        key_chunks = stream_mongo_keys(
+            db.clients, _relationship_manager_filter(db.clients, relationship_manager_name), "client_id",
+            JOIN_BATCH_SIZE, collation=CASE_INSENSITIVE
+        )
 
-        return json.dumps({
+        client_count = 0
+        total_transactions = 0
+        newest = []
+        with mysql_pool.connection() as mysql_conn:
+            cursor = mysql_conn.cursor(dictionary=True)
+
+            def newest_for_batch(client_ids):
+                in_clause, params = sql_in_clause("client_id", client_ids)
+                cursor.execute(
+                    f"SELECT COUNT(*) AS matching FROM transactions WHERE {in_clause}{date_filter};",
+                    params + tuple(date_params)
+                )
+                matching = cursor.fetchone()['matching']
+                # each batch only needs to contribute its own newest `limit` rows
+                cursor.execute(
+                    f"SELECT client_id, {', '.join(TRANSACTION_COLUMNS)} FROM transactions "
+                    f"WHERE {in_clause}{date_filter} "
+                    f"ORDER BY transaction_date DESC, {TRANSACTIONS_ID_COLUMN} DESC LIMIT %s;",
+                    params + tuple(date_params) + (int_limit,)
+                )
+                return matching, cursor.fetchall()
+
+            order_key = lambda row: (row['transaction_date'], row[TRANSACTIONS_ID_COLUMN])
+            for client_ids, (matching, rows) in batched_join(key_chunks, newest_for_batch, JOIN_BATCH_SIZE, JOIN_PREFETCH):
+                client_count += len(client_ids)
+                total_transactions += matching
+                newest = heapq.nlargest(int_limit, newest + rows, key=order_key)
+
+        return {
             "relationship_manager": relationship_manager_name,
-            "total_portfolio_value": float(total_portfolio_value)
-        }, indent=2)
+            "client_count": client_count,
+            "total_transactions": total_transactions,
+            "transactions": newest,
+            "returned": len(newest)
+        }
 
     except ConnectionError as conn_err:
         return json.dumps({"error": str(conn_err), "message": "Database connection failed (MongoDB or MySQL)."})
     except Exception as e:
-        return json.dumps({"error": str(e), "message": f"Failed to get portfolio values for RM {relationship_manager_name}. Error: {e}"})
-    finally:
-        if mysql_conn:
-            mysql_conn.close()
-        if mongo_client:
-            mongo_client.close()
+        return json.dumps({"error": str(e), "message": f"Failed to get transactions for RM {relationship_manager_name}. Error: {e}"})
+
+
+@mcp_server.tool()
+@traced_tool
+@tool_cache.cached
+@mysql_backend.offload
+@result_encoder.encoded
+def get_top_n_portfolios_with_profiles(limit: float = 5.0) -> str:
+    """
+    Retrieves the top N portfolios by latest portfolio value together with each client's name,
+    risk appetite and relationship manager from MongoDB, in a single call.
+    """
+    try:
+        int_limit = max(1, min(int(limit), TOP_N_MAX_LIMIT))
+        portfolios = _top_portfolios_from_memory(int_limit)
+        if portfolios is None:
+            with mysql_pool.connection() as conn:
+                cursor = conn.cursor(dictionary=True)
+                cursor.execute(TOP_PORTFOLIOS_QUERY, (int_limit,))
+                portfolios = cursor.fetchall()
+
+        clients = _get_mongodb_connection().clients
+        projection = {"_id": 0, "client_id": 1, "name": 1, "risk_appetite": 1, "relationship_manager": 1}
+        profiles = {}
+        lookup = lambda client_ids: list(clients.find({"client_id": {"$in": client_ids}}, projection))
+        id_chunks = chunked((row['client_id'] for row in portfolios), JOIN_BATCH_SIZE)
+        for _, docs in batched_join(id_chunks, lookup, JOIN_BATCH_SIZE, JOIN_PREFETCH):
+            profiles.update((doc['client_id'], doc) for doc in docs)
+
+        results = []
+        for row in portfolios:
+            profile = profiles.get(row['client_id'], {})
+            results.append({
+                "client_id": row['client_id'],
+                "portfolio_value": row['portfolio_value'],
+                "name": profile.get("name"),
+                "risk_appetite": profile.get("risk_appetite"),
+                "relationship_manager": profile.get("relationship_manager")
+            })
+        return results
+
+    except ConnectionError as conn_err:
+        return json.dumps({"error": str(conn_err), "message": "Database connection failed (MongoDB or MySQL)."})
+    except Exception as e:
+        return json.dumps({"error": str(e), "message": f"Failed to retrieve top portfolios with profiles. Error: {e}"})
 
 
 @mcp_server.tool()
-def get_client_transactions(client_id: str, start_date: str = None, end_date: str = None) -> str:
+@traced_tool
+@tool_cache.cached
+@mysql_backend.offload
+@result_encoder.encoded
+def get_portfolio_values_for_ids(client_ids: list[str]) -> str:
+    """
+    Retrieves the latest portfolio value for each of a list of client IDs in one call,
+    plus their combined total. Prefer this over looking clients up one at a time.
+    """
+    if len(client_ids) > BULK_MAX_IDS:
+        return json.dumps({"error": f"Too many client IDs ({len(client_ids)}); at most {BULK_MAX_IDS} per call."})
 
-    conn = None
     try:
-        conn = _get_mysql_connection()
-        cursor = conn.cursor(dictionary=True)
+        portfolios = []
+        with mysql_pool.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            for batch in chunked(client_ids, JOIN_BATCH_SIZE):
+                in_clause, params = sql_in_clause("client_id", batch)
+                cursor.execute(f"SELECT client_id, portfolio_value FROM client_portfolios WHERE {in_clause};", params)
+                portfolios.extend(cursor.fetchall())
+
+        total = sum((row['portfolio_value'] or Decimal(0) for row in portfolios), Decimal(0))
+        found = {row['client_id'] for row in portfolios}
+        return {
+            "portfolios": portfolios,
+            "total_portfolio_value": total,
+            "not_found": [client_id for client_id in client_ids if client_id not in found]
+        }
+    except ConnectionError as conn_err:
+        return json.dumps({"error": str(conn_err), "message": "Database connection failed."})
+    except Exception as e:
+        return json.dumps({"error": str(e), "message": f"Failed to retrieve portfolio values for the given clients. Error: {e}"})
+
+
+@mcp_server.tool()
+@traced_tool
+@tool_cache.cached
+@mysql_backend.offload
+@result_encoder.encoded
+def get_client_transactions_for_ids(client_ids: list[str], start_date: str = None, end_date: str = None,
+                                    limit_per_client: float = 20.0) -> str:
+    """
+    Retrieves recent transactions for several clients in one call, optionally within a date range
+    (YYYY-MM-DD). Returns up to `limit_per_client` newest transactions per client, grouped by client ID.
+    """
+    if len(client_ids) > BULK_MAX_IDS:
+        return json.dumps({"error": f"Too many client IDs ({len(client_ids)}); at most {BULK_MAX_IDS} per call."})
+
+    try:
+        int_limit = max(1, min(int(limit_per_client), TRANSACTIONS_MAX_LIMIT))
+        date_filter, date_params = "", []
+        if start_date:
+            date_filter += " AND transaction_date >= %s"
+            date_params.append(start_date)
+        if end_date:
+            date_filter += " AND transaction_date <= %s"
+            date_params.append(end_date)
+
+        by_client = {client_id: [] for client_id in client_ids}
+        with mysql_pool.connection() as conn:
+            cursor = conn.cursor(dictionary=True, buffered=False)
+            for batch in chunked(client_ids, JOIN_BATCH_SIZE):
+                in_clause, params = sql_in_clause("client_id", batch)
+                # ROW_NUMBER keeps the per-client limit in SQL instead of shipping every row back
+                cursor.execute(f"""
+                SELECT * FROM (
+                    SELECT client_id, {', '.join(TRANSACTION_COLUMNS)},
+                           ROW_NUMBER() OVER (
+                               PARTITION BY client_id ORDER BY transaction_date DESC, {TRANSACTIONS_ID_COLUMN} DESC
+                           ) AS row_num
+                    FROM transactions
+                    WHERE {in_clause}{date_filter}
+                ) ranked
+                WHERE row_num <= %s
+                ORDER BY client_id, row_num;
+                """, params + tuple(date_params) + (int_limit,))
+                for row in iter_rows(cursor, TRANSACTIONS_FETCH_BATCH):
+                    row.pop('row_num', None)
+                    by_client.setdefault(row.pop('client_id'), []).append(row)
+
+        return by_client
+    except ConnectionError as conn_err:
+        return json.dumps({"error": str(conn_err), "message": "Database connection failed."})
+    except Exception as e:
+        return json.dumps({"error": str(e), "message": f"Failed to retrieve transactions for the given clients. Error: {e}"})
 
-        query = "SELECT * FROM transactions WHERE client_id = %s"
+
+def _encode_continuation_token(transaction_date, transaction_id):
+    if isinstance(transaction_date, date):
+        transaction_date = transaction_date.isoformat()
+    payload = json.dumps([transaction_date, transaction_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+def _decode_continuation_token(token):
+    try:
+        transaction_date, transaction_id = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        return transaction_date, transaction_id
+    except Exception:
+        raise ValueError("Invalid continuation_token; pass the next_page_token from a previous call unchanged.")
+
+@mcp_server.tool()
+@traced_tool
+@tool_cache.cached
+@mysql_backend.offload
+@result_encoder.encoded
+def get_client_transactions(client_id: str, start_date: str = None, end_date: str = None,
+                            limit: float = 50.0, continuation_token: str = None) -> str:
+    """
+    Retrieves a client's transactions from MySQL, newest first, optionally within a date range
+    (YYYY-MM-DD). Returns at most `limit` transactions plus a `next_page_token`; pass it back as
+    `continuation_token` to fetch the next, older page.
+    """
+    try:
+        int_limit = max(1, min(int(limit), TRANSACTIONS_MAX_LIMIT))
+        query = f"SELECT {', '.join(TRANSACTION_COLUMNS)} FROM transactions WHERE client_id = %s"
         params = [client_id]
 
         if start_date and end_date:
@@ -179,54 +504,119 @@ def get_client_transactions(client_id: str, start_date: str = None, end_date: st
             query += " AND transaction_date <= %s"
             params.append(end_date)
 
-        query += " ORDER BY transaction_date DESC;"
-
-        cursor.execute(query, tuple(params))
-        results = cursor.fetchall()
-
-        for row in results:
-            if 'transaction_date' in row and isinstance(row['transaction_date'], date):
-                row['transaction_date'] = row['transaction_date'].isoformat()
-
-        return json.dumps(results, indent=2)
+        if continuation_token:
+            after_date, after_id = _decode_continuation_token(continuation_token)
+            query += f" AND (transaction_date < %s OR (transaction_date = %s AND {TRANSACTIONS_ID_COLUMN} < %s))"
+            params.extend([after_date, after_date, after_id])
+
+        # keyset order: the id breaks ties between transactions on the same date
+        query += f" ORDER BY transaction_date DESC, {TRANSACTIONS_ID_COLUMN} DESC LIMIT %s;"
+        params.append(int_limit + 1)
+
+        results = []
+        with mysql_pool.connection() as conn:
+            cursor = conn.cursor(dictionary=True, buffered=False)
+            cursor.execute(query, tuple(params))
+            for row in iter_rows(cursor, TRANSACTIONS_FETCH_BATCH):
+                results.append(row)
+
+        next_page_token = None
+        if len(results) > int_limit:
+            results = results[:int_limit]
+            last = results[-1]
+            next_page_token = _encode_continuation_token(last['transaction_date'], last[TRANSACTIONS_ID_COLUMN])
+
+        return {
+            "client_id": client_id,
+            "transactions": results,
+            "returned": len(results),
+            "next_page_token": next_page_token
+        }
     except ConnectionError as conn_err:
         return json.dumps({"error": str(conn_err), "message": "Database connection failed."})
     except Exception as e:
         return json.dumps({"error": str(e), "message": f"Failed to retrieve transactions for client {client_id}. Error: {e}"})
-    finally:
-        if conn:
-            conn.close()
 
 @mcp_server.tool()
+@traced_tool
+@tool_cache.cached
+@mysql_backend.offload
+@result_encoder.encoded
 def get_stock_holders_for_stock(stock_symbol: str) -> str:
     """
-    Identifies which clients hold a specific stock based on their transaction data (buy transactions).
-    Aggregates the total quantity bought by each client for the given stock.
+    Identifies which clients currently hold a specific stock, with each client's net quantity
+    (bought minus sold), largest holders first.
     """
-    conn = None
     try:
-        conn = _get_mysql_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        query = """
-        SELECT client_id, stock_symbol, SUM(quantity) AS total_quantity
-        FROM transactions
-        WHERE transaction_type = 'buy' AND LOWER(stock_symbol) = LOWER(%s)
-        GROUP BY client_id, stock_symbol
-        ORDER BY total_quantity DESC;
-        """
-        cursor.execute(query, (stock_symbol,))
-        results = cursor.fetchall()
-        return json.dumps(results, indent=2)
+        with mysql_pool.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            if holdings_refresher.available:
+                holdings_refresher.refresh_if_due(conn)
+                cursor.execute(HOLDERS_QUERY, (normalize_symbol(stock_symbol),))
+            else:
+                cursor.execute(LEGACY_HOLDERS_QUERY, (stock_symbol,))
+            results = cursor.fetchall()
+
+        return results
     except ConnectionError as conn_err:
         return json.dumps({"error": str(conn_err), "message": "Database connection failed."})
     except Exception as e:
         return json.dumps({"error": str(e), "message": f"Failed to get holders for stock {stock_symbol}. Error: {e}"})
-    finally:
-        if conn:
-            conn.close()
+
+@mcp_server.tool()
+def get_mysql_server_stats() -> str:
+    """
+    Operational statistics for the MySQL tool server (connection pool usage).
+    Used by the API's admin endpoints; not offered to the agent.
+    """
+    return json.dumps({
+        "mysql_pool": mysql_pool.stats(),
+        "mongo_client": mongo_client.stats(),
+        "tool_backend": mysql_backend.stats(),
+        "tool_cache": tool_cache.stats(),
+        "result_store": result_store.stats(),
+        "leaderboards": leaderboard_refresher.stats(),
+    })
+
+@mcp_server.tool()
+def get_mysql_metrics() -> str:
+    """
+    This server's metrics registry (span latency histograms and counters), which the API
+    merges into its /metrics endpoint. Not offered to the agent.
+    """
+    return json.dumps(metrics.snapshot())
+
+@mcp_server.tool()
+def clear_mysql_tool_cache(tool_name: str = None) -> str:
+    """
+    Invalidates cached MySQL tool results, for one tool or for all of them.
+    Used by the API's admin endpoints; not offered to the agent.
+    """
+    return json.dumps({"cleared": tool_cache.clear(tool_name)})
+
+@mcp_server.tool()
+def fetch_mysql_result_page(handle: str, offset: float = 0.0, limit: float = 500.0) -> str:
+    """
+    Returns one page of rows from a large MySQL tool result stored under `handle`.
+    Used by the API's /results endpoint; not offered to the agent.
+    """
+    page = result_store.page(handle, max(0, int(offset)), max(1, int(limit)))
+    if page is None:
+        return json.dumps({"error": "not_found", "message": f"Result {handle} does not exist or has expired."})
+    return dumps(page)
+
+def startup():
+    """One-time preparation before serving, whether as a subprocess or loaded in-process."""
+    # the MongoDB tool server owns the clients collection's indexes
+    try:
+        with mysql_pool.connection() as conn:
+            holdings_refresher.bootstrap(conn)
+        print("Stock holdings summary ready.")
+    except Exception as e:
+        print(f"WARNING: stock holdings summary unavailable, holder lookups will scan transactions: {e}")
+    if leaderboard_settings["size"] > 0:
+        leaderboard_refresher.start()
 
 if __name__ == "__main__":
-    print(f"Starting {mcp_server.name} MCP Server...")
-    mcp_server.run(transport="stdio")
+    serve(mcp_server, startup)
 
@@ -1,15 +1,27 @@
 import os
+import json
 import asyncio
+import contextvars
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
 from dotenv import load_dotenv
 
 from langchain.agents import AgentExecutor, create_tool_calling_agent
-from langchain_mcp_adapters.client import MultiServerMCPClient
-from mcp.client.stdio import StdioServerParameters
 
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.agents import AgentStep
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.messages import HumanMessage
 
+from admission import llm_rate_limiter_from_env
+from telemetry import metrics, record_span
+from tool_sessions import ToolSchemaCache, create_tool_sessions
+from tool_selector import tool_selector_from_env
+
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
@@ -17,39 +29,276 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if not GOOGLE_API_KEY:
     raise ValueError("GOOGLE_API_KEY environment variable not set.")
 
+# "parallel" dispatches independent tool calls from one model turn concurrently,
+# "sequential" runs them one at a time
+TOOL_EXECUTION_MODE = os.getenv("TOOL_EXECUTION_MODE", "parallel")
+TOOL_FANOUT_LIMIT = int(os.getenv("TOOL_FANOUT_LIMIT", "4"))
+TOOL_CALL_TIMEOUT = float(os.getenv("TOOL_CALL_TIMEOUT", "30"))
+
+# how the agent reaches the tool servers: "stdio" subprocesses, "inprocess" imports, or
+# "http" to standalone tool servers listed in MONGODB_TOOLS_URLS / MYSQL_TOOLS_URLS
+MCP_TRANSPORT = os.getenv("MCP_TRANSPORT", "stdio")
+# tool schemas from the last successful start, so the agent is built without waiting for
+# the tool servers to answer; set to an empty string to always discover schemas live
+TOOL_SCHEMA_CACHE = os.getenv("TOOL_SCHEMA_CACHE", "tool_schema_cache.json")
+# agent executors kept for the tool subsets the selector picks (see tool_selector.py)
+TOOL_SUBSET_CACHE_SIZE = int(os.getenv("TOOL_SUBSET_CACHE_SIZE", "32"))
+
+_step_fanout = contextvars.ContextVar("step_fanout", default=None)
+_shared_tool_results = contextvars.ContextVar("shared_tool_results", default=None)
+
+# one token bucket for every model client in the process (agent and history compaction)
+llm_rate_limiter = llm_rate_limiter_from_env()
+
+# tools the prompt recommends over a chain of narrower calls, and what each answers at once
+COMBINED_TOOLS = [
+    ("get_top_n_portfolios_with_profiles", "for top portfolios with client names"),
+    ("get_transactions_for_relationship_manager", "for an RM's client transactions"),
+]
+BULK_TOOLS = ["get_client_profiles_by_ids", "get_portfolio_values_for_ids", "get_client_transactions_for_ids"]
+
+LLM_TOKENS = metrics.counter("nlcp_llm_tokens_total", "Tokens reported by the model, by kind.", ("kind",))
+
+
+def create_llm():
+    # imported on first use: the Google client libraries dominate this module's import time
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.0, rate_limiter=llm_rate_limiter)
+
+
+class TokenUsageHandler(BaseCallbackHandler):
+    """
+    Collects the token usage Gemini reports for every LLM call in one agent run, and
+    counts the tool calls the run made. Each LLM call is also recorded as an "llm" span
+    of the request, with its token counts.
+    Pass a fresh instance per request via `config={"callbacks": [handler]}`.
+    """
+
+    # run in the caller's task rather than a thread pool, so span timings are not skewed
+    run_inline = True
+
+    def __init__(self):
+        self.llm_calls = 0
+        self.tool_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        # set when the run is offered a subset of the tools: schema tokens left out of each call
+        self.tools_offered = None
+        self.tokens_saved_per_call = 0
+        self._llm_started = {}
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self.tool_calls += 1
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._llm_started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id=None, **kwargs):
+        self.llm_calls += 1
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    prompt_tokens += usage.get("input_tokens", 0)
+                    completion_tokens += usage.get("output_tokens", 0)
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        LLM_TOKENS.inc(prompt_tokens, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, kind="completion")
+        LLM_TOKENS.inc(self.tokens_saved_per_call, kind="prompt_saved")
+        started = self._llm_started.pop(run_id, None)
+        if started is not None:
+            record_span("llm", time.perf_counter() - started, started=started,
+                        prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def on_llm_error(self, error, *, run_id=None, **kwargs):
+        started = self._llm_started.pop(run_id, None)
+        if started is not None:
+            record_span("llm", time.perf_counter() - started, started=started, error=type(error).__name__)
+
+    def summary(self):
+        return {
+            "llm_calls": self.llm_calls,
+            "tool_calls": self.tool_calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "tools_offered": self.tools_offered,
+            "prompt_tokens_saved": self.tokens_saved_per_call * self.llm_calls,
+        }
+
+
+class SharedToolResults:
+    """
+    Tool results shared by the agent runs of one batch: a call with the same tool and
+    arguments made by several runs executes once and every run gets its observation.
+    Failed calls are not kept, so a later run tries again.
+    """
+
+    def __init__(self):
+        self._steps = {}
+        self.calls = 0
+        self.reused = 0
+
+    def activate(self):
+        """Makes agent runs started from the current task share these results."""
+        _shared_tool_results.set(self)
+
+    async def run(self, agent_action, perform):
+        key = (agent_action.tool, json.dumps(agent_action.tool_input, sort_keys=True, default=str))
+        step = self._steps.get(key)
+        if step is None:
+            self.calls += 1
+            # a task of its own: a run cancelled at its deadline must not cancel the others' wait
+            step = self._steps[key] = asyncio.ensure_future(perform())
+            step.add_done_callback(lambda done: self._forget_failed(key, done))
+        else:
+            self.reused += 1
+        result = await asyncio.shield(step)
+        return AgentStep(action=agent_action, observation=result.observation)
+
+    def _forget_failed(self, key, done):
+        if done.cancelled() or done.exception() is not None or str(done.result().observation).startswith('{"error"'):
+            self._steps.pop(key, None)
+
+    def stats(self):
+        return {"tool_calls": self.calls, "tool_calls_reused": self.reused}
+
+
+class BoundedToolAgentExecutor(AgentExecutor):
+    """
+    AgentExecutor with bounds on a model turn's tool calls. The base class already gathers
+    them concurrently and returns observations in the order the calls were emitted; this
+    adds a per-step cap of `tool_fanout_limit` calls in flight and a per-call timeout.
+    """
+
+    tool_fanout_limit: int = 4
+    tool_call_timeout: Optional[float] = 30.0
+
+    async def _aiter_next_step(self, name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager=None):
+        # a fresh semaphore per step, inherited by the tasks the base class gathers
+        _step_fanout.set(asyncio.Semaphore(self.tool_fanout_limit))
+        async for step in super()._aiter_next_step(
+            name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager
+        ):
+            yield step
+
+    async def _aperform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None):
+        shared = _shared_tool_results.get()
+        if shared is not None:
+            return await shared.run(agent_action, lambda: self._aperform_limited(
+                name_to_tool_map, color_mapping, agent_action, run_manager
+            ))
+        return await self._aperform_limited(name_to_tool_map, color_mapping, agent_action, run_manager)
+
+    async def _aperform_limited(self, name_to_tool_map, color_mapping, agent_action, run_manager=None):
+        semaphore = _step_fanout.get() or asyncio.Semaphore(self.tool_fanout_limit)
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(
+                    super()._aperform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager),
+                    timeout=self.tool_call_timeout,
+                )
+            except asyncio.TimeoutError:
+                logger.warning("Tool call %s timed out after %ss.", agent_action.tool, self.tool_call_timeout)
+                return AgentStep(
+                    action=agent_action,
+                    observation=json.dumps({
+                        "error": "timeout",
+                        "message": f"Tool '{agent_action.tool}' did not respond within {self.tool_call_timeout} seconds."
+                    }),
+                )
+
+
+def tool_guidance(tool_names):
+    """The system prompt's advice on keeping tool calls few, naming only tools in `tool_names`."""
+    offered = set(tool_names)
+    lines = []
+    combined = [f"`{name}` {use}" for name, use in COMBINED_TOOLS if name in offered]
+    if combined:
+        lines.append(f"- Prefer a combined tool when you have one that answers the whole question, e.g. {', or '.join(combined)}.")
+    bulk = [f"`{name}`" for name in BULK_TOOLS if name in offered]
+    if bulk:
+        listed = " or ".join([", ".join(bulk[:-1]), bulk[-1]] if len(bulk) > 1 else bulk)
+        lines.append(f"- When you need details for several clients, make ONE bulk call with all their IDs: {listed}.")
+        if "get_client_profiles_by_ids" in offered and "get_client_profile_by_id" in offered:
+            lines.append("  Only use `get_client_profile_by_id` when a single client is involved.")
+    lines.append("- Tool calls that do not depend on each other can be issued together in the same turn.")
+    return "\n            ".join(lines)
+
+
+class ToolSubsetAgents:
+    """
+    The agent executor to run for each question: one offering only the tools `selector`
+    picks for it, built on first use by `build(tools)` and kept (least recently used
+    first out) for later questions that pick the same subset. `full` offers every tool.
+    """
+
+    def __init__(self, full, build, selector, max_entries=32):
+        self.full = full
+        self.selector = selector
+        self.max_entries = max_entries
+        self._build = build
+        self._tools = {tool_obj.name: tool_obj for tool_obj in full.tools}
+        self._executors = OrderedDict()
+        self._stats = {"selections": 0, "full": 0, "built": 0, "reused": 0, "tools_offered": 0}
+
+    def for_question(self, question, chat_history=(), usage=None):
+        """Returns the executor for `question`, recording the tools offered on `usage`."""
+        if self.selector is None:
+            return self.full
+        previous = next((message.content for message in reversed(chat_history) if isinstance(message, HumanMessage)), None)
+        names = self.selector.select(question, previous if isinstance(previous, str) else None)
+        self._stats["selections"] += 1
+        self._stats["tools_offered"] += len(names)
+        if usage is not None:
+            usage.tools_offered = len(names)
+            usage.tokens_saved_per_call = self.selector.tokens_saved(names)
+        if len(names) == len(self._tools):
+            self._stats["full"] += 1
+            return self.full
+
+        key = tuple(names)
+        executor = self._executors.get(key)
+        if executor is None:
+            executor = self._executors[key] = self._build([self._tools[name] for name in names])
+            self._stats["built"] += 1
+            while len(self._executors) > self.max_entries:
+                self._executors.popitem(last=False)
+        else:
+            self._executors.move_to_end(key)
+            self._stats["reused"] += 1
+        return executor
+
+    def stats(self):
+        selections = self._stats["selections"]
+        return dict(
+            self._stats,
+            enabled=self.selector is not None,
+            cached_subsets=len(self._executors),
+            total_tools=len(self._tools),
+            avg_tools_offered=round(self._stats["tools_offered"] / selections, 2) if selections else None,
+        )
+
+
 async def initialize_rag_agent_with_mcp():
     """
     Initializes and returns a LangChain AgentExecutor configured with
     Google Gemini and tools loaded from MCP Servers.
     """
-    # 1. initialize llm (gemini)
-    llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.0)
-    
-    print("Connecting to MCP servers and loading tools...")
-
-    #2
-    mcp_client = MultiServerMCPClient(
-        {
-            "mongodb": {
-                "transport": "stdio",
-                "command": "python",
-                "args": ["mongodb_tools.py"],
-                "env": os.environ.copy() 
-            },
-            "mysql": {
-                "transport": "stdio",
-                "command": "python",
-                "args": ["mysql_tools.py"],
-                "env": os.environ.copy() 
-            }
-        }
-    )
-    
+    print(f"Connecting to MCP servers ({MCP_TRANSPORT}) and loading tools...")
+
+    # 1. tool sessions first: with cached schemas the servers keep starting while the rest is built
+    schema_cache = ToolSchemaCache(TOOL_SCHEMA_CACHE) if TOOL_SCHEMA_CACHE else None
+    mcp_client = create_tool_sessions(MCP_TRANSPORT, schema_cache=schema_cache)
 
-    # 3. load tools from mcp clients
+    # 2. load tools from mcp clients
     tools = await mcp_client.get_tools() 
     print(f"Successfully loaded {len(tools)} tools from MCP servers.")
 
+    # 3. initialize llm (gemini)
+    llm = create_llm()
+
     # print tool names
     for tool_obj in tools:
         print(f"- {tool_obj.name}")
@@ -65,10 +314,18 @@ async def initialize_rag_agent_with_mcp():
 
             When a user asks a question, determine which tool(s) are necessary.
             If a query requires information from one database (e.g., MySQL) and then details from another (e.g., MongoDB),
-            you MUST perform the database lookups sequentially. For example, if you get a client_id from a MySQL query,
-            you can then use a MongoDB tool like `get_client_profile_by_id` to retrieve their name or other profile details.
+            you MUST perform the database lookups sequentially. For example, if you get client_ids from a MySQL query,
+            you can then use a MongoDB tool to retrieve their names or other profile details.
             Carefully consider the arguments required by each tool and extract them precisely from the user's query or from the output of a previous tool.
-            If you need a client's profile by their ID, use `get_client_profile_by_id`.
+
+            Minimize the number of tool calls:
+            {tool_guidance}
+
+            Lists of records may come back in columnar form, {{"columns": [...], "rows": [[...], ...]}}, where each
+            row holds the values for the columns in order. When a result carries "omitted_rows", only part of the data
+            was returned; say so, and narrow the query (a lower limit or a date range) if the missing rows matter.
+            A result with a "result_handle" is too large to show in full: answer from its row count, aggregates
+            and preview, and tell the user the complete data can be downloaded from /results/<result_handle>.
 
             Always try to provide a concise and helpful answer based on the tool outputs.
             If a tool returns no data or an error, inform the user clearly.
@@ -80,15 +337,22 @@ async def initialize_rag_agent_with_mcp():
         ]
     )
 
-    #5 creating the langchain agent
-    agent = create_tool_calling_agent(llm, tools, prompt)
+    #5 creating the langchain agent and its executor, for all tools or a subset; the prompt
+    # only names tools the executor offers
+    def build_executor(agent_tools):
+        agent_prompt = prompt.partial(tool_guidance=tool_guidance(tool_obj.name for tool_obj in agent_tools))
+        return BoundedToolAgentExecutor(
+            agent=create_tool_calling_agent(llm, agent_tools, agent_prompt),
+            tools=agent_tools,
+            verbose=True, 
+            handle_parsing_errors=True,
+            tool_fanout_limit=1 if TOOL_EXECUTION_MODE == "sequential" else TOOL_FANOUT_LIMIT,
+            tool_call_timeout=TOOL_CALL_TIMEOUT or None
+        )
 
-    #6 agent executor
-    agent_executor = AgentExecutor(
-        agent=agent,
-        tools=tools,
-        verbose=True, 
-        handle_parsing_errors=True
-    )
+    agent_executor = build_executor(tools)
+
+    #6 per-question tool subsets, to keep unrelated tool schemas out of the prompt
+    tool_agents = ToolSubsetAgents(agent_executor, build_executor, tool_selector_from_env(tools), TOOL_SUBSET_CACHE_SIZE)
 
-    return agent_executor, mcp_client 
+    return agent_executor, tool_agents, mcp_client 
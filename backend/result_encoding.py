@@ -0,0 +1,189 @@
+import functools
+import json
+import os
+from datetime import date, datetime, time
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder is used when it is not installed
+    orjson = None
+
+from result_store import summarize_rows
+
+
+CHARS_PER_TOKEN = 4
+COLUMNAR_MIN_ROWS = 3
+MAX_TRIM_PASSES = 8
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    # ObjectId, timedelta (MySQL TIME columns) and anything else the drivers hand back
+    return str(value)
+
+
+def dumps(data):
+    """Compact JSON: no indentation or separator padding, Decimal and dates converted on the fly."""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(data, default=_default, separators=(",", ":"), ensure_ascii=False)
+
+
+def to_columnar(rows):
+    """A list of dicts as {"columns": [...], "rows": [[...], ...]}, so each key is sent once."""
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    return {"columns": columns, "rows": [[row.get(column) for column in columns] for row in rows]}
+
+
+def _row_lists(data):
+    if isinstance(data, list):
+        if data:
+            yield None, data
+    elif isinstance(data, dict):
+        for key, value in data.items():
+            if isinstance(value, list) and value:
+                yield key, value
+
+
+class ResultEncoder:
+    """
+    Serializes tool results for the model's context. Lists of records are sent in columnar
+    form. When a result is over the tool's token budget its longest row list is parked in
+    `store` (if given) and replaced by a summary with a result handle; whatever is still
+    over budget has its row lists cut down (keeping the head, or an evenly spaced sample)
+    with a note of how many rows were omitted.
+    """
+
+    def __init__(self, budgets=None, default_budget=4000, columnar=True, overflow="head", store=None, preview_rows=5):
+        if overflow not in ("head", "sample"):
+            raise ValueError("overflow must be 'head' or 'sample'.")
+        self.budgets = budgets or {}
+        self.default_budget = default_budget
+        self.columnar = columnar
+        self.overflow = overflow
+        self.store = store
+        self.preview_rows = preview_rows
+
+    def budget_for(self, tool_name):
+        return self.budgets.get(tool_name, self.default_budget)
+
+    def encode(self, data, tool_name=None):
+        # tools still return pre-encoded strings for errors and plain messages
+        if isinstance(data, str):
+            return data
+        text = dumps(self._shape(data, {}))
+        budget_chars = self.budget_for(tool_name) * CHARS_PER_TOKEN
+        if budget_chars <= 0 or len(text) <= budget_chars:
+            return text
+
+        if self.store is not None:
+            data = self._park_longest_rows(data)
+            text = dumps(self._shape(data, {}))
+            if len(text) <= budget_chars:
+                return text
+
+        kept = {key: len(rows) for key, rows in _row_lists(data)}
+        for _ in range(MAX_TRIM_PASSES):
+            if not kept:
+                break
+            key = max(kept, key=kept.get)
+            if kept[key] == 0:
+                break
+            # shrink the longest list in proportion to how far over budget the result is
+            kept[key] = max(0, min(kept[key] - 1, int(kept[key] * budget_chars / len(text) * 0.95)))
+            text = dumps(self._shape(data, kept))
+            if len(text) <= budget_chars:
+                break
+        return text
+
+    def _park_longest_rows(self, data):
+        row_lists = list(_row_lists(data))
+        if not row_lists:
+            return data
+        key, rows = max(row_lists, key=lambda item: len(item[1]))
+        handle = self.store.put(rows, len(dumps(rows)))
+        if handle is None:
+            return data
+        summary = dict(
+            summarize_rows(rows),
+            result_handle=handle,
+            preview=self._rows(rows[:self.preview_rows]),
+            note=f"Showing {min(len(rows), self.preview_rows)} of {len(rows)} rows; "
+                 f"the full result can be downloaded from /results/{handle}",
+        )
+        if key is None:
+            return summary
+        return dict(data, **{key: summary})
+
+    def encoded(self, fn):
+        """Decorates a tool so whatever it returns is encoded under that tool's budget."""
+        tool_name = fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return self.encode(fn(*args, **kwargs), tool_name)
+
+        return wrapper
+
+    def _take(self, rows, keep):
+        if keep is None or keep >= len(rows):
+            return rows, 0
+        if self.overflow == "sample" and keep:
+            step = len(rows) / keep
+            return [rows[int(i * step)] for i in range(keep)], len(rows) - keep
+        return rows[:keep], len(rows) - keep
+
+    def _rows(self, rows):
+        if self.columnar and len(rows) >= COLUMNAR_MIN_ROWS and all(isinstance(row, dict) for row in rows):
+            return to_columnar(rows)
+        return rows
+
+    def _shape(self, data, kept):
+        if isinstance(data, list):
+            rows, omitted = self._take(data, kept.get(None))
+            shaped = self._rows(rows)
+            if not omitted:
+                return shaped
+            if not isinstance(shaped, dict):
+                shaped = {"items": shaped}
+            return dict(shaped, omitted_rows=omitted, note=f"{omitted} more rows omitted")
+
+        if isinstance(data, dict):
+            shaped, omitted = {}, {}
+            for key, value in data.items():
+                if isinstance(value, list):
+                    rows, count = self._take(value, kept.get(key))
+                    shaped[key] = self._rows(rows)
+                    if count:
+                        omitted[key] = count
+                else:
+                    shaped[key] = value
+            if omitted:
+                shaped["omitted_rows"] = omitted
+                shaped["note"] = "; ".join(f"{count} more rows omitted from {key}" for key, count in omitted.items())
+            return shaped
+
+        return data
+
+
+def result_encoder_from_env(default_budgets=None, store=None):
+    """
+    Token budgets per tool: the server's defaults, overridden by the TOOL_RESULT_TOKEN_BUDGETS
+    JSON object (e.g. '{"get_top_n_portfolios": 1500}'). A budget of 0 disables truncation.
+    """
+    budgets = dict(default_budgets or {})
+    overrides = os.getenv("TOOL_RESULT_TOKEN_BUDGETS")
+    if overrides:
+        budgets.update({name: int(budget) for name, budget in json.loads(overrides).items()})
+    return ResultEncoder(
+        budgets,
+        default_budget=int(os.getenv("TOOL_RESULT_TOKEN_BUDGET", "4000")),
+        columnar=os.getenv("TOOL_RESULT_FORMAT", "columnar").lower() == "columnar",
+        overflow=os.getenv("TOOL_RESULT_OVERFLOW", "head").lower(),
+        store=store,
+        preview_rows=int(os.getenv("RESULT_PREVIEW_ROWS", "5")),
+    )
@@ -0,0 +1,122 @@
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+
+
+def _aggregate(values):
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    if all(isinstance(value, (int, float, Decimal)) and not isinstance(value, bool) for value in values):
+        # Decimal does not add to float, so a column mixing them is summed as floats
+        if any(isinstance(value, float) for value in values):
+            values = [float(value) for value in values]
+        return {"sum": sum(values), "min": min(values), "max": max(values)}
+    if all(isinstance(value, date) for value in values):
+        # a date does not compare with a datetime, so a column mixing them is compared as
+        # datetimes (a date as its midnight); naive and aware datetimes cannot be ordered
+        if any(isinstance(value, datetime) for value in values):
+            values = [value if isinstance(value, datetime) else datetime(value.year, value.month, value.day)
+                      for value in values]
+            if len({value.tzinfo is None for value in values}) > 1:
+                return None
+        return {"min": min(values), "max": max(values)}
+    return None
+
+
+def summarize_rows(rows):
+    """Row count, column names and per-column aggregates (sum/min/max of numbers, range of dates)."""
+    summary = {"row_count": len(rows)}
+    if rows and all(isinstance(row, dict) for row in rows):
+        columns = list(dict.fromkeys(key for row in rows for key in row))
+        summary["columns"] = columns
+        aggregates = {}
+        for column in columns:
+            aggregate = _aggregate([row.get(column) for row in rows])
+            if aggregate:
+                aggregates[column] = aggregate
+        if aggregates:
+            summary["aggregates"] = aggregates
+    return summary
+
+
+class ResultStore:
+    """
+    Keeps large tool results in the tool server's memory under an opaque handle, so the
+    model only sees a summary while the API can still page through the full rows.
+    Entries expire after `ttl` seconds; the oldest are evicted to stay under `max_bytes`.
+    """
+
+    def __init__(self, prefix, ttl=900.0, max_bytes=64 * 1024 * 1024, clock=time.monotonic):
+        self.prefix = prefix
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._entries = OrderedDict()  # handle -> (expires_at, rows, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"stored": 0, "rejected": 0, "evictions": 0, "expirations": 0, "pages_served": 0}
+
+    def put(self, rows, size):
+        """Stores `rows` (`size` is their encoded size in bytes) and returns the handle, or None if they do not fit."""
+        if self.ttl <= 0 or size > self.max_bytes:
+            with self._lock:
+                self._stats["rejected"] += 1
+            return None
+        handle = f"{self.prefix}-{secrets.token_urlsafe(12)}"
+        with self._lock:
+            self._purge_expired()
+            while self._entries and self._bytes + size > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats["evictions"] += 1
+            self._entries[handle] = (self._clock() + self.ttl, rows, size)
+            self._bytes += size
+            self._stats["stored"] += 1
+        return handle
+
+    def page(self, handle, offset=0, limit=500):
+        """One page of a stored result, or None when the handle is unknown or has expired."""
+        with self._lock:
+            self._purge_expired()
+            entry = self._entries.get(handle)
+            if entry is None:
+                return None
+            self._stats["pages_served"] += 1
+        rows = entry[1]
+        page = rows[offset:offset + limit]
+        next_offset = offset + len(page)
+        return {
+            "handle": handle,
+            "row_count": len(rows),
+            "offset": offset,
+            "rows": page,
+            "next_offset": next_offset if next_offset < len(rows) else None,
+        }
+
+    def _purge_expired(self):
+        now = self._clock()
+        # entries are stored in insertion order with a shared TTL, so expired ones lead
+        while self._entries:
+            handle, (expires_at, _, size) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[handle]
+            self._bytes -= size
+            self._stats["expirations"] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, handles=len(self._entries), bytes=self._bytes, max_bytes=self.max_bytes)
+
+
+def result_store_from_env(prefix):
+    return ResultStore(
+        prefix,
+        ttl=float(os.getenv("RESULT_STORE_TTL", "900")),
+        max_bytes=int(float(os.getenv("RESULT_STORE_MAX_MB", "64")) * 1024 * 1024),
+    )
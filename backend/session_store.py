@@ -0,0 +1,225 @@
+import asyncio
+import re
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+
+# how an answer points at a large tool result kept server-side (see result_encoding)
+RESULT_HANDLE_PATTERN = re.compile(r'(?:/results/|"result_handle":\s*")([A-Za-z0-9_-]+)')
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token), good enough for budgeting history."""
+    return max(1, len(text) // 4) if text else 0
+
+
+class ConversationSession:
+    """
+    One conversation: a rolling summary of older turns plus the most recent turns verbatim.
+    Turns are (type, content) pairs where type is "human" or "ai". `result_handles` are the
+    large results its answers pointed at, which only this session may download.
+    """
+
+    def __init__(self, session_id, turns=None, summary="", result_handles=None):
+        self.session_id = session_id
+        self.turns = list(turns or [])
+        self.summary = summary
+        self.result_handles = set(result_handles or ())
+
+    def add_exchange(self, user_message, agent_output):
+        self.turns.append(("human", user_message))
+        self.turns.append(("ai", agent_output))
+
+    def history_tokens(self):
+        return estimate_tokens(self.summary) + sum(estimate_tokens(content) for _, content in self.turns)
+
+    def to_messages(self):
+        messages = []
+        if self.summary:
+            messages.append(AIMessage(content=f"Summary of our earlier conversation: {self.summary}"))
+        for msg_type, content in self.turns:
+            messages.append(HumanMessage(content=content) if msg_type == "human" else AIMessage(content=content))
+        return messages
+
+    def to_history_data(self):
+        history = [{"type": "summary", "content": self.summary}] if self.summary else []
+        return history + [{"type": msg_type, "content": content} for msg_type, content in self.turns]
+
+
+class SessionStore:
+    """
+    Storage backend for conversation sessions. Implement get/save/delete to keep
+    sessions somewhere other than process memory (e.g. Redis).
+    """
+
+    def get(self, session_id):
+        raise NotImplementedError
+
+    def save(self, session):
+        raise NotImplementedError
+
+    def delete(self, session_id):
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+
+class InMemorySessionStore(SessionStore):
+    """Keeps sessions in process memory, evicting the least recently used and idle ones."""
+
+    def __init__(self, max_sessions=1000, idle_ttl=3600.0, clock=time.monotonic):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._clock = clock
+        self._sessions = OrderedDict()  # session_id -> (last_used_at, session)
+        self._lock = threading.Lock()
+        self._evictions = 0
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            last_used_at, session = entry
+            if self._clock() - last_used_at > self.idle_ttl:
+                del self._sessions[session_id]
+                self._evictions += 1
+                return None
+            self._sessions[session_id] = (self._clock(), session)
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def save(self, session):
+        with self._lock:
+            self._sessions[session.session_id] = (self._clock(), session)
+            self._sessions.move_to_end(session.session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._evictions += 1
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._sessions), "max_sessions": self.max_sessions, "evictions": self._evictions}
+
+
+class ConversationMemory:
+    """
+    Loads sessions and keeps their prompt footprint flat: once the verbatim turns exceed
+    `token_budget`, the oldest exchanges are folded into the rolling summary. The folding
+    runs in the background after an answer is recorded, so summarizing never delays one.
+    """
+
+    SUMMARY_PROMPT = (
+        "Update the running summary of a conversation between a wealth-management analyst "
+        "and a financial data assistant. Keep client ids, names, figures and open questions. "
+        "Reply with the updated summary only, in at most {max_words} words.\n\n"
+        "Current summary:\n{summary}\n\nNew turns:\n{turns}"
+    )
+
+    def __init__(self, store, llm=None, token_budget=2000, summary_max_words=150):
+        self.store = store
+        self.llm = llm
+        self.token_budget = token_budget
+        self.summary_max_words = summary_max_words
+        # session id -> lock, held while a request or a compaction changes that session
+        self._locks = weakref.WeakValueDictionary()
+        # session id -> its background compaction, at most one per session
+        self._compactions = {}
+
+    def _lock(self, session):
+        lock = self._locks.get(session.session_id)
+        if lock is None:
+            lock = self._locks[session.session_id] = asyncio.Lock()
+        return lock
+
+    def load(self, session_id=None, chat_history_data=None):
+        """
+        Returns the session for `session_id`, or a new one under a fresh server-generated
+        id, seeded from the legacy `chat_history` payload, when the id is missing or
+        unknown. Raises ValueError when `chat_history` is not a list of message objects.
+        """
+        if chat_history_data is None:
+            chat_history_data = []
+        if not isinstance(chat_history_data, list) or not all(
+            isinstance(msg, dict) and isinstance(msg.get("content", ""), str) for msg in chat_history_data
+        ):
+            raise ValueError("'chat_history' must be a list of {\"type\", \"content\"} objects.")
+        session = self.store.get(session_id) if isinstance(session_id, str) and session_id else None
+        if session is None:
+            turns = [
+                (msg.get("type"), msg.get("content", ""))
+                for msg in chat_history_data
+                if msg.get("type") in ("human", "ai")
+            ]
+            session = ConversationSession(uuid.uuid4().hex, turns=turns)
+        return session
+
+    def _turns_to_fold(self, session):
+        """The oldest exchanges that have to leave the verbatim turns for them to fit the budget."""
+        tokens = session.history_tokens()
+        folded = 0
+        while len(session.turns) - folded > 2 and tokens > self.token_budget:
+            tokens -= sum(estimate_tokens(content) for _, content in session.turns[folded:folded + 2])
+            folded += 2
+        return session.turns[:folded]
+
+    async def compact(self, session):
+        """
+        Folds the oldest exchanges into the summary until the turns fit the token budget.
+        The session stays readable while the summary is written: the turns are replaced
+        only once it is ready.
+        """
+        async with self._lock(session):
+            folded = self._turns_to_fold(session)
+            summary = session.summary
+        if not folded:
+            return
+        summary = await self._summarize(summary, folded)
+        async with self._lock(session):
+            # turns are only ever appended meanwhile, so the folded ones are still the oldest
+            del session.turns[:len(folded)]
+            session.summary = summary
+            self.store.save(session)
+
+    def _schedule_compaction(self, session):
+        if session.history_tokens() <= self.token_budget or session.session_id in self._compactions:
+            return
+        task = asyncio.create_task(self.compact(session))
+        self._compactions[session.session_id] = task
+        task.add_done_callback(lambda done: self._compactions.pop(session.session_id, None))
+
+    async def _summarize(self, summary, turns):
+        transcript = "\n".join(f"{msg_type}: {content}" for msg_type, content in turns)
+        if self.llm is not None:
+            prompt = self.SUMMARY_PROMPT.format(
+                max_words=self.summary_max_words, summary=summary or "(none)", turns=transcript
+            )
+            try:
+                response = await self.llm.ainvoke(prompt)
+                return response.content if isinstance(response.content, str) else str(response.content)
+            except Exception as e:
+                print(f"Conversation summarization failed, keeping a truncated transcript instead: {e}")
+        # without a summarizer keep the tail of the transcript within the summary's budget
+        max_chars = self.summary_max_words * 6
+        return f"{summary} {transcript}".strip()[-max_chars:]
+
+    async def record(self, session, user_message, agent_output):
+        async with self._lock(session):
+            session.add_exchange(user_message, agent_output)
+            self.record_results(session, agent_output)
+        # summarizing runs alongside the response instead of ahead of the next request
+        self._schedule_compaction(session)
+
+    def record_results(self, session, agent_output):
+        """Lets `session` download the large results `agent_output` points at."""
+        session.result_handles.update(RESULT_HANDLE_PATTERN.findall(agent_output))
+        self.store.save(session)
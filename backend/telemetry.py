@@ -0,0 +1,391 @@
+"""
+Per-request traces and Prometheus metrics shared by the API and the tool servers.
+
+Every span feeds the `nlcp_span_duration_seconds` histogram, so latency by stage is always
+on /metrics. The spans of one request are kept in memory for the duration of the request
+and written as a single JSON line to stderr only when the request is sampled
+(TRACE_SAMPLE_RATE), slower than TRACE_SLOW_MS, or failed, which keeps the cost to a few
+clock reads and a histogram update per span.
+"""
+import bisect
+import contextvars
+import functools
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    from mcp.server.lowlevel.server import request_ctx
+except ImportError:  # the API can run without the MCP server package
+    request_ctx = None
+
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "5000"))
+MAX_TRACE_SPANS = int(os.getenv("MAX_TRACE_SPANS", "500"))
+
+# carried in the `_meta` of MCP tool calls so a tool server's spans join the API request
+REQUEST_ID_META_KEY = "nlcp_request_id"
+REQUEST_ID_HEADER = "x-request-id"
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Metric:
+    def __init__(self, name, help_text, labelnames):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}  # label values -> value (or histogram state)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key):
+        return dict(zip(self.labelnames, key))
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount=1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help_text, labelnames, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket counts (the last one is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            states = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        samples = []
+        for key, counts, total, count in states:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", dict(labels, le=_format_number(bound)), cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class MetricsRegistry:
+    """The metrics of one process. Asking twice for the same name returns the same metric."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._get(Counter, name, help_text, labelnames)
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._get(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def snapshot(self):
+        """A JSON-serializable copy of every metric, for a tool server to hand to the API."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            "pid": os.getpid(),
+            "families": [
+                {"name": metric.name, "type": metric.type, "help": metric.help,
+                 "samples": [list(sample) for sample in metric.samples()]}
+                for metric in metrics
+            ],
+        }
+
+
+def _format_number(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render(snapshots):
+    """
+    Prometheus text exposition of registry snapshots given as (snapshot, labels) pairs.
+    Families with the same name are merged; the labels tell tool server replicas apart.
+    """
+    merged = {}
+    for snapshot, labels in snapshots:
+        for family in snapshot["families"]:
+            entry = merged.setdefault(family["name"], {"type": family["type"], "help": family["help"], "samples": []})
+            entry["samples"].extend(
+                (name, dict(sample_labels, **labels), value) for name, sample_labels, value in family["samples"]
+            )
+    lines = []
+    for name, family in merged.items():
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for sample_name, labels, value in family["samples"]:
+            label_text = ",".join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+            lines.append(f"{sample_name}{{{label_text}}} {_format_number(value)}" if label_text
+                         else f"{sample_name} {_format_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+SPAN_SECONDS = metrics.histogram(
+    "nlcp_span_duration_seconds", "Duration of traced operations: HTTP handling, LLM, tool and DB calls.", ("span",)
+)
+SPAN_ERRORS = metrics.counter("nlcp_span_errors_total", "Traced operations that failed.", ("span",))
+HTTP_REQUESTS = metrics.counter("nlcp_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+HTTP_SECONDS = metrics.histogram("nlcp_http_request_duration_seconds", "HTTP request latency by route.", ("method", "route"))
+
+
+class Trace:
+    """The spans recorded while handling one request."""
+
+    def __init__(self, request_id):
+        self.request_id = request_id
+        self.sampled = random.random() < TRACE_SAMPLE_RATE
+        self.started = time.perf_counter()
+        self.spans = []
+        self.dropped = 0
+        self._ids = itertools.count(1)
+
+    def next_id(self):
+        return next(self._ids)
+
+    def add(self, span):
+        # list.append is atomic, and tool worker threads add spans too
+        if len(self.spans) < MAX_TRACE_SPANS:
+            self.spans.append(span)
+        else:
+            self.dropped += 1
+
+
+_trace = contextvars.ContextVar("nlcp_trace", default=None)
+_parent_span = contextvars.ContextVar("nlcp_parent_span", default=None)
+
+
+def new_request_id():
+    return uuid.uuid4().hex[:16]
+
+
+def current_request_id():
+    trace = _trace.get()
+    return trace.request_id if trace else None
+
+
+def record_span(name, duration, started=None, error=None, **attributes):
+    """Records an operation timed elsewhere (callbacks, driver events) under the current request."""
+    SPAN_SECONDS.observe(duration, span=name)
+    if error:
+        SPAN_ERRORS.inc(span=name)
+    trace = _trace.get()
+    if trace is not None:
+        if started is None:
+            started = time.perf_counter() - duration
+        trace.add(_span_record(trace, trace.next_id(), _parent_span.get(), name, started, duration, error, attributes))
+
+
+def _span_record(trace, span_id, parent, name, started, duration, error, attributes):
+    record = {"id": span_id, "parent": parent, "name": name,
+              "start_ms": round((started - trace.started) * 1000, 3), "duration_ms": round(duration * 1000, 3)}
+    if error:
+        record["error"] = error
+    if attributes:
+        record["attributes"] = attributes
+    return record
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Times the block as a span of the current request. Yields the span's attributes, which
+    the block may add to; setting "error" marks the span failed.
+    """
+    trace = _trace.get()
+    span_id = trace.next_id() if trace is not None else None
+    parent = _parent_span.get()
+    token = _parent_span.set(span_id) if trace is not None else None
+    started = time.perf_counter()
+    error = None
+    try:
+        yield attributes
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        if token is not None:
+            _parent_span.reset(token)
+        error = error or attributes.pop("error", None)
+        SPAN_SECONDS.observe(duration, span=name)
+        if error:
+            SPAN_ERRORS.inc(span=name)
+        if trace is not None:
+            trace.add(_span_record(trace, span_id, parent, name, started, duration, error, attributes))
+
+
+@contextmanager
+def request_trace(name, request_id=None, **attributes):
+    """
+    A root span with a trace of its own, written out if sampled, slow or failed. Inside a
+    request that is already traced (tools running in the API process) it is a plain span.
+    """
+    if _trace.get() is not None:
+        with span(name, **attributes) as span_attributes:
+            yield span_attributes
+        return
+
+    trace = Trace(request_id or new_request_id())
+    token = _trace.set(trace)
+    failed = False
+    try:
+        with span(name, **attributes) as span_attributes:
+            yield span_attributes
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        _trace.reset(token)
+        duration_ms = (time.perf_counter() - trace.started) * 1000
+        failed = failed or any("error" in record for record in trace.spans)
+        if trace.sampled or failed or duration_ms >= TRACE_SLOW_MS:
+            _write_trace(trace, duration_ms)
+
+
+def _write_trace(trace, duration_ms):
+    record = {"trace": trace.request_id, "pid": os.getpid(), "duration_ms": round(duration_ms, 3), "spans": trace.spans}
+    if trace.dropped:
+        record["dropped_spans"] = trace.dropped
+    # stderr: a stdio tool server's stdout carries the JSON-RPC stream
+    print(json.dumps(record, default=str), file=sys.stderr)
+
+
+def mcp_request_id():
+    """The API request id sent in the `_meta` of the MCP tool call being served, if any."""
+    if request_ctx is None:
+        return None
+    try:
+        meta = request_ctx.get().meta
+    except LookupError:
+        return None
+    return getattr(meta, REQUEST_ID_META_KEY, None) if meta is not None else None
+
+
+def traced_tool(fn):
+    """Decorates an async tool so each call is a span, joined to the API request that made it."""
+    span_name = f"tool.{fn.__name__}"
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        with request_trace(span_name, request_id=mcp_request_id()) as attributes:
+            result = await fn(*args, **kwargs)
+            # tool errors are returned as JSON objects whose first key is "error"
+            if isinstance(result, str) and result.startswith('{"error"'):
+                attributes["error"] = "tool_error"
+            return result
+
+    return wrapper
+
+
+class RequestTracingMiddleware:
+    """
+    ASGI middleware running each HTTP request in a trace. The request id is taken from the
+    X-Request-Id header (or generated) and echoed back; counts and latency by route template
+    go to /metrics.
+    """
+
+    def __init__(self, app, skip_paths=("/metrics", "/healthz")):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for header, value in scope.get("headers", ()):
+            if header == REQUEST_ID_HEADER.encode():
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or new_request_id()
+        status = {"code": 500}
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message = dict(message, headers=list(message.get("headers", [])) + [
+                    (REQUEST_ID_HEADER.encode(), request_id.encode("latin-1"))
+                ])
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            with request_trace("http", request_id=request_id, method=scope["method"], path=scope["path"]) as attributes:
+                await self.app(scope, receive, send_with_request_id)
+                attributes["status"] = status["code"]
+                if status["code"] >= 500:
+                    attributes["error"] = f"HTTP {status['code']}"
+        finally:
+            # the route template, not the raw path, so /results/{handle} stays one series
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUESTS.inc(method=scope["method"], route=route, status=status["code"])
+            HTTP_SECONDS.observe(time.perf_counter() - started, method=scope["method"], route=route)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the backend modules are imported flat, the way the servers run them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
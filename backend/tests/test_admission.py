@@ -0,0 +1,82 @@
+"""
+AdmissionController hands a released slot straight to the next waiter and turns requests
+away when its queue is full or a wait runs out; TokenBucket fails LLM calls fast when the
+wait for a token would exceed `max_wait`.
+"""
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, RequestRejected, TokenBucket
+
+
+def test_released_slot_is_handed_to_the_next_waiter():
+    async def run():
+        admission = AdmissionController(max_in_flight=1, max_queue=4, queue_timeout=5)
+        await admission.acquire()
+        gone = asyncio.ensure_future(admission.acquire())
+        waiting = asyncio.ensure_future(admission.acquire())
+        await asyncio.sleep(0)
+        gone.cancel()
+        await asyncio.gather(gone, return_exceptions=True)
+
+        admission.release()
+        await asyncio.wait_for(waiting, 1)
+        handed_over = admission.stats()
+        admission.release()
+        return handed_over, admission.stats()
+
+    handed_over, released = asyncio.run(run())
+    # the slot skipped the cancelled waiter and never went back to the pool in between
+    assert (handed_over["in_flight"], handed_over["queue_depth"], handed_over["admitted"]) == (1, 0, 2)
+    assert released["in_flight"] == 0
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def run():
+        admission = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=5)
+        await admission.acquire()
+        waiting = asyncio.ensure_future(admission.acquire())
+        await asyncio.sleep(0)
+        try:
+            with pytest.raises(RequestRejected) as rejected:
+                await admission.acquire()
+        finally:
+            waiting.cancel()
+            await asyncio.gather(waiting, return_exceptions=True)
+        return rejected.value, admission.stats()
+
+    rejection, stats = asyncio.run(run())
+    assert (rejection.status_code, rejection.reason) == (429, "queue_full")
+    # one run ahead and one waiting, at the default 5s estimate per run
+    assert rejection.retry_after == 10
+    assert stats["rejected_queue_full"] == 1
+
+
+def test_queue_timeout_is_rejected():
+    async def run():
+        admission = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.05)
+        await admission.acquire()
+        with pytest.raises(RequestRejected) as rejected:
+            await admission.acquire()
+        return rejected.value, admission.stats()
+
+    rejection, stats = asyncio.run(run())
+    assert (rejection.status_code, rejection.reason) == (503, "queue_timeout")
+    assert (stats["in_flight"], stats["queue_depth"], stats["rejected_queue_timeout"]) == (1, 0, 1)
+
+
+def test_token_bucket_rejects_waits_beyond_max_wait():
+    # a frozen clock: no tokens come back while the test runs
+    bucket = TokenBucket(rate=20, burst=1, max_wait=0.1, clock=lambda: 0.0)
+
+    async def run():
+        # the burst, then two reservations queued 50ms and 100ms out
+        assert [await bucket.aacquire() for _ in range(3)] == [True, True, True]
+        with pytest.raises(RequestRejected) as rejected:
+            await bucket.aacquire()
+        return rejected.value
+
+    rejection = asyncio.run(run())
+    assert (rejection.status_code, rejection.reason, rejection.retry_after) == (429, "llm_rate_limited", 1)
+    assert bucket.acquire(blocking=False) is False
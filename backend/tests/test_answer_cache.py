@@ -0,0 +1,73 @@
+"""
+Identical concurrent questions share one agent run, a caller that goes away does not
+cancel the run the others wait on, and bypassing the cache still refreshes it.
+"""
+import asyncio
+
+import pytest
+
+from answer_cache import AnswerCache, SingleFlight, answer_cache_key
+
+
+class Agent:
+    """Stands in for the agent run: counts runs and blocks until released."""
+
+    def __init__(self):
+        self.runs = 0
+        self.release = asyncio.Event()
+
+    async def answer(self):
+        self.runs += 1
+        await self.release.wait()
+        return f"answer {self.runs}"
+
+
+def test_identical_questions_are_coalesced():
+    async def run():
+        cache = AnswerCache(ttl=60)
+        agent = Agent()
+        key = answer_cache_key("Top  clients?", [])
+        requests = [asyncio.ensure_future(cache.get_or_run(key, agent.answer)) for _ in range(3)]
+        await asyncio.sleep(0)
+        agent.release.set()
+        first = await asyncio.gather(*requests)
+        later = await cache.get_or_run(answer_cache_key("top clients?", []), agent.answer)
+        return agent.runs, first, later, cache.stats()
+
+    runs, first, later, stats = asyncio.run(run())
+    assert runs == 1
+    assert first == [("answer 1", "MISS"), ("answer 1", "COALESCED"), ("answer 1", "COALESCED")]
+    assert later == ("answer 1", "HIT")
+    assert stats["coalescing"] == {"leaders": 1, "coalesced": 2, "in_flight": 0}
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_run():
+    async def run():
+        single_flight = SingleFlight()
+        agent = Agent()
+        leader = asyncio.ensure_future(single_flight.run("key", agent.answer))
+        follower = asyncio.ensure_future(single_flight.run("key", agent.answer))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        agent.release.set()
+        return agent.runs, await follower
+
+    assert asyncio.run(run()) == (1, ("answer 1", True))
+
+
+def test_bypass_refreshes_the_cached_answer():
+    async def run():
+        cache = AnswerCache(ttl=60)
+        agent = Agent()
+        agent.release.set()
+        key = answer_cache_key("Top clients?", [])
+        results = [await cache.get_or_run(key, agent.answer)]
+        results.append(await cache.get_or_run(key, agent.answer, skip_cache=True))
+        results.append(await cache.get_or_run(key, agent.answer))
+        return agent.runs, results
+
+    runs, results = asyncio.run(run())
+    assert runs == 2
+    assert results == [("answer 1", "MISS"), ("answer 2", "BYPASS"), ("answer 2", "HIT")]
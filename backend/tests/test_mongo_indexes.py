@@ -0,0 +1,66 @@
+"""
+Checks that every filter the MongoDB tools send is answered from an index. Explain plans
+need a real server: the tests seed a throwaway database on MONGO_TEST_URI (a local
+mongod by default) and are skipped when none is reachable.
+"""
+import os
+import uuid
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from mongo_indexes import CASE_INSENSITIVE, TOOL_QUERIES, ensure_client_indexes, exact_match, explain_tool_queries, prefix_match
+
+MONGO_TEST_URI = os.getenv("MONGO_TEST_URI", "mongodb://localhost:27017")
+MANAGERS = ["Anita Rao", "Vikram Shah", "Meera Iyer", "Rahul Menon"]
+INVESTMENT_TYPES = ["Equity", "Mutual Funds", "Bonds", "Gold", "Real Estate"]
+
+
+def client_documents(count):
+    for n in range(count):
+        kinds = INVESTMENT_TYPES[n % 5:] + INVESTMENT_TYPES[:n % 5]
+        yield {
+            "client_id": f"C{n:05d}",
+            "name": f"Client {n} ({'Actor' if n % 7 == 0 else 'Doctor'})",
+            "risk_appetite": ["High", "Medium", "Low"][n % 3],
+            "investment_preferences": kinds[:2],
+            "relationship_manager": MANAGERS[n % len(MANAGERS)],
+            "portfolio_by_preference": [{"type": kind, "value_crores": float(n % 50 + i)} for i, kind in enumerate(kinds[:2])],
+        }
+
+
+@pytest.fixture(scope="module")
+def clients():
+    client = MongoClient(MONGO_TEST_URI, serverSelectionTimeoutMS=2000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError as e:
+        client.close()
+        pytest.skip(f"no MongoDB at {MONGO_TEST_URI}: {e}")
+    db_name = f"nlcp_test_{uuid.uuid4().hex[:8]}"
+    collection = client[db_name].clients
+    collection.insert_many(list(client_documents(2_000)))
+    ensure_client_indexes(collection)
+    yield collection
+    client.drop_database(db_name)
+    client.close()
+
+
+@pytest.mark.parametrize("label", [*TOOL_QUERIES, "top_clients_by_investment_type"])
+def test_tool_query_uses_an_index(clients, label):
+    stages = explain_tool_queries(clients)[label]
+    assert "IXSCAN" in stages, stages
+    assert "COLLSCAN" not in stages, stages
+
+
+def test_lookups_ignore_case(clients):
+    doc = clients.find_one({}, {"name": 1, "relationship_manager": 1})
+    by_name = clients.find_one({"name": exact_match(doc["name"].upper())}, collation=CASE_INSENSITIVE)
+    assert by_name["_id"] == doc["_id"]
+
+    prefix = doc["relationship_manager"].split()[0].lower()
+    managers = clients.distinct("relationship_manager", {"relationship_manager": prefix_match(prefix)}, collation=CASE_INSENSITIVE)
+    assert doc["relationship_manager"] in managers
+    assert all(manager.lower().startswith(prefix) for manager in managers)
+
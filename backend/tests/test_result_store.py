@@ -0,0 +1,20 @@
+"""Column aggregates in the summaries of large tool results."""
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from result_store import summarize_rows
+
+
+def test_numbers_mixing_decimal_and_float():
+    summary = summarize_rows([{"amount": Decimal("1.5")}, {"amount": 2.5}, {"amount": None}])
+    assert summary["aggregates"]["amount"] == {"sum": 4.0, "min": 1.5, "max": 2.5}
+
+
+def test_dates_mixing_date_and_datetime():
+    rows = [{"at": date(2024, 3, 2)}, {"at": datetime(2024, 3, 1, 9, 30)}, {"at": date(2024, 2, 28)}]
+    assert summarize_rows(rows)["aggregates"]["at"] == {"min": datetime(2024, 2, 28), "max": datetime(2024, 3, 2)}
+
+
+def test_naive_and_aware_datetimes_are_not_aggregated():
+    rows = [{"at": datetime(2024, 3, 1)}, {"at": datetime(2024, 3, 2, tzinfo=timezone.utc)}]
+    assert "aggregates" not in summarize_rows(rows)
@@ -0,0 +1,27 @@
+"""
+ToolResultCache serves a cached result only for the arguments it was computed from: the
+tool is called with the same normalized arguments the cache key is built from.
+"""
+import asyncio
+
+from tool_cache import ToolResultCache
+
+
+def test_tool_receives_the_arguments_in_its_key():
+    cache = ToolResultCache({"get_client_profile_by_name": 60})
+    received = []
+
+    @cache.cached
+    async def get_client_profile_by_name(client_name: str, client_ids: list = ()) -> str:
+        received.append((client_name, client_ids))
+        return f"profile of {client_name!r}"
+
+    async def run():
+        first = await get_client_profile_by_name("  Asha Rao ", [" C00001"])
+        second = await get_client_profile_by_name("Asha Rao", ["C00001 "])
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert received == [("Asha Rao", ["C00001"])]
+    assert first == second == "profile of 'Asha Rao'"
+    assert cache.stats()["hits"] == 1
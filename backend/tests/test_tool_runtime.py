@@ -0,0 +1,73 @@
+"""
+Concurrent agent tool calls (`ainvoke` on the tools the API builds) run through
+ToolBackend.offload side by side instead of queueing behind one another, up to the
+backend's concurrency limit.
+"""
+import asyncio
+import time
+
+import mongomock
+from mcp.server.fastmcp import FastMCP
+
+from tool_runtime import ToolBackend
+from tool_sessions import inprocess_tools
+
+DELAY = 0.2
+
+
+class SlowCollection:
+    """A mongomock collection whose reads block like a driver waiting on the network."""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def find(self, *args, **kwargs):
+        time.sleep(DELAY)
+        return self._collection.find(*args, **kwargs)
+
+
+def serve_slow_tool(max_concurrency):
+    collection = mongomock.MongoClient().db.clients
+    collection.insert_many([{"client_id": f"C{n:05d}", "risk_appetite": "High"} for n in range(10)])
+    clients = SlowCollection(collection)
+    backend = ToolBackend("test", max_concurrency)
+    server = FastMCP("Test_Tools")
+
+    @server.tool()
+    @backend.offload
+    def get_clients_by_risk_appetite(risk_appetite_level: str) -> list:
+        return [doc["client_id"] for doc in clients.find({"risk_appetite": risk_appetite_level}, {"_id": 0})]
+
+    return server, backend
+
+
+async def timed_calls(server, calls):
+    [tool_obj] = await inprocess_tools(server)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        tool_obj.ainvoke({"risk_appetite_level": "High"}) for _ in range(calls)
+    ))
+    return time.perf_counter() - started, results
+
+
+def test_parallel_calls_overlap():
+    server, backend = serve_slow_tool(max_concurrency=8)
+    try:
+        elapsed, results = asyncio.run(timed_calls(server, 8))
+    finally:
+        backend.shutdown()
+    assert results == [[f"C{n:05d}" for n in range(10)]] * 8
+    # serialized calls would take 8 * DELAY
+    assert elapsed < 3 * DELAY, elapsed
+    assert backend.stats()["peak_in_flight"] == 8
+
+
+def test_concurrency_is_bounded():
+    server, backend = serve_slow_tool(max_concurrency=2)
+    try:
+        elapsed, _ = asyncio.run(timed_calls(server, 6))
+    finally:
+        backend.shutdown()
+    # three waves of two
+    assert elapsed >= 3 * DELAY, elapsed
+    assert backend.stats()["peak_in_flight"] == 2
@@ -0,0 +1,151 @@
+"""
+Tool calls through the mcp and langchain-mcp-adapters APIs tool_sessions builds on, both
+in-process and over an MCP client session, so a dependency upgrade that changes them
+fails here rather than in the agent.
+"""
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import textwrap
+import time
+
+import pytest
+from langchain_core.tools import ToolException
+from langchain_mcp_adapters.tools import load_mcp_tools
+from mcp.server.fastmcp import FastMCP
+from mcp.shared.memory import create_connected_server_and_client_session
+
+from tool_sessions import MCPToolSessions, _call_tool, inprocess_tools
+
+
+def serve_tools():
+    server = FastMCP("Test_Tools")
+
+    @server.tool()
+    def get_client_profile_by_id(client_id: str) -> str:
+        """Retrieves a client profile."""
+        return json.dumps({"client_id": client_id, "name": "Asha Rao"})
+
+    @server.tool()
+    async def get_mongodb_server_stats() -> str:
+        """Operational statistics."""
+        raise RuntimeError("stats unavailable")
+
+    return server
+
+
+def test_inprocess_tools():
+    async def run():
+        tools = {tool_obj.name: tool_obj for tool_obj in await inprocess_tools(serve_tools())}
+        assert set(tools) == {"get_client_profile_by_id", "get_mongodb_server_stats"}
+        assert tools["get_client_profile_by_id"].args == {"client_id": {"title": "Client Id", "type": "string"}}
+        profile = await tools["get_client_profile_by_id"].ainvoke({"client_id": "C00001"})
+        with pytest.raises(ToolException, match="stats unavailable"):
+            await tools["get_mongodb_server_stats"].ainvoke({})
+        return profile
+
+    assert json.loads(asyncio.run(run())) == {"client_id": "C00001", "name": "Asha Rao"}
+
+
+def test_calls_over_an_mcp_session():
+    async def run():
+        # FastMCP exposes the low-level server it wraps only as `_mcp_server`
+        async with create_connected_server_and_client_session(serve_tools()._mcp_server) as session:
+            names = {tool_obj.name for tool_obj in await load_mcp_tools(session)}
+            profile = await _call_tool(session, "get_client_profile_by_id", {"client_id": "C00001"})
+            with pytest.raises(ToolException, match="stats unavailable"):
+                await _call_tool(session, "get_mongodb_server_stats", {})
+        return names, profile
+
+    names, profile = asyncio.run(run())
+    assert names == {"get_client_profile_by_id", "get_mongodb_server_stats"}
+    assert json.loads(profile) == {"client_id": "C00001", "name": "Asha Rao"}
+
+
+REPLICA_SCRIPT = textwrap.dedent("""
+    import json
+    import os
+
+    from mcp.server.fastmcp import FastMCP
+
+    from tool_runtime import serve
+
+    server = FastMCP("Test_Tools")
+
+    @server.tool()
+    def get_client_profile_by_id(client_id: str) -> str:
+        \"\"\"Retrieves a client profile.\"\"\"
+        return json.dumps({"client_id": client_id, "pid": os.getpid()})
+
+    @server.tool()
+    def get_mongodb_server_stats() -> str:
+        \"\"\"Operational statistics.\"\"\"
+        return json.dumps({"pid": os.getpid()})
+
+    if __name__ == "__main__":
+        serve(server, lambda: None)
+""")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_replica(script, port):
+    """A replica served over streamable HTTP, as launch_tool_servers.py runs them."""
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(
+        [sys.executable, str(script), "--transport", "streamable-http", "--port", str(port)],
+        env=dict(os.environ, PYTHONPATH=backend), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise TimeoutError(f"Test replica did not open port {port}.")
+
+
+def test_calls_recover_after_a_replica_restarts(tmp_path):
+    script = tmp_path / "replica.py"
+    script.write_text(REPLICA_SCRIPT)
+    port = free_port()
+    replicas = [start_replica(script, port)]
+
+    async def run():
+        sessions = MCPToolSessions(
+            {"mongodb": [{"transport": "streamable_http", "url": f"http://127.0.0.1:{port}/mcp"}]},
+            health_check_interval=0.2, reconnect_delay=0.1, max_reconnect_delay=0.5, replica_wait=20,
+        )
+        try:
+            tools = {tool_obj.name: tool_obj for tool_obj in await sessions.get_tools()}
+            before = json.loads(await tools["get_client_profile_by_id"].ainvoke({"client_id": "C00001"}))
+
+            # what launch_tool_servers.py does with a replica that dies: start it again on its port
+            replicas[0].kill()
+            replicas[0].wait()
+            replicas.append(start_replica(script, port))
+
+            after = json.loads(await tools["get_client_profile_by_id"].ainvoke({"client_id": "C00001"}))
+            stats = await sessions.call_admin_tool("get_mongodb_server_stats")
+            return before, after, stats
+        finally:
+            await sessions.close()
+
+    try:
+        before, after, stats = asyncio.run(run())
+    finally:
+        for process in replicas:
+            process.kill()
+            process.wait()
+    assert before["pid"] == replicas[0].pid
+    assert after == {"client_id": "C00001", "pid": replicas[1].pid}
+    assert stats == [{"pid": replicas[1].pid}]
@@ -0,0 +1,89 @@
+"""
+Keyset pagination of get_client_transactions against the SQLite stand-in the benchmarks
+use: pages follow (transaction_date, transaction_id) newest first, the LIMIT + 1 row
+decides whether there is a next page, and malformed tokens are refused.
+"""
+import asyncio
+import base64
+import json
+import sqlite3
+from datetime import date
+
+import pytest
+
+import mysql_tools
+from bench_data import SQLiteConnection
+from bench_holdings import create_transactions
+from mysql_pool import MySQLConnectionPool
+from mysql_tools import _decode_continuation_token, _encode_continuation_token
+
+# (transaction_id, date) for C00001; ids 2, 3 and 6 share a date, so the id breaks the tie
+TRANSACTIONS = [(1, "2024-01-05"), (2, "2024-01-03"), (3, "2024-01-03"), (4, "2024-01-01"),
+                (5, "2024-01-04"), (6, "2024-01-03"), (7, "2024-01-02")]
+NEWEST_FIRST = [1, 5, 6, 3, 2, 7, 4]
+
+
+@pytest.fixture
+def transactions_db(tmp_path, monkeypatch):
+    path = str(tmp_path / "transactions.db")
+    conn = sqlite3.connect(path)
+    create_transactions(conn, 0, 1)
+    conn.executemany(
+        "INSERT INTO transactions VALUES (?, ?, 'INFY', 'buy', 10, 1500.0, ?)",
+        [(transaction_id, "C00001", day) for transaction_id, day in TRANSACTIONS] + [(8, "C00002", "2024-01-06")],
+    )
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(mysql_tools, "mysql_pool", MySQLConnectionPool(lambda: SQLiteConnection(path), size=1))
+    monkeypatch.setattr(mysql_tools.tool_cache, "ttls", {})
+    monkeypatch.setattr(mysql_tools.tool_cache, "default_ttl", 0.0)
+
+
+def fetch_page(**kwargs):
+    page = json.loads(asyncio.run(mysql_tools.get_client_transactions("C00001", **kwargs)))
+    rows = page.get("transactions", [])
+    if isinstance(rows, dict):
+        # columnar form; see result_encoding
+        rows = [dict(zip(rows["columns"], row)) for row in rows["rows"]]
+    return page, [row["transaction_id"] for row in rows]
+
+
+def test_pages_walk_every_transaction_once(transactions_db):
+    seen, sizes, token = [], [], None
+    while True:
+        page, ids = fetch_page(limit=3, continuation_token=token)
+        seen += ids
+        sizes.append(page["returned"])
+        token = page["next_page_token"]
+        if token is None:
+            break
+    assert seen == NEWEST_FIRST
+    assert sizes == [3, 3, 1]
+
+
+def test_no_next_page_when_the_limit_is_exactly_reached(transactions_db):
+    page, ids = fetch_page(limit=len(TRANSACTIONS))
+    assert ids == NEWEST_FIRST
+    assert page["next_page_token"] is None
+
+    page, ids = fetch_page(limit=len(TRANSACTIONS) - 1)
+    assert ids == NEWEST_FIRST[:-1]
+    assert _decode_continuation_token(page["next_page_token"]) == ("2024-01-02", 7)
+
+
+def test_token_round_trip():
+    token = _encode_continuation_token(date(2024, 1, 3), 6)
+    assert base64.urlsafe_b64decode(token) == b'["2024-01-03", 6]'
+    assert _decode_continuation_token(token) == ("2024-01-03", 6)
+
+
+@pytest.mark.parametrize("token", [
+    "not a token",
+    base64.urlsafe_b64encode(b"not json").decode("ascii"),
+    base64.urlsafe_b64encode(b'["2024-01-03", 6, "extra"]').decode("ascii"),
+    _encode_continuation_token("2024-01-03", 6)[:-4],
+])
+def test_invalid_tokens_are_refused(transactions_db, token):
+    page, ids = fetch_page(limit=3, continuation_token=token)
+    assert ids == []
+    assert "Invalid continuation_token" in page["error"]
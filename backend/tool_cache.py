@@ -0,0 +1,158 @@
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    A size-capped LRU cache whose entries also expire after a per-entry TTL.
+    """
+
+    def __init__(self, max_entries=1024, clock=time.monotonic):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, key):
+        """Returns (hit, value)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return False, None
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return True, value
+
+    def set(self, key, value, ttl):
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, predicate=None):
+        """Drops every entry whose key matches `predicate` (all entries when omitted)."""
+        with self._lock:
+            if predicate is None:
+                keys = list(self._entries)
+            else:
+                keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+            self._stats["invalidations"] += len(keys)
+            return len(keys)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return dict(
+                self._stats,
+                size=len(self._entries),
+                max_entries=self.max_entries,
+                hit_rate=round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            )
+
+
+def cache_ttls_from_env(defaults):
+    """
+    Per-tool TTLs in seconds: the server's defaults, overridden by the TOOL_CACHE_TTLS
+    JSON object (e.g. '{"get_client_profile_by_id": 900, "get_top_n_portfolios": 0}').
+    A TTL of 0 disables caching for that tool.
+    """
+    ttls = dict(defaults)
+    overrides = os.getenv("TOOL_CACHE_TTLS")
+    if overrides:
+        ttls.update({name: float(ttl) for name, ttl in json.loads(overrides).items()})
+    return ttls
+
+
+def _normalize_arg(value):
+    # FastMCP has already coerced each argument to its parameter's type, so only the
+    # surrounding whitespace of strings can tell equal requests apart
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (list, tuple)):
+        return [_normalize_arg(item) for item in value]
+    return value
+
+
+def _is_cacheable(result):
+    # tool errors are returned as JSON objects whose first key is "error"; never cache them,
+    # nor summaries pointing at a stored result that may expire before the cache entry
+    return isinstance(result, str) and not result.startswith('{"error"') and '"result_handle"' not in result
+
+
+class ToolResultCache:
+    """
+    Caches tool results keyed on the tool name plus its normalized arguments, with a
+    TTL chosen per tool. Tools without a TTL in the policy use `default_ttl`. The tool is
+    called with the normalized arguments too, so a cached result always answers exactly
+    the arguments in its key.
+    """
+
+    def __init__(self, ttls, default_ttl=0.0, max_entries=1024):
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self._cache = TTLCache(max_entries=max_entries)
+
+    def ttl_for(self, tool_name):
+        return self.ttls.get(tool_name, self.default_ttl)
+
+    def cached(self, fn):
+        tool_name = fn.__name__
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            ttl = self.ttl_for(tool_name)
+            if ttl <= 0:
+                return await fn(*args, **kwargs)
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            for name, value in bound.arguments.items():
+                bound.arguments[name] = _normalize_arg(value)
+            key = (tool_name, json.dumps(bound.arguments, sort_keys=True, default=str))
+
+            hit, result = self._cache.get(key)
+            if hit:
+                return result
+            result = await fn(*bound.args, **bound.kwargs)
+            if _is_cacheable(result):
+                self._cache.set(key, result, ttl)
+            return result
+
+        return wrapper
+
+    def clear(self, tool_name=None):
+        """Invalidates cached results for one tool, or for every tool when omitted."""
+        if tool_name is None:
+            return self._cache.invalidate()
+        return self._cache.invalidate(lambda key: key[0] == tool_name)
+
+    def stats(self):
+        return self._cache.stats()
+
+
+def tool_cache_from_env(default_ttls):
+    return ToolResultCache(
+        cache_ttls_from_env(default_ttls),
+        default_ttl=float(os.getenv("TOOL_CACHE_DEFAULT_TTL", "0")),
+        max_entries=int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "1024")),
+    )
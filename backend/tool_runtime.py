@@ -0,0 +1,78 @@
+import argparse
+import asyncio
+import contextvars
+import functools
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ToolBackend:
+    """
+    A bounded thread pool for one database backend. Tools wrapped with `offload` become
+    coroutines whose blocking driver calls run on the pool, so a single MCP server can
+    overlap many in-flight calls while never running more than `max_concurrency` at once.
+    """
+
+    def __init__(self, name, max_concurrency):
+        if max_concurrency < 1:
+            raise ValueError(f"{name} tool concurrency must be at least 1.")
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=f"{name}-tool")
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "in_flight": 0, "peak_in_flight": 0, "queued": 0}
+
+    def offload(self, fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            # copy the caller's context so request-scoped contextvars survive the hop
+            context = contextvars.copy_context()
+            with self._lock:
+                self._stats["calls"] += 1
+                self._stats["queued"] += 1
+            return await loop.run_in_executor(self._executor, functools.partial(context.run, self._run, fn, args, kwargs))
+
+        return wrapper
+
+    def _run(self, fn, args, kwargs):
+        with self._lock:
+            self._stats["queued"] -= 1
+            self._stats["in_flight"] += 1
+            self._stats["peak_in_flight"] = max(self._stats["peak_in_flight"], self._stats["in_flight"])
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._stats["in_flight"] -= 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, max_concurrency=self.max_concurrency)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def serve(mcp_server, startup, argv=None):
+    """
+    Command-line entry point shared by the tool servers: stdio for a parent process that
+    owns the server, or streamable HTTP for a standalone service that several API
+    workers connect to by URL (served at http://<host>:<port>/mcp).
+    """
+    parser = argparse.ArgumentParser(description=f"{mcp_server.name} MCP server")
+    parser.add_argument("--transport", choices=["stdio", "streamable-http"], default="stdio")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args(argv)
+
+    startup()
+    if args.transport == "streamable-http":
+        mcp_server.settings.host = args.host
+        mcp_server.settings.port = args.port
+        print(f"Starting {mcp_server.name} MCP Server on http://{args.host}:{args.port}{mcp_server.settings.streamable_http_path}...")
+    else:
+        # stdout carries the JSON-RPC stream
+        print(f"Starting {mcp_server.name} MCP Server...", file=sys.stderr)
+    mcp_server.run(transport=args.transport)
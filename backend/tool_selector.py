@@ -0,0 +1,143 @@
+"""
+Picks the tools worth offering the model for one question, so each LLM call carries a
+few tool schemas instead of every tool from both servers. Tools are ranked by TF-IDF
+cosine similarity between the question and their name, description and argument names,
+with the tool vectors computed once when the agent is built.
+"""
+import json
+import math
+import os
+import re
+from collections import Counter
+
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from session_store import estimate_tokens
+
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "get", "give", "has",
+    "have", "how", "i", "in", "is", "it", "me", "much", "my", "of", "on", "or", "our", "please", "show", "that",
+    "the", "their", "them", "this", "to", "us", "we", "what", "which", "who", "with", "you",
+}
+
+# how users phrase things the tool descriptions put differently
+SYNONYMS = {
+    "rm": "relationship manager",
+    "advisor": "relationship manager",
+    "richest": "top portfolio value",
+    "wealthiest": "top portfolio value",
+    "biggest": "top",
+    "largest": "top",
+    "highest": "top",
+    "worth": "portfolio value",
+    "trade": "transaction",
+    "bought": "transaction",
+    "sold": "transaction",
+    "own": "stock holder",
+    "hold": "stock holder",
+    "share": "stock",
+    "ticker": "stock",
+    "job": "profession",
+    "occupation": "profession",
+    "risk": "risk appetite",
+    "invest": "investment",
+    "invested": "investment",
+}
+
+
+def _stem(word):
+    # plural and third-person "s" only; enough to match "portfolios" with "portfolio"
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+def tokenize(text, expand=False):
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", text.lower().replace("_", " ")):
+        word = _stem(word)
+        if word in STOPWORDS:
+            continue
+        tokens.append(word)
+        if expand and word in SYNONYMS:
+            tokens.extend(SYNONYMS[word].split())
+    return tokens
+
+
+def _tool_schema(tool_obj):
+    return convert_to_openai_tool(tool_obj)["function"]
+
+
+def schema_tokens(tool_obj):
+    """Estimated prompt tokens one tool's schema adds to every LLM call that offers it."""
+    return estimate_tokens(json.dumps(_tool_schema(tool_obj)))
+
+
+class ToolSelector:
+    """
+    Ranks `tools` against a question and returns the names of at most `max_tools` of them
+    scoring at least `min_score`, plus the `always` tools. When nothing clears the bar
+    (a follow-up such as "and their transactions?") every tool is offered.
+    """
+
+    def __init__(self, tools, max_tools=6, min_score=0.05, always=()):
+        self.max_tools = max_tools
+        self.min_score = min_score
+        self.names = [tool_obj.name for tool_obj in tools]
+        self.always = [name for name in always if name in self.names]
+        self.schema_tokens = {tool_obj.name: schema_tokens(tool_obj) for tool_obj in tools}
+
+        documents = {}
+        for tool_obj in tools:
+            schema = _tool_schema(tool_obj)
+            arguments = " ".join(schema.get("parameters", {}).get("properties", {}))
+            # the name counts twice: it is the most specific thing a tool says about itself
+            documents[tool_obj.name] = Counter(
+                tokenize(tool_obj.name) * 2 + tokenize(schema.get("description", "")) + tokenize(arguments)
+            )
+        document_frequency = Counter(token for counts in documents.values() for token in counts)
+        total = len(documents)
+        self._idf = {token: math.log((1 + total) / (1 + count)) + 1 for token, count in document_frequency.items()}
+        self._vectors = {name: self._normalized(counts) for name, counts in documents.items()}
+
+    def _normalized(self, counts):
+        vector = {token: count * self._idf[token] for token, count in counts.items() if token in self._idf}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        return {token: weight / norm for token, weight in vector.items()} if norm else {}
+
+    def scores(self, question, context=None):
+        """Cosine similarity of every tool to the question; `context` (the previous question) counts half."""
+        query = self._normalized(Counter(tokenize(question, expand=True)))
+        if context:
+            for token, weight in self._normalized(Counter(tokenize(context, expand=True))).items():
+                query[token] = query.get(token, 0.0) + 0.5 * weight
+        return {
+            name: sum(weight * vector.get(token, 0.0) for token, weight in query.items())
+            for name, vector in self._vectors.items()
+        }
+
+    def select(self, question, context=None):
+        """Names of the tools to offer, in the agent's tool order."""
+        scores = self.scores(question, context)
+        ranked = sorted((name for name in self.names if scores[name] >= self.min_score), key=scores.get, reverse=True)
+        if not ranked:
+            return list(self.names)
+        chosen = set(ranked[:self.max_tools]) | set(self.always)
+        return [name for name in self.names if name in chosen]
+
+    def tokens_saved(self, selected):
+        """Schema tokens left out of each LLM call by offering only `selected`."""
+        chosen = set(selected)
+        return sum(tokens for name, tokens in self.schema_tokens.items() if name not in chosen)
+
+
+def tool_selector_from_env(tools):
+    """None when TOOL_SELECTION_ENABLED is off, so the agent always gets every tool."""
+    if os.getenv("TOOL_SELECTION_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    always = os.getenv("TOOL_SELECTION_ALWAYS", "get_client_profiles_by_ids")
+    return ToolSelector(
+        tools,
+        max_tools=int(os.getenv("TOOL_SUBSET_SIZE", "6")),
+        min_score=float(os.getenv("TOOL_SELECTION_MIN_SCORE", "0.05")),
+        always=[name.strip() for name in always.split(",") if name.strip()],
+    )
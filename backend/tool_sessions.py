@@ -0,0 +1,571 @@
+import asyncio
+import hashlib
+import importlib
+import inspect
+import itertools
+import json
+import os
+
+from langchain_core.tools import StructuredTool, ToolException
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.tools import load_mcp_tools
+from mcp import types
+from mcp.server.fastmcp.exceptions import ToolError
+
+from telemetry import REQUEST_ID_META_KEY, current_request_id, span
+
+
+# Operational tools served by the MCP servers for the API's admin endpoints.
+# They are kept out of the agent's tool list so the model never sees them.
+STATS_TOOL_NAMES = {"mongodb": "get_mongodb_server_stats", "mysql": "get_mysql_server_stats"}
+CACHE_CLEAR_TOOL_NAMES = {"mongodb": "clear_mongodb_tool_cache", "mysql": "clear_mysql_tool_cache"}
+RESULT_PAGE_TOOL_NAMES = {"mongodb": "fetch_mongodb_result_page", "mysql": "fetch_mysql_result_page"}
+METRICS_TOOL_NAMES = {"mongodb": "get_mongodb_metrics", "mysql": "get_mysql_metrics"}
+ADMIN_TOOL_NAMES = (
+    set(STATS_TOOL_NAMES.values()) | set(CACHE_CLEAR_TOOL_NAMES.values()) | set(RESULT_PAGE_TOOL_NAMES.values())
+    | set(METRICS_TOOL_NAMES.values())
+)
+
+# tool server name -> module defining its FastMCP `mcp_server`
+TOOL_SERVER_MODULES = {"mongodb": "mongodb_tools", "mysql": "mysql_tools"}
+
+# MCP session supervision, in seconds: how often an idle session is pinged, the backoff
+# between reconnection attempts, how long a tool call waits for a replica to come back,
+# and how long startup waits for every tool server
+HEALTH_CHECK_INTERVAL = float(os.getenv("MCP_HEALTH_CHECK_INTERVAL", "10"))
+RECONNECT_MIN_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30.0
+REPLICA_WAIT = float(os.getenv("MCP_REPLICA_WAIT", "5"))
+CONNECT_TIMEOUT = float(os.getenv("MCP_CONNECT_TIMEOUT", "120"))
+
+
+class ToolSessions:
+    """
+    The tools of every tool server, split into the agent's tools and the admin tools the
+    API calls itself. Subclasses decide how the tools are reached. A server may run as
+    several replicas, so each admin tool maps to one tool object per replica.
+    """
+
+    def __init__(self):
+        self.admin_tools = {}
+
+    async def get_tools(self):
+        raise NotImplementedError
+
+    async def wait_ready(self):
+        """Returns once every tool server is connected and callable."""
+
+    def _split_admin_tools(self, tool_objs, tools):
+        for tool_obj in tool_objs:
+            if tool_obj.name in ADMIN_TOOL_NAMES:
+                self.admin_tools.setdefault(tool_obj.name, []).append(tool_obj)
+            else:
+                tools.append(tool_obj)
+
+    async def call_admin_tool(self, tool_name, **kwargs):
+        """
+        Calls the admin tool on every replica, returning their decoded results in order; a
+        replica that cannot be reached reports {"error": ...} in its place.
+        """
+        await self.wait_ready()
+        results = await asyncio.gather(
+            *(tool_obj.ainvoke(kwargs) for tool_obj in self.admin_tools[tool_name]), return_exceptions=True
+        )
+        return [{"error": str(result)} if isinstance(result, Exception) else json.loads(result) for result in results]
+
+    async def get_stats(self):
+        await self.wait_ready()
+        stats = {}
+        for server_name, tool_name in STATS_TOOL_NAMES.items():
+            if tool_name in self.admin_tools:
+                replica_stats = await self.call_admin_tool(tool_name)
+                stats[server_name] = replica_stats[0] if len(replica_stats) == 1 else {"replicas": replica_stats}
+        return stats
+
+    async def clear_caches(self, tool_name=None):
+        await self.wait_ready()
+        cleared = {}
+        kwargs = {"tool_name": tool_name} if tool_name else {}
+        for server_name, clear_tool_name in CACHE_CLEAR_TOOL_NAMES.items():
+            if clear_tool_name in self.admin_tools:
+                results = await self.call_admin_tool(clear_tool_name, **kwargs)
+                cleared[server_name] = sum(result.get("cleared", 0) for result in results)
+        return cleared
+
+    async def get_metrics(self):
+        """
+        (snapshot, labels) pairs for /metrics from every tool server replica running in its
+        own process. Servers loaded in-process already share the API's registry.
+        """
+        await self.wait_ready()
+        snapshots = []
+        for server_name, tool_name in METRICS_TOOL_NAMES.items():
+            if tool_name in self.admin_tools:
+                for index, snapshot in enumerate(await self.call_admin_tool(tool_name)):
+                    if "error" not in snapshot and snapshot["pid"] != os.getpid():
+                        snapshots.append((snapshot, {"server": server_name, "replica": str(index)}))
+        return snapshots
+
+    async def fetch_result_page(self, handle, offset=0, limit=500):
+        """
+        One page of a large tool result kept by the server that produced it; handles are
+        prefixed with that server's name, and only the replica that stored the result has
+        it. Raises KeyError for handles no server could own.
+        """
+        await self.wait_ready()
+        server_name = handle.split("-", 1)[0]
+        tool_name = RESULT_PAGE_TOOL_NAMES.get(server_name)
+        if tool_name not in self.admin_tools:
+            raise KeyError(handle)
+        page = None
+        for tool_obj in self.admin_tools[tool_name]:
+            page = json.loads(await tool_obj.ainvoke({"handle": handle, "offset": offset, "limit": limit}))
+            if "error" not in page:
+                break
+        return page
+
+    async def close(self):
+        pass
+
+
+class ToolSchemaCache:
+    """
+    Tool names, descriptions and input schemas per tool server, kept in a JSON file so a
+    restart can build the agent without waiting on schema discovery. Entries are keyed on
+    a fingerprint of the server's connection settings and source, so edits invalidate them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _read(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def load(self, server_name, fingerprint):
+        entry = self._read().get(server_name)
+        if entry and entry.get("fingerprint") == fingerprint:
+            return entry["tools"]
+        return None
+
+    def save(self, server_name, fingerprint, tools):
+        data = self._read()
+        if data.get(server_name) == {"fingerprint": fingerprint, "tools": tools}:
+            return
+        data[server_name] = {"fingerprint": fingerprint, "tools": tools}
+        # several API workers may start at once; replace the file atomically
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+
+def _fingerprint(connections):
+    digest = hashlib.sha256()
+    for connection in connections:
+        settings = {key: value for key, value in connection.items() if key != "env"}
+        digest.update(json.dumps(settings, sort_keys=True, default=str).encode("utf-8"))
+        for arg in connection.get("args", []):
+            if arg.endswith(".py") and os.path.exists(arg):
+                with open(arg, "rb") as f:
+                    digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _tool_schema(tool_obj):
+    input_schema = tool_obj.args_schema
+    if not isinstance(input_schema, dict):
+        input_schema = input_schema.model_json_schema()
+    return {"name": tool_obj.name, "description": tool_obj.description, "input_schema": input_schema}
+
+
+def _connection_name(server_name, index):
+    return f"{server_name}#{index}"
+
+
+def _describe(error):
+    """An error's message, looking inside the exception groups the MCP transports raise."""
+    while getattr(error, "exceptions", None):
+        error = error.exceptions[0]
+    return str(error) or type(error).__name__
+
+
+def _text_content(contents):
+    """The text of a tool result's content blocks: one string, or a list when there are several."""
+    texts = [content.text for content in contents if isinstance(content, types.TextContent)]
+    return texts[0] if len(texts) == 1 else texts or ""
+
+
+async def _call_tool(session, tool_name, arguments):
+    """
+    `session.call_tool`, with the current request id in the request's `_meta` so the tool
+    server records its spans under the same request.
+    """
+    request_id = current_request_id()
+    params = types.CallToolRequestParams(
+        name=tool_name, arguments=arguments, _meta={REQUEST_ID_META_KEY: request_id} if request_id else None
+    )
+    result = await session.send_request(
+        types.ClientRequest(types.CallToolRequest(method="tools/call", params=params)), types.CallToolResult
+    )
+    content = _text_content(result.content)
+    if result.isError:
+        raise ToolException(content)
+    return content
+
+
+class _Replica:
+    """One tool server replica: its current session, if any, and the tools it offers."""
+
+    def __init__(self, server_name, index):
+        self.server_name = server_name
+        self.index = index
+        self.name = _connection_name(server_name, index)
+        self.session = None
+        self.tools = {}
+        self.connected = asyncio.Event()  # set while the session can be used
+        self.dropped = asyncio.Event()  # set to make the supervisor let the session go
+
+    @property
+    def healthy(self):
+        return self.connected.is_set()
+
+    def connect(self, session, tools):
+        self.session = session
+        self.tools = tools
+        self.dropped.clear()
+        self.connected.set()
+
+    def drop(self, error=None):
+        """Takes the replica out of rotation; its supervisor closes the session and reconnects."""
+        if error is not None and self.connected.is_set():
+            print(f"Tool server replica {self.name} failed ({error}); reconnecting.")
+        self.connected.clear()
+        self.dropped.set()
+
+
+class MCPToolSessions(ToolSessions):
+    """
+    Keeps one long-lived MCP session per tool server replica (a stdio server has exactly
+    one). Without them every tool call spawns a fresh server process, throwing away any
+    connection pools the server holds. Agent tool calls are balanced round-robin across a
+    server's healthy replicas, moving on to the next replica when one cannot be reached.
+
+    Each replica has a supervisor task that opens its session, pings it every
+    `health_check_interval` seconds and, when the session fails (the replica crashed, or
+    was restarted and no longer knows the session), closes it and reconnects with
+    exponential backoff. The MCP client contexts must be exited in the task that entered
+    them, which is why the supervisor owns the session. With a schema cache, `get_tools`
+    returns straight away from the cached schemas while the sessions connect.
+    """
+
+    def __init__(
+        self, server_connections, schema_cache=None, *, health_check_interval=HEALTH_CHECK_INTERVAL,
+        reconnect_delay=RECONNECT_MIN_DELAY, max_reconnect_delay=RECONNECT_MAX_DELAY,
+        replica_wait=REPLICA_WAIT, connect_timeout=CONNECT_TIMEOUT,
+    ):
+        super().__init__()
+        self.server_connections = server_connections
+        self.client = MultiServerMCPClient({
+            _connection_name(server_name, index): connection
+            for server_name, connections in server_connections.items()
+            for index, connection in enumerate(connections)
+        })
+        self.schema_cache = schema_cache
+        self.health_check_interval = health_check_interval
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.replica_wait = replica_wait
+        self.connect_timeout = connect_timeout
+        self._replicas = {}  # server name -> [_Replica]
+        self._ready = {}  # server name -> event set once any of its replicas has connected
+        self._closing = None
+        self._supervisors = []
+
+    async def get_tools(self):
+        self._closing = asyncio.Event()
+        for server_name, connections in self.server_connections.items():
+            self._replicas[server_name] = [_Replica(server_name, index) for index in range(len(connections))]
+            self._ready[server_name] = asyncio.Event()
+        self._supervisors = [
+            asyncio.create_task(self._supervise(replica))
+            for server_replicas in self._replicas.values()
+            for replica in server_replicas
+        ]
+
+        schemas = self._cached_schemas()
+        if schemas is None:
+            try:
+                await self.wait_ready()
+            except BaseException:
+                await self.close()
+                raise
+            schemas = {
+                server_name: [
+                    _tool_schema(tool_obj)
+                    for tool_obj in next(replica for replica in server_replicas if replica.tools).tools.values()
+                ]
+                for server_name, server_replicas in self._replicas.items()
+            }
+        else:
+            print("Built tools from cached schemas; tool servers are connecting in the background.")
+
+        tools = []
+        for server_name, server_schemas in schemas.items():
+            for schema in server_schemas:
+                if schema["name"] in ADMIN_TOOL_NAMES:
+                    self.admin_tools[schema["name"]] = [
+                        self._replica_tool(replica, schema) for replica in self._replicas[server_name]
+                    ]
+                else:
+                    tools.append(self._proxy_tool(server_name, schema))
+        return tools
+
+    async def wait_ready(self):
+        """Returns once every tool server has connected a replica; raises ConnectionError after `connect_timeout`."""
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(ready.wait() for ready in self._ready.values())), self.connect_timeout
+            )
+        except asyncio.TimeoutError:
+            waiting = [server_name for server_name, ready in self._ready.items() if not ready.is_set()]
+            raise ConnectionError(
+                f"Tool servers not connected after {self.connect_timeout:.0f}s: {', '.join(waiting)}."
+            ) from None
+
+    async def _supervise(self, replica):
+        delay = self.reconnect_delay
+        while not self._closing.is_set():
+            try:
+                async with self.client.session(replica.name) as session:
+                    replica.connect(session, {tool_obj.name: tool_obj for tool_obj in await load_mcp_tools(session)})
+                    delay = self.reconnect_delay
+                    self._ready[replica.server_name].set()
+                    self._save_schemas(replica)
+                    await self._watch(replica)
+            except Exception as e:
+                if not self._closing.is_set():
+                    print(f"Tool server replica {replica.name} is unavailable ({_describe(e)}); retrying in {delay:.1f}s.")
+            finally:
+                replica.drop()
+                replica.session = None
+            if self._closing.is_set():
+                break
+            try:
+                await asyncio.wait_for(self._closing.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _watch(self, replica):
+        """Returns when the replica's session has to go: on close, a failed call or a failed ping."""
+        while not replica.dropped.is_set():
+            try:
+                await asyncio.wait_for(replica.dropped.wait(), self.health_check_interval)
+            except asyncio.TimeoutError:
+                try:
+                    await asyncio.wait_for(replica.session.send_ping(), self.health_check_interval)
+                except Exception as e:
+                    replica.drop(_describe(e))
+
+    def _cached_schemas(self):
+        if self.schema_cache is None:
+            return None
+        schemas = {}
+        for server_name, connections in self.server_connections.items():
+            tools = self.schema_cache.load(server_name, _fingerprint(connections))
+            if tools is None:
+                return None
+            schemas[server_name] = tools
+        return schemas
+
+    def _save_schemas(self, replica):
+        if self.schema_cache is None:
+            return
+        tools = [_tool_schema(tool_obj) for tool_obj in replica.tools.values()]
+        try:
+            self.schema_cache.save(
+                replica.server_name, _fingerprint(self.server_connections[replica.server_name]), tools
+            )
+        except OSError as e:
+            print(f"Could not write the tool schema cache: {e}")
+
+    async def _healthy_replicas(self, server_name, start):
+        """
+        The server's healthy replicas in round-robin order from `start`. When none is, waits
+        up to `replica_wait` seconds for one to reconnect.
+        """
+        server_replicas = self._replicas[server_name]
+        if not any(replica.healthy for replica in server_replicas):
+            waits = [asyncio.ensure_future(replica.connected.wait()) for replica in server_replicas]
+            try:
+                await asyncio.wait(waits, timeout=self.replica_wait, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for wait in waits:
+                    wait.cancel()
+        rotated = server_replicas[start % len(server_replicas):] + server_replicas[:start % len(server_replicas)]
+        return [replica for replica in rotated if replica.healthy]
+
+    async def _call_replica(self, replica, tool_name, kwargs):
+        if tool_name not in replica.tools:
+            raise ToolException(f"Tool server '{replica.server_name}' no longer provides '{tool_name}'.")
+        try:
+            with span(f"mcp.{tool_name}", server=replica.server_name, replica=replica.index):
+                return await self._unless_dropped(replica, _call_tool(replica.session, tool_name, kwargs))
+        except ToolException:
+            raise
+        except Exception as e:
+            replica.drop(_describe(e))
+            raise
+
+    @staticmethod
+    async def _unless_dropped(replica, call):
+        """
+        Awaits `call`, raising ConnectionError if the replica's session is dropped first: a
+        transport that fails can end the session without answering the requests in flight.
+        """
+        call = asyncio.ensure_future(call)
+        dropped = asyncio.ensure_future(replica.dropped.wait())
+        try:
+            await asyncio.wait([call, dropped], return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            call.cancel()
+            raise
+        finally:
+            dropped.cancel()
+        if call.done():
+            return call.result()
+        call.cancel()
+        raise ConnectionError(f"Tool server replica {replica.name} disconnected.")
+
+    def _proxy_tool(self, server_name, schema):
+        tool_name = schema["name"]
+        turn = itertools.count()
+
+        async def call(**kwargs):
+            start = next(turn)
+            # the second pass reaches replicas that reconnect after failing in the first
+            for _ in range(2):
+                for replica in await self._healthy_replicas(server_name, start):
+                    try:
+                        return await self._call_replica(replica, tool_name, kwargs)
+                    except ToolException:
+                        raise
+                    except Exception as e:
+                        print(f"Tool replica for {tool_name} failed ({_describe(e)}); trying the next one.")
+            # the same shape as the tools' own errors, so the agent can tell the user
+            return json.dumps({
+                "error": "unavailable",
+                "message": f"Tool server '{server_name}' has no reachable replica; try again shortly.",
+            })
+
+        return StructuredTool(
+            name=tool_name, description=schema["description"], args_schema=schema["input_schema"], coroutine=call
+        )
+
+    def _replica_tool(self, replica, schema):
+        """An admin tool bound to one replica, as admin calls go to every replica in turn."""
+
+        async def call(**kwargs):
+            if not replica.healthy:
+                raise ConnectionError(f"Tool server replica {replica.name} is not connected.")
+            return await self._call_replica(replica, schema["name"], kwargs)
+
+        return StructuredTool(
+            name=schema["name"], description=schema["description"], args_schema=schema["input_schema"],
+            coroutine=call,
+        )
+
+    async def close(self):
+        if self._closing is None:
+            return
+        self._closing.set()
+        for server_replicas in self._replicas.values():
+            for replica in server_replicas:
+                replica.drop()
+        await asyncio.gather(*self._supervisors, return_exceptions=True)
+
+
+async def inprocess_tools(mcp_server):
+    """
+    The tools registered on a FastMCP server as native LangChain tools that call it
+    directly, with no JSON-RPC encoding or pipe in between.
+    """
+
+    def calling(tool_name):
+        async def call(**kwargs):
+            try:
+                return _text_content(await mcp_server.call_tool(tool_name, kwargs))
+            except ToolError as e:
+                raise ToolException(str(e)) from e
+
+        return call
+
+    return [
+        StructuredTool(
+            name=tool.name, description=tool.description or "", args_schema=tool.inputSchema,
+            coroutine=calling(tool.name)
+        )
+        for tool in await mcp_server.list_tools()
+    ]
+
+
+class InProcessToolSessions(ToolSessions):
+    """
+    Loads the tool server modules into this process: tool calls run on the caller's event
+    loop and the modules' worker threads, sharing their connection pools with the API.
+    """
+
+    def __init__(self, server_modules):
+        super().__init__()
+        self.server_modules = server_modules
+
+    async def get_tools(self):
+        tools = []
+        for server_name, module_name in self.server_modules.items():
+            module = importlib.import_module(module_name)
+            # the bootstrap `python <module>.py` would run before serving
+            await asyncio.to_thread(module.startup)
+            self._split_admin_tools(await inprocess_tools(module.mcp_server), tools)
+        return tools
+
+
+def tool_server_urls_from_env(server_names):
+    """Replica URLs per server from <SERVER>_TOOLS_URLS, e.g. MYSQL_TOOLS_URLS=http://h:8201/mcp,http://h:8202/mcp."""
+    server_urls = {}
+    for server_name in server_names:
+        env_name = f"{server_name.upper()}_TOOLS_URLS"
+        urls = [url.strip() for url in os.getenv(env_name, "").split(",") if url.strip()]
+        if not urls:
+            raise ValueError(f"{env_name} must list at least one tool server URL for the http transport.")
+        server_urls[server_name] = urls
+    return server_urls
+
+
+def create_tool_sessions(transport, server_modules=TOOL_SERVER_MODULES, schema_cache=None):
+    """
+    "stdio" runs each tool server as a subprocess; "inprocess" imports the tool modules
+    into this process and calls the tool functions directly; "http" connects to tool
+    servers already running as services (see launch_tool_servers.py).
+    """
+    if transport == "inprocess":
+        return InProcessToolSessions(server_modules)
+    if transport == "http":
+        return MCPToolSessions({
+            server_name: [{"transport": "streamable_http", "url": url} for url in urls]
+            for server_name, urls in tool_server_urls_from_env(server_modules).items()
+        }, schema_cache)
+    if transport == "stdio":
+        return MCPToolSessions({
+            server_name: [{
+                "transport": "stdio",
+                "command": "python",
+                "args": [f"{module_name}.py"],
+                "env": os.environ.copy(),
+            }]
+            for server_name, module_name in server_modules.items()
+        }, schema_cache)
+    raise ValueError(f"Unknown MCP_TRANSPORT '{transport}'; expected 'stdio', 'inprocess' or 'http'.")
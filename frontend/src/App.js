@@ -20,6 +20,7 @@ function App() {
   ]);
   const [input, setInput] = useState('');
   const [loading, setLoading] = useState(false);
+  const [sessionId, setSessionId] = useState(null);
   const messagesEndRef = useRef(null);
   const textareaRef = useRef(null);
 
@@ -55,7 +56,7 @@ function App() {
       const response = await fetch(`${API_URL}query`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json', 'Accept': 'application/json' },
-        body: JSON.stringify({ message: userMessage.text }), 
+        body: JSON.stringify({ message: userMessage.text, session_id: sessionId }), 
       });
 
       if (!response.ok) {
@@ -65,6 +66,9 @@ function App() {
       }
 
       const data = await response.json();
+      if (data && data.session_id) {
+        setSessionId(data.session_id);
+      }
       let agentResponseContent;
 
       if (data && typeof data.response === 'object') {